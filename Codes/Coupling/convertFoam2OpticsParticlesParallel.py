@@ -0,0 +1,147 @@
+#! /usr/bin/env python3
+#
+# convertFoam2OpticsParticlesParallel.py
+#  Kevin van As
+#  18th October 2026
+#
+# Parallel version of convertFoam2OpticsParticlesSerial.py:
+#  Converts the lagrangian particle positions of all time directories of a (reconstructed) OpenFOAM case
+#  to particle positions files for the optics code, named by helpers.nameConventions.particlePositionsFN.
+#  The time directories are distributed over a pool of processes, each positions file is parsed in a single
+#  vectorised pass (foamLagrangian.py), and written in a single call by helpers.IO, optionally in the binary format.
+#
+# 18 10 2026: Also reads binary (writeFormat binary), compressed and barycentric positions files (see foamLagrangian.py),
+#             such that foamFormatConvert is no longer required. Barycentric positions are converted with the mesh (-m).
+#
+# Usage:
+#  convertFoam2OpticsParticlesParallel.py -h
+#  convertFoam2OpticsParticlesParallel.py -i <foamCase dir> -o <output dir> -b
+#
+import sys, getopt # Command-Line options
+import os.path
+from shutil import rmtree
+import functools
+import multiprocessing
+from multiprocessing import Pool
+#
+# Import from optoFluids:
+import helpers.IO as optoFluidsIO
+import helpers.nameConventions as names
+import foamLagrangian
+#
+#####
+# Worker
+##
+# Converts the positions file of a single time directory.
+# job := (time directory, time)
+# meshDN := polyMesh directory, which is only read if the positions are barycentric
+# @return: (time directory, number of particles), in which the number of particles is None if there is no positions file.
+def convertTimeDir(job, outputDir, cloudName, binary, meshDN):
+    (timeDN, time) = job
+    foamPosFile = foamLagrangian.positionsFN(timeDN, cloudName)
+    if not foamLagrangian.exists(foamPosFile):
+        return (timeDN, None)
+    positions = foamLagrangian.readPositions(foamPosFile, meshDN=meshDN)
+    newPosFile = names.joinPaths(outputDir, names.particlePositionsFN(time))
+    optoFluidsIO.writeToFile_Positions(positions, newPosFile, time=time, binary=binary, overwrite=True)
+    return (timeDN, len(positions))
+#
+#
+if __name__ == '__main__':
+    #
+    # Command-Line Options
+    #
+    foamCaseDir = ""
+    outputDir = "./convertFoam2OpticsParticles_out"
+    cloudName = "particles"
+    overwrite = False
+    binary = False
+    numCores = 0
+    meshDN = ""
+    #
+    usageString = "   usage: " + sys.argv[0] + " -i <foamCase dir> [-o <output dir>] " \
+                + "[-c <name of the particle cloud>] [-m <polyMesh dir>] [-C <number of cores to use>] [-b] [-f] \n" \
+                + "     where:\n" \
+                + "       -f := force overwrite. WARNING: This will remove any existing directory specified using the -o option, including the default of -o.\n" \
+                + "       -b := write the binary particle positions format (see helpers/IO.py), which the optics code reads directly.\n" \
+                + "       -o defaults to '" + str(outputDir) + "'\n" \
+                + "       -c defaults to '" + str(cloudName) + "'\n" \
+                + "       -m defaults to '<foamCase dir>/constant/polyMesh'. It is only read if the positions are barycentric.\n" \
+                + "       -C defaults to '" + str(numCores) + "', which uses all available system cores. Use '1' for a serial run."
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"hfbi:o:c:m:C:")
+    except getopt.GetoptError:
+        print(usageString)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usageString)
+            sys.exit(0)
+        elif opt == '-i':
+            foamCaseDir = arg
+        elif opt == '-o':
+            outputDir = arg
+        elif opt == '-c':
+            cloudName = arg
+        elif opt == '-m':
+            meshDN = arg
+        elif opt == '-C':
+            numCores = int(arg)
+        elif opt == '-b':
+            binary = True
+        elif opt == '-f':
+            overwrite = True
+        else :
+            print(usageString)
+            sys.exit(2)
+    #
+    if foamCaseDir == "" or outputDir == "" or cloudName == "":
+        print(usageString)
+        print("    Note: dir-/filenames cannot be an empty string:")
+        print("     foamCaseDir="+foamCaseDir+" outputDir="+outputDir+\
+                   " cloudName="+cloudName)
+        sys.exit(2)
+    if meshDN == "":
+        meshDN = os.path.join(foamCaseDir, "constant", "polyMesh")
+    if numCores < 0:
+        print(usageString)
+        print("    The number of cores (-C) cannot be negative. It was: " + str(numCores))
+        sys.exit(2)
+    #
+    # Check for existence of the files
+    if ( not os.path.exists(foamCaseDir) ) :
+        sys.exit("\nERROR: Inputdir (foamCase dir) '" + foamCaseDir + "' does not exist.\n" + \
+                 "Terminating program.\n" )
+    if ( os.path.exists(outputDir) and not overwrite ) :
+        sys.exit("\nERROR: Outputdir '" + outputDir + "' already exists.\n" + \
+                 "Terminating program to prevent overwrite. Use the -f option to enforce overwrite.\n" + \
+                 "BE WARNED: This will removed the existing Outputdir!")
+    #
+    if ( os.path.exists(outputDir) and overwrite ) :
+        rmtree(outputDir)
+    os.makedirs(outputDir)
+    print("Output directory '" + outputDir + "' was created.")
+    #
+    ##############
+    # Algorithm
+    ####
+    #   Distribute all time directories over the pool. Each worker reads the particle positions file of
+    # one time directory, and writes it in the format as required by the optics code.
+    #
+    jobs = foamLagrangian.findTimeDirs(foamCaseDir)
+    numWorkers = numCores if numCores > 0 else multiprocessing.cpu_count()
+    chunksize = max(1, int(len(jobs) / (4*numWorkers)))
+    func = functools.partial(convertTimeDir, outputDir=outputDir, cloudName=cloudName, binary=binary, meshDN=meshDN)
+    numConverted = 0
+    with Pool(processes=numWorkers) as pool:
+        for (timeDN, N) in pool.imap_unordered(func, jobs, chunksize=chunksize):
+            if N is None:
+                print("WARNING: '"+foamLagrangian.positionsFN(timeDN, cloudName)+"' does not exist.\n" \
+                + "Please make sure that this path is correct. " \
+                + "And if it is, is it correct that the particle positions file does not exist?")
+                continue
+            numConverted += 1
+    print("Converted " + str(numConverted) + " of " + str(len(jobs)) + " time directories.")
+#
+#
+# EOF convertFoam2OpticsParticlesParallel
@@ -0,0 +1,385 @@
+#! /usr/bin/env python3
+#
+# foamLagrangian.py
+#  Kevin van As
+#  18th October 2026
+#
+# Reads the lagrangian particle positions of an OpenFOAM cloud (<case>/<time>/lagrangian/<cloud>/positions)
+#  into an (N,3) numpy array. The file is parsed in a single vectorised pass, instead of line by line.
+#
+# Supported formats:
+#  - writeFormat ascii:
+#     FoamFile { ... }        <-- header (optional)
+#     N
+#     (
+#     (x y z) celli
+#     ...
+#     )
+#    Any integers behind the position (celli, and tetFacei tetPti for some OpenFOAM versions) are ignored.
+#  - writeFormat binary: the same list, in which each particle is a raw record "(" + bytes + ")\n",
+#    decoded at once with np.frombuffer. The sizes of labels and scalars are read from "arch" in the header.
+#  - Either of them compressed (writeCompression on), i.e., "positions.gz".
+#  - The barycentric variant (OpenFOAM.org >= 5, and "coordinates" of OpenFOAM.com >= v1706), ascii or binary:
+#     (a b c d) celli tetFacei tetPti
+#    These are coordinates within a tetrahedron of the mesh, so the mesh is required to convert them to (x y z),
+#    see PolyMesh. Only static meshes are supported.
+#
+# Usage example:
+#  positions = foamLagrangian.readPositions(foamLagrangian.positionsFN(foamCaseDir + "/0.001", "particles"),
+#                                           meshDN=foamCaseDir + "/constant/polyMesh")
+#
+# 18 10 2026: Binary and compressed files, the barycentric variant and PolyMesh
+#             readLabels for the particle ids (origProcId, origId), findTimeDirs
+#
+import re # Regular-Expressions
+import os.path
+import gzip
+import numpy as np # Matrices
+#
+# Import from optoFluids:
+import helpers.dirIndex as dirIndex
+#
+_headerRE = re.compile(rb"FoamFile\s*\{(.*?)\}", re.DOTALL)
+_entryRE = re.compile(rb"(\w+)\s+(\"[^\"]*\"|[^;]*);")
+_skipRE = re.compile(rb"(?:\s+|//[^\n]*|/\*.*?\*/)*", re.DOTALL) # whitespace and comments
+_countRE = re.compile(rb"([0-9]+)\s*([({])")
+_tupleRE = re.compile(rb"\(([^()]*)\)")
+_faceRE = re.compile(rb"([0-9]+)\s*\(([^()]*)\)")
+#
+#####
+# Files
+##
+# Returns the filename of the positions file of the cloud cloudName inside the time directory timeDN
+def positionsFN(timeDN, cloudName="particles"):
+    return os.path.join(timeDN, "lagrangian", cloudName, "positions")
+#
+# Returns the (time directory, time) of all time directories of the case, sorted by time.
+# cloudName := if given, only the time directories that contain a positions file of this cloud
+def findTimeDirs(foamCaseDir, cloudName=None):
+    timeDirs = dirIndex.scan(foamCaseDir, "sorted") # i.e., all directories named as a float
+    return [ (DN, time) for (DN, time) in zip(timeDirs.paths(), timeDirs.times)
+             if os.path.isdir(DN) and (cloudName is None or exists(positionsFN(DN, cloudName))) ]
+#
+# Returns True if the OpenFOAM file FN exists, either as is or compressed (FN.gz)
+def exists(FN):
+    return os.path.exists(FN) or os.path.exists(FN + ".gz")
+#
+def _readBytes(FN):
+    if not os.path.exists(FN) and os.path.exists(FN + ".gz"):
+        FN = FN + ".gz"
+    if FN.endswith(".gz"):
+        with gzip.open(FN, "rb") as foamFile:
+            return foamFile.read()
+    with open(FN, "rb") as foamFile:
+        return foamFile.read()
+#
+# The contents of an OpenFOAM file: its header, and a read position in the data behind it.
+class _FoamFile(object):
+    def __init__(self, FN):
+        self.FN = FN
+        self.buf = _readBytes(FN)
+        self.header = {}
+        self.pos = 0
+        match = _headerRE.search(self.buf)
+        if match:
+            for (key, value) in _entryRE.findall(match.group(1)):
+                self.header[key.decode()] = value.strip(b"\"").decode()
+            self.pos = match.end()
+        self.binary = self.header.get("format", "ascii") == "binary"
+        # arch, e.g., "LSB;label=32;scalar=64" (which is also the default)
+        arch = dict(item.split("=") if "=" in item else (item, "") for item in self.header.get("arch", "LSB").split(";"))
+        byteorder = ">" if "MSB" in arch else "<"
+        self.labelType = np.dtype(byteorder + "i" + str(int(arch.get("label", 32))//8))
+        self.scalarType = np.dtype(byteorder + "f" + str(int(arch.get("scalar", 64))//8))
+
+    def error(self, msg):
+        return Exception("File \"" + str(self.FN) + "\": " + msg)
+
+    # Reads the size of the next list and moves behind its opening bracket.
+    # @return: (N, bracket), in which bracket is b"(" for a list and b"{" for a uniform list
+    def readCount(self):
+        self.pos = _skipRE.match(self.buf, self.pos).end()
+        match = _countRE.match(self.buf, self.pos)
+        if not match:
+            raise self.error("expected a list \"N ( ... )\" at byte " + str(self.pos) + ".")
+        self.pos = match.end()
+        return (int(match.group(1)), match.group(2))
+
+    # Position of the closing bracket of the ascii list of which the contents start at self.pos,
+    #  which contains "nested" bracketed items
+    def findClose(self, nested):
+        closes = np.flatnonzero(np.frombuffer(self.buf, np.uint8, offset=self.pos) == ord(")"))
+        if len(closes) <= nested:
+            raise self.error("the list is not closed.")
+        return self.pos + int(closes[nested])
+
+    # Reads the next list of N items of numComponents values of the given type
+    # @return: (N,) array if numComponents is 1, and (N,numComponents) array otherwise
+    def readList(self, dtype, numComponents=1):
+        (N, bracket) = self.readCount()
+        shape = (N,) if numComponents == 1 else (N, numComponents)
+        if bracket == b"{": # uniform list: N{value}
+            end = self.buf.find(b"}", self.pos)
+            if self.binary:
+                value = np.frombuffer(self.buf, dtype, numComponents, offset=self.pos)
+            else:
+                value = np.array(self.buf[self.pos:end].replace(b"(", b" ").replace(b")", b" ").split(), dtype=dtype)
+            self.pos = end + 1
+            return np.tile(value.astype(dtype.newbyteorder("=")), N).reshape(shape)
+        if self.binary:
+            data = np.frombuffer(self.buf, dtype, N*numComponents, offset=self.pos)
+            end = self.pos + data.nbytes
+            if self.buf[end:end+1] != b")":
+                raise self.error("the binary list of " + str(N) + " items is not closed where expected (byte " + str(end) + ").")
+        else:
+            end = self.findClose(N if numComponents > 1 else 0)
+            data = np.array(self.buf[self.pos:end].replace(b"(", b" ").replace(b")", b" ").split(), dtype=dtype)
+            if len(data) != N*numComponents:
+                raise self.error("expected " + str(N*numComponents) + " values, but found " + str(len(data)) + ".")
+        self.pos = end + 1
+        return data.astype(dtype.newbyteorder("=")).reshape(shape)
+#
+#####
+# Particles
+##
+# Reads an OpenFOAM positions file.
+# meshDN := polyMesh directory, e.g. <case>/constant/polyMesh. Only required for the barycentric variant.
+# @return: (N,3) numpy array
+def readPositions(FN, meshDN=None):
+    particles = readParticles(FN)
+    if "position" in particles:
+        return particles["position"]
+    if meshDN is None:
+        raise Exception("File \"" + str(FN) + "\" has barycentric positions, which require the mesh to be converted to (x y z).")
+    return getMesh(meshDN).barycentricToCartesian(particles["coordinates"], particles["celli"], particles["tetFacei"], particles["tetPti"])
+#
+# Reads an OpenFOAM positions file.
+# @return: dict with either
+#   "position" := (N,3) array, and "celli" if the file has it; or
+#   "coordinates" := (N,4) barycentric coordinates, and "celli", "tetFacei" and "tetPti" := (N,) arrays
+def readParticles(FN):
+    foamFile = _FoamFile(FN)
+    (N, bracket) = foamFile.readCount()
+    if N == 0:
+        return {"position": np.zeros((0,3)), "celli": np.zeros(0, dtype=int)}
+    if foamFile.binary:
+        return _decodeBinaryParticles(foamFile, N)
+    return _parseAsciiParticles(foamFile, N)
+#
+def _parseAsciiParticles(foamFile, N):
+    body = foamFile.buf[foamFile.pos:foamFile.findClose(N)]
+    # Each particle is a bracketed position followed by integers. Check the position of the first particle:
+    first = _tupleRE.search(body)
+    numComponents = len(first.group(1).split()) if first else 0
+    if numComponents not in (3, 4):
+        raise foamFile.error("has positions with " + str(numComponents) + " components, but expected three (x y z) or four (barycentric).")
+    tokens = body.replace(b"(", b" ").replace(b")", b" ").split()
+    if len(tokens) % N != 0:
+        raise foamFile.error("should contain " + str(N) + " particles, but its " + str(len(tokens)) + " values cannot be divided over them.")
+    data = np.array(tokens, dtype=float).reshape((N, -1))
+    if numComponents == 3:
+        particles = {"position": np.ascontiguousarray(data[:,:3])}
+        if data.shape[1] > 3: # Positions without labels are also accepted
+            particles["celli"] = data[:,3].astype(int)
+        return particles
+    if data.shape[1] != 7:
+        raise foamFile.error("has barycentric positions with " + str(data.shape[1]-4) + " labels, but expected three (celli tetFacei tetPti).")
+    return {"coordinates": np.ascontiguousarray(data[:,:4]), "celli": data[:,4].astype(int),
+            "tetFacei": data[:,5].astype(int), "tetPti": data[:,6].astype(int)}
+#
+# Binary particles are written as N records "(" + position + celli + ")\n", or "(" + coordinates + celli + tetFacei + tetPti + ")\n".
+def _decodeBinaryParticles(foamFile, N):
+    scalar = foamFile.scalarType
+    label = foamFile.labelType
+    start = foamFile.pos + 1 if foamFile.buf[foamFile.pos:foamFile.pos+1] == b"\n" else foamFile.pos
+    recordsSize = foamFile.buf.rfind(b")") - start
+    for fields in (
+        [("position", scalar, (3,)), ("celli", label)],
+        [("coordinates", scalar, (4,)), ("celli", label), ("tetFacei", label), ("tetPti", label)]
+    ):
+        dtype = np.dtype([("open", "S1")] + fields + [("close", "S1"), ("newline", "S1")])
+        if recordsSize == N*dtype.itemsize:
+            break
+    else:
+        raise foamFile.error("the " + str(recordsSize) + " bytes of its " + str(N) + " particles do not match a known binary layout " + \
+                             "(label=" + str(8*label.itemsize) + ", scalar=" + str(8*scalar.itemsize) + ").")
+    records = np.frombuffer(foamFile.buf, dtype, N, offset=start)
+    if np.any(records["open"] != b"(") or np.any(records["close"] != b")"):
+        raise foamFile.error("the binary particle records are not enclosed by brackets.")
+    return { name: np.ascontiguousarray(records[name], dtype=float if name in ("position", "coordinates") else int)
+             for (name, *_) in fields }
+#
+# Reads a lagrangian field of labels, e.g. "origId" or "origProcId" in the directory of the positions file.
+# @return: (N,) int array
+def readLabels(FN):
+    foamFile = _FoamFile(FN)
+    return foamFile.readList(foamFile.labelType).astype(int)
+#
+#####
+# Mesh
+##
+_meshes = {} # polyMesh directory --> PolyMesh
+#
+# Returns the PolyMesh of directory meshDN, which is read only once
+def getMesh(meshDN):
+    key = os.path.abspath(meshDN)
+    if key not in _meshes:
+        _meshes[key] = PolyMesh(meshDN)
+    return _meshes[key]
+#
+# The static mesh of an OpenFOAM case (constant/polyMesh), with the geometry that the barycentric particle positions refer to.
+# Each particle is inside the tetrahedron (cell centre, base point of the face, face point i, face point i+1),
+#  which is constructed as OpenFOAM does it (tetIndices::faceTriIs). The cell centres are computed as in primitiveMesh.
+class PolyMesh(object):
+    def __init__(self, meshDN):
+        self.meshDN = meshDN
+        self.points = self.readField("points", 3)
+        (self.faceOffsets, self.faceLabels) = self.readFaces()
+        self.owner = self.readField("owner")
+        self.neighbour = self.readField("neighbour")
+        self.nFaces = len(self.faceOffsets) - 1
+        self.nInternalFaces = len(self.neighbour)
+        self.nCells = int(max(np.max(self.owner), np.max(self.neighbour, initial=-1))) + 1
+        self._cellCentres = None
+        self._tetBasePtIs = None
+
+    def readField(self, name, numComponents=1):
+        foamFile = _FoamFile(os.path.join(self.meshDN, name))
+        dtype = foamFile.scalarType if numComponents > 1 else foamFile.labelType
+        return foamFile.readList(dtype, numComponents).astype(float if numComponents > 1 else int)
+
+    # Reads the faces as (offsets, labels): the points of face f are labels[offsets[f]:offsets[f+1]].
+    def readFaces(self):
+        foamFile = _FoamFile(os.path.join(self.meshDN, "faces"))
+        if foamFile.header.get("class") == "faceCompactList":
+            offsets = foamFile.readList(foamFile.labelType).astype(int)
+            labels = foamFile.readList(foamFile.labelType).astype(int)
+            return (offsets, labels)
+        if foamFile.binary:
+            raise foamFile.error("binary faces must be a faceCompactList.")
+        (N, bracket) = foamFile.readCount()
+        faces = _faceRE.findall(foamFile.buf[foamFile.pos:foamFile.findClose(N)])
+        if len(faces) != N:
+            raise foamFile.error("expected " + str(N) + " faces, but found " + str(len(faces)) + ".")
+        sizes = np.array([ size for (size, labels) in faces ], dtype=int)
+        labels = np.array(b" ".join(labels for (size, labels) in faces).split(), dtype=int)
+        return (np.concatenate(([0], np.cumsum(sizes))), labels)
+
+    # Sums values (per face) per cell, for the faces with the given cells
+    def _sumPerCell(self, cells, values):
+        if values.ndim == 1:
+            return np.bincount(cells, weights=values, minlength=self.nCells)
+        return np.stack([ np.bincount(cells, weights=values[:,d], minlength=self.nCells) for d in range(values.shape[1]) ], axis=1)
+
+    # As primitiveMesh::makeFaceCentresAndAreas: the area-weighted centre of the triangles (point i, point i+1, average point)
+    def faceCentresAndAreas(self):
+        offsets = self.faceOffsets
+        nPoints = np.diff(offsets)
+        p = self.points[self.faceLabels]
+        iNext = np.arange(len(self.faceLabels)) + 1
+        iNext[offsets[1:]-1] = offsets[:-1] # the last point of a face is followed by its first
+        pNext = p[iNext]
+        fCentre = np.add.reduceat(p, offsets[:-1], axis=0) / nPoints[:,np.newaxis]
+        fCentreOfPoint = np.repeat(fCentre, nPoints, axis=0)
+        n = np.cross(pNext - p, fCentreOfPoint - p)
+        a = np.linalg.norm(n, axis=1)
+        sumN = np.add.reduceat(n, offsets[:-1], axis=0)
+        sumA = np.add.reduceat(a, offsets[:-1])
+        sumAc = np.add.reduceat(a[:,np.newaxis] * (p + pNext + fCentreOfPoint), offsets[:-1], axis=0)
+        valid = sumA >= np.sqrt(np.finfo(float).tiny)
+        fCtrs = np.where(valid[:,np.newaxis], sumAc / np.where(valid, 3*sumA, 1)[:,np.newaxis], fCentre)
+        fAreas = np.where(valid[:,np.newaxis], 0.5*sumN, 0)
+        # Triangles are computed directly:
+        tri = np.flatnonzero(nPoints == 3)
+        p0 = self.points[self.faceLabels[offsets[tri]]]
+        p1 = self.points[self.faceLabels[offsets[tri]+1]]
+        p2 = self.points[self.faceLabels[offsets[tri]+2]]
+        fCtrs[tri] = (1.0/3.0)*(p0 + p1 + p2)
+        fAreas[tri] = 0.5*np.cross(p1 - p0, p2 - p0)
+        return (fCtrs, fAreas)
+
+    # As primitiveMesh::makeCellCentresAndVols: the volume-weighted centre of the pyramids (face, estimated cell centre)
+    def cellCentres(self):
+        if self._cellCentres is not None:
+            return self._cellCentres
+        (fCtrs, fAreas) = self.faceCentresAndAreas()
+        own = self.owner
+        nei = self.neighbour
+        nI = self.nInternalFaces
+        nCellFaces = np.bincount(own, minlength=self.nCells) + np.bincount(nei, minlength=self.nCells)
+        cEst = (self._sumPerCell(own, fCtrs) + self._sumPerCell(nei, fCtrs[:nI])) / np.maximum(nCellFaces, 1)[:,np.newaxis]
+        pyr3VolOwn = np.sum(fAreas * (fCtrs - cEst[own]), axis=1)
+        pyr3VolNei = np.sum(fAreas[:nI] * (cEst[nei] - fCtrs[:nI]), axis=1)
+        cellCtrs = self._sumPerCell(own, pyr3VolOwn[:,np.newaxis] * (0.75*fCtrs + 0.25*cEst[own])) \
+                 + self._sumPerCell(nei, pyr3VolNei[:,np.newaxis] * (0.75*fCtrs[:nI] + 0.25*cEst[nei]))
+        cellVols = self._sumPerCell(own, pyr3VolOwn) + self._sumPerCell(nei, pyr3VolNei)
+        valid = np.abs(cellVols) > np.finfo(float).tiny
+        self._cellCentres = np.where(valid[:,np.newaxis], cellCtrs / np.where(valid, cellVols, 1)[:,np.newaxis], cEst)
+        return self._cellCentres
+
+    # Signed volumes of the tetrahedra (centres, base, a, b)
+    @staticmethod
+    def _tetVolumes(centres, base, a, b):
+        return np.sum(np.cross(base - centres, a - centres) * (b - centres), axis=1) / 6.0
+
+    # As polyMeshTetDecomposition::findFaceBasePts: for each face, the first face point from which all tetrahedra
+    #  (with the owner and neighbour cell centres) have a positive volume. Usually the first point of the face.
+    #  (For faces on coupled patches, only the owner cell is considered.)
+    def tetBasePtIs(self):
+        if self._tetBasePtIs is not None:
+            return self._tetBasePtIs
+        cc = self.cellCentres()
+        offsets = self.faceOffsets
+        nPoints = np.diff(offsets)
+        # Check base point 0 for all faces at once: one tetrahedron per face point, except for the first and last
+        faceOfPoint = np.repeat(np.arange(self.nFaces), nPoints)
+        iLocal = np.arange(len(self.faceLabels)) - offsets[faceOfPoint]
+        isTet = (iLocal >= 1) & (iLocal <= nPoints[faceOfPoint] - 2)
+        faces = faceOfPoint[isTet]
+        i = np.flatnonzero(isTet)
+        base = self.points[self.faceLabels[offsets[faces]]]
+        a = self.points[self.faceLabels[i]]
+        b = self.points[self.faceLabels[i+1]]
+        good = self._tetVolumes(cc[self.owner[faces]], base, a, b) > 0
+        internal = faces < self.nInternalFaces
+        good[internal] &= self._tetVolumes(cc[self.neighbour[faces[internal]]], base[internal], b[internal], a[internal]) > 0
+        badFaces = np.unique(faces[~good])
+        basePts = np.zeros(self.nFaces, dtype=int)
+        # Try the other base points of the remaining faces one by one:
+        for facei in badFaces:
+            f = self.faceLabels[offsets[facei]:offsets[facei+1]]
+            basePts[facei] = -1
+            for faceBasePtI in range(1, len(f)):
+                order = np.roll(f, -faceBasePtI)
+                base = np.tile(self.points[order[0]], (len(f)-2, 1))
+                a = self.points[order[1:-1]]
+                b = self.points[order[2:]]
+                ok = np.all(self._tetVolumes(np.tile(cc[self.owner[facei]], (len(f)-2, 1)), base, a, b) > 0)
+                if facei < self.nInternalFaces:
+                    ok = ok and np.all(self._tetVolumes(np.tile(cc[self.neighbour[facei]], (len(f)-2, 1)), base, b, a) > 0)
+                if ok:
+                    basePts[facei] = faceBasePtI
+                    break
+        self._tetBasePtIs = np.maximum(basePts, 0) # As OpenFOAM: no valid base point -> 0
+        return self._tetBasePtIs
+
+    # Converts barycentric particle coordinates to (x y z), cf. OpenFOAM's tetIndices::faceTriIs.
+    # @return: (N,3) array
+    def barycentricToCartesian(self, coordinates, celli, tetFacei, tetPti):
+        celli = np.asarray(celli, dtype=int)
+        tetFacei = np.asarray(tetFacei, dtype=int)
+        tetPti = np.asarray(tetPti, dtype=int)
+        start = self.faceOffsets[tetFacei]
+        nPoints = self.faceOffsets[tetFacei+1] - start
+        faceBasePtI = self.tetBasePtIs()[tetFacei]
+        facePtI = (tetPti + faceBasePtI) % nPoints
+        faceOtherPtI = (facePtI + 1) % nPoints
+        swap = self.owner[tetFacei] != celli # seen from the neighbour, the face points are in reverse order
+        (facePtI, faceOtherPtI) = (np.where(swap, faceOtherPtI, facePtI), np.where(swap, facePtI, faceOtherPtI))
+        coordinates = np.asarray(coordinates, dtype=float)
+        return coordinates[:,0:1] * self.cellCentres()[celli] \
+             + coordinates[:,1:2] * self.points[self.faceLabels[start + faceBasePtI]] \
+             + coordinates[:,2:3] * self.points[self.faceLabels[start + facePtI]] \
+             + coordinates[:,3:4] * self.points[self.faceLabels[start + faceOtherPtI]]
+#
+# EOF
@@ -0,0 +1,304 @@
+#! /usr/bin/env python3
+#
+# interpolateFoamParticles.py
+#  Kevin van As
+#  18th October 2026
+#
+# Synthesises the camera-exposure microsteps from coarse OpenFOAM output, such that the lagrangian data
+#  does not have to be written at every microstep.
+#  For each write time t of the case, the particle positions at t + j*t_int/n_int (j=0..n_int) are interpolated
+#  from the write times around it (cf. T[0] and nWrite[0] of multiRepeatEvolve in Fluids/exact/moveParticles.py).
+#
+# Particles are matched between the write times by their id (origProcId, origId), so the particles may be
+#  reordered (e.g., by reconstructPar) or injected and removed: only the particles present at both ends of
+#  an interval are interpolated in it.
+# The interpolation is linear, or a cubic Hermite spline with finite-difference tangents (Catmull-Rom),
+#  vectorised over all particles.
+# With a periodic domain (-L), each particle is unwrapped along the axis to the periodic image closest to
+#  its previous position before interpolation, and wrapped back into the domain afterwards. Hence, particles
+#  must move less than L/2 between two write times.
+#
+# Usage:
+#  interpolateFoamParticles.py -h
+#  interpolateFoamParticles.py -i <foamCase dir> -o <output dir> -t 1e-4 -n 10 -k cubic -L 5e-3
+#
+import sys, getopt # Command-Line options
+import os.path
+from shutil import rmtree
+import numpy as np # Matrices
+#
+# Import from optoFluids:
+import helpers.IO as optoFluidsIO
+import helpers.nameConventions as names
+import helpers.strConversions as str2
+import foamLagrangian
+#
+kinds = ("linear", "cubic")
+#
+#####
+# Snapshots
+##
+# Reads the particles of one time directory.
+# @return: (positions, ids), in which ids combines origProcId and origId into a single int64,
+#   or is None if those fields were not written
+def readSnapshot(timeDN, cloudName="particles", meshDN=None):
+    posFN = foamLagrangian.positionsFN(timeDN, cloudName)
+    positions = foamLagrangian.readPositions(posFN, meshDN=meshDN)
+    procFN = os.path.join(os.path.dirname(posFN), "origProcId")
+    idFN = os.path.join(os.path.dirname(posFN), "origId")
+    if not foamLagrangian.exists(procFN) or not foamLagrangian.exists(idFN):
+        return (positions, None)
+    ids = np.left_shift(foamLagrangian.readLabels(procFN).astype(np.int64), 32) | foamLagrangian.readLabels(idFN).astype(np.int64)
+    if len(ids) != len(positions):
+        raise Exception("\"" + str(timeDN) + "\" has " + str(len(positions)) + " positions, but " + str(len(ids)) + " particle ids.")
+    if len(np.unique(ids)) != len(ids):
+        raise Exception("The particle ids (origProcId, origId) in \"" + str(timeDN) + "\" are not unique.")
+    return (positions, ids)
+#
+# Returns the index of each key in ids, or -1 if it is not present
+def lookup(ids, keys):
+    if len(ids) == 0:
+        return np.full(len(keys), -1)
+    order = np.argsort(ids)
+    sortedIds = ids[order]
+    i = np.minimum(np.searchsorted(sortedIds, keys), len(ids)-1)
+    return np.where(sortedIds[i] == keys, order[i], -1)
+#
+# Shifts the positions b by whole periods L along axis, such that they are the periodic images closest to a
+def unwrap(b, a, axis, L):
+    if not L:
+        return b
+    d = np.dot(b - a, axis)
+    return b - (np.round(d/L)*L)[:,np.newaxis] * axis
+#
+# Constrains the positions between origin and origin+L*axis, as geometries.Cylinder.constrainAll(periodic=True)
+def wrap(positions, axis, L, origin):
+    if not L:
+        return positions
+    shift = origin + L/2 * axis
+    proj = np.dot(positions - shift, axis)
+    return positions - (np.trunc(proj/L + np.sign(proj)*0.5)*L)[:,np.newaxis] * axis
+#
+#####
+# Interpolation
+##
+# Interpolates the particle positions at any time between the first and the last write time of a case.
+# The snapshots of the write times are read when needed, and only the few around the current interval are kept,
+#  so call "at" with increasing times.
+class SnapshotInterpolator(object):
+    # timeDirs := [(time directory, time)], sorted by time (see foamLagrangian.findTimeDirs)
+    # kind := one of "kinds"
+    # L := period length along axis (0 for a non-periodic domain), of the domain that starts at origin
+    def __init__(self, timeDirs, cloudName="particles", meshDN=None, kind="linear", L=0, axis=(0,0,1), origin=(0,0,0)):
+        if len(timeDirs) < 2:
+            raise Exception("Interpolation requires at least two write times, but received " + str(len(timeDirs)) + ".")
+        if kind not in kinds:
+            raise Exception("Unknown interpolation \"" + str(kind) + "\". Valid options are: " + str(kinds) + ".")
+        self.timeDNs = [ DN for (DN, time) in timeDirs ]
+        self.times = np.array([ time for (DN, time) in timeDirs ], dtype=float)
+        self.cloudName = cloudName
+        self.meshDN = meshDN
+        self.kind = kind
+        self.L = float(L)
+        self.axis = np.asarray(axis, dtype=float) / np.linalg.norm(axis)
+        self.origin = np.asarray(origin, dtype=float)
+        self._snapshots = {} # index --> (positions, ids)
+        self._interval = None # (k, P0, P1, m0, m1)
+        self.matchedByOrder = False
+
+    def snapshot(self, k):
+        if k not in self._snapshots:
+            (positions, ids) = readSnapshot(self.timeDNs[k], self.cloudName, self.meshDN)
+            if ids is None: # Without ids, the particles can only be matched by their order
+                self.matchedByOrder = True
+                ids = np.arange(len(positions), dtype=np.int64)
+            self._snapshots[k] = (positions, ids)
+            for old in [ i for i in self._snapshots if i < k-2 ]: # the cubic stencil of an interval reaches back to k-1
+                del self._snapshots[old]
+        return self._snapshots[k]
+
+    # Positions at snapshot j of the particles with the given ids, unwrapped towards reference, or NaN where absent
+    def _stencilPoint(self, j, ids, reference):
+        (positions, jIds) = self.snapshot(j)
+        i = lookup(jIds, ids)
+        P = np.full((len(ids),3), np.nan)
+        P[i >= 0] = positions[i[i >= 0]]
+        return unwrap(P, reference, self.axis, self.L)
+
+    # Prepares the interval [times[k], times[k+1]]: its particles, end points and tangents
+    def _setInterval(self, k):
+        (P0, ids0) = self.snapshot(k)
+        (positions1, ids1) = self.snapshot(k+1)
+        i1 = lookup(ids1, ids0)
+        present = i1 >= 0
+        if self.matchedByOrder and len(positions1) != len(P0):
+            raise Exception("Without particle ids (origProcId, origId), all write times must have the same number of particles, " + \
+                            "but \"" + self.timeDNs[k] + "\" and \"" + self.timeDNs[k+1] + "\" do not.")
+        ids = ids0[present]
+        P0 = P0[present]
+        P1 = unwrap(positions1[i1[present]], P0, self.axis, self.L)
+        h = self.times[k+1] - self.times[k]
+        m0 = m1 = (P1 - P0) / h # one-sided, where a neighbouring write time (or the particle in it) is missing
+        if self.kind == "cubic":
+            if k > 0:
+                Pm = self._stencilPoint(k-1, ids, P0)
+                m0 = np.where(np.isnan(Pm), m0, (P1 - Pm) / (self.times[k+1] - self.times[k-1]))
+            if k+2 < len(self.times):
+                P2 = self._stencilPoint(k+2, ids, P1)
+                m1 = np.where(np.isnan(P2), m1, (P2 - P0) / (self.times[k+2] - self.times[k]))
+        self._interval = (k, P0, P1, m0, m1)
+
+    # Returns the (N,3) particle positions at time t
+    def at(self, t):
+        tol = 1e-9 * max(abs(self.times[0]), abs(self.times[-1]), self.times[-1] - self.times[0])
+        if t < self.times[0] - tol or t > self.times[-1] + tol:
+            raise Exception("Time " + str(t) + " is outside of the write times [" + str(self.times[0]) + ", " + str(self.times[-1]) + "].")
+        k = int(np.clip(np.searchsorted(self.times, t, side="right") - 1, 0, len(self.times) - 2))
+        if self._interval is None or self._interval[0] != k:
+            self._setInterval(k)
+        (k, P0, P1, m0, m1) = self._interval
+        h = self.times[k+1] - self.times[k]
+        s = (t - self.times[k]) / h
+        if self.kind == "linear":
+            positions = P0 + s*(P1 - P0)
+        else: # cubic Hermite basis
+            positions = (2*s**3 - 3*s**2 + 1)*P0 + (s**3 - 2*s**2 + s)*h*m0 + (-2*s**3 + 3*s**2)*P1 + (s**3 - s**2)*h*m1
+        return wrap(positions, self.axis, self.L, self.origin)
+#
+# Returns the sorted microstep times: t + j*t_int/n_int (j=0..n_int) for each write time t,
+#  as far as they do not exceed the last write time
+def microstepTimes(times, t_int, n_int):
+    times = np.asarray(times, dtype=float)
+    microsteps = np.sort( (times[:,np.newaxis] + np.arange(n_int+1)*(t_int/n_int)).ravel() )
+    # Compared as in the filenames, which also removes the duplicates of overlapping exposures:
+    rounded = np.array([ names.myRound(t) for t in microsteps ])
+    keep = np.concatenate(([True], rounded[1:] != rounded[:-1])) & (rounded <= names.myRound(times[-1]))
+    return microsteps[keep]
+#
+#
+if __name__ == '__main__':
+    #
+    # Command-Line Options
+    #
+    foamCaseDir = ""
+    outputDir = "./interpolateFoamParticles_out"
+    cloudName = "particles"
+    meshDN = ""
+    t_int = None
+    n_int = None
+    kind = "linear"
+    L = 0
+    axis = "(0,0,1)"
+    origin = "(0,0,0)"
+    binary = False
+    overwrite = False
+    #
+    usageString = "   usage: " + sys.argv[0] + " -i <foamCase dir> -t <t_int> -n <n_int> [-o <output dir>] " \
+                + "[-c <name of the particle cloud>] [-m <polyMesh dir>] [-k <interpolation>] [-L <period length>] [-a <axis>] [-O <origin>] [-b] [-f] \n" \
+                + "     where:\n" \
+                + "       -t (float) := camera integration time: the microsteps span [t, t+t_int] for each write time t.\n" \
+                + "       -n (int) := number of camera integration samples. You'll have n+1 files for each write time.\n" \
+                + "       -k := interpolation, one of: " + str(kinds) + ". Defaults to '" + str(kind) + "'.\n" \
+                + "       -L (float) := length of the periodic domain along the axis, starting at the origin. Defaults to 0 (not periodic).\n" \
+                + "       -a '(float,float,float)' := direction of the (periodic) axis. Defaults to " + str(axis) + ".\n" \
+                + "       -O '(float,float,float)' := origin of the periodic domain. Defaults to " + str(origin) + ".\n" \
+                + "       -b := write the binary particle positions format (see helpers/IO.py), which the optics code reads directly.\n" \
+                + "       -f := force overwrite. WARNING: This will remove any existing directory specified using the -o option, including the default of -o.\n" \
+                + "       -o defaults to '" + str(outputDir) + "'\n" \
+                + "       -c defaults to '" + str(cloudName) + "'\n" \
+                + "       -m defaults to '<foamCase dir>/constant/polyMesh'. It is only read if the positions are barycentric."
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"hfbi:o:c:m:t:n:k:L:a:O:")
+    except getopt.GetoptError:
+        print(usageString)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usageString)
+            sys.exit(0)
+        elif opt == '-i':
+            foamCaseDir = arg
+        elif opt == '-o':
+            outputDir = arg
+        elif opt == '-c':
+            cloudName = arg
+        elif opt == '-m':
+            meshDN = arg
+        elif opt == '-t':
+            t_int = float(arg)
+        elif opt == '-n':
+            n_int = int(arg)
+        elif opt == '-k':
+            kind = arg
+        elif opt == '-L':
+            L = float(arg)
+        elif opt == '-a':
+            axis = arg
+        elif opt == '-O':
+            origin = arg
+        elif opt == '-b':
+            binary = True
+        elif opt == '-f':
+            overwrite = True
+        else :
+            print(usageString)
+            sys.exit(2)
+    #
+    if foamCaseDir == "" or outputDir == "" or cloudName == "":
+        print(usageString)
+        print("    Note: dir-/filenames cannot be an empty string:")
+        print("     foamCaseDir="+foamCaseDir+" outputDir="+outputDir+\
+                   " cloudName="+cloudName)
+        sys.exit(2)
+    if t_int is None or n_int is None or t_int <= 0 or n_int < 1:
+        print(usageString)
+        print("    t_int (-t) must be positive and n_int (-n) at least one. They were: t_int=" + str(t_int) + ", n_int=" + str(n_int))
+        sys.exit(2)
+    if kind not in kinds:
+        print(usageString)
+        print("    Unknown interpolation (-k): " + str(kind))
+        sys.exit(2)
+    if L < 0:
+        print(usageString)
+        print("    The period length (-L) cannot be negative. It was: " + str(L))
+        sys.exit(2)
+    if meshDN == "":
+        meshDN = os.path.join(foamCaseDir, "constant", "polyMesh")
+    #
+    # Check for existence of the files
+    if ( not os.path.exists(foamCaseDir) ) :
+        sys.exit("\nERROR: Inputdir (foamCase dir) '" + foamCaseDir + "' does not exist.\n" + \
+                 "Terminating program.\n" )
+    if ( os.path.exists(outputDir) and not overwrite ) :
+        sys.exit("\nERROR: Outputdir '" + outputDir + "' already exists.\n" + \
+                 "Terminating program to prevent overwrite. Use the -f option to enforce overwrite.\n" + \
+                 "BE WARNED: This will removed the existing Outputdir!")
+    #
+    timeDirs = foamLagrangian.findTimeDirs(foamCaseDir, cloudName)
+    if len(timeDirs) < 2:
+        sys.exit("\nERROR: Found " + str(len(timeDirs)) + " time directories with particle positions in '" + foamCaseDir + "', " + \
+                 "but interpolation requires at least two.\n")
+    #
+    if ( os.path.exists(outputDir) and overwrite ) :
+        rmtree(outputDir)
+    os.makedirs(outputDir)
+    print("Output directory '" + outputDir + "' was created.")
+    #
+    ##############
+    # Algorithm
+    ####
+    #   Walk through the microsteps in time, such that each snapshot of the case is read only once.
+    #
+    interpolator = SnapshotInterpolator(timeDirs, cloudName=cloudName, meshDN=meshDN, kind=kind, L=L,
+                                        axis=str2.strToFloatVec(axis), origin=str2.strToFloatVec(origin))
+    microsteps = microstepTimes(interpolator.times, t_int, n_int)
+    for time in microsteps:
+        positions = interpolator.at(time)
+        optoFluidsIO.writeToFile_Positions(positions, names.joinPaths(outputDir, names.particlePositionsFN(time)),
+                                           time=time, binary=binary, overwrite=True)
+    if interpolator.matchedByOrder:
+        print("WARNING: The case has no particle ids (origProcId, origId), so the particles were matched by their order.")
+    print("Wrote " + str(len(microsteps)) + " microsteps from " + str(len(timeDirs)) + " write times.")
+#
+#
+# EOF interpolateFoamParticles
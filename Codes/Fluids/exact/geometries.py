@@ -5,6 +5,7 @@
 # Kevin van As
 #	23 11 2018: Original
 #	26 11 2018: Added "constrain", also for arbitrary orientation
+#	18 10 2026: Added "constrainAll", which constrains all particles at once
 #
 
 
@@ -22,6 +23,15 @@ class Shape(object):
 			raise Exception("InvalidArgument: \"origin\" should be a vector of size 3, but was: " + str(origin) + ".")
 		#print("orientation = " + str(self.orientation))
 
+	# Constrain all particles, given as an (N,3) array.
+	# Falls back to calling self.constrain per particle; shapes should override this with an array-level version.
+	# If inplace, particles is modified and returned; otherwise a constrained copy is returned.
+	def constrainAll(self, particles, periodic=True, inplace=False):
+		out = particles if inplace else np.array(particles, dtype=float)
+		for k, particle in enumerate(out):
+			out[k] = self.constrain(particle, periodic=periodic)
+		return out
+
 class Cylinder(Shape):
 	# Orientation // axis of cylinder
 	# Origin is the center of the base circle of the cylinder
@@ -67,6 +77,20 @@ class Cylinder(Shape):
 		#print("posOut = " + str(pos))
 		return pos
 
+	# Array-level version of "constrain": the same computation for all particles, (N,3), at once.
+	# If inplace, particles is modified and returned; otherwise a constrained copy is returned.
+	def constrainAll(self, particles, periodic=True, inplace=False):
+		out = particles if inplace else np.array(particles, dtype=float)
+		shift = self.origin + self.L/2 * self.orientation
+		proj = np.dot(out - shift, self.orientation) # project on cylinder axis, (N,)
+		if periodic:
+			# np.trunc equals the int() of "constrain"
+			correction = np.trunc(proj/self.L + np.sign(proj)*0.5)*self.L
+		else:
+			correction = np.where(np.abs(proj) > self.L/2, proj - np.sign(proj)*self.L/2, 0)
+		out -= correction[:,np.newaxis] * self.orientation
+		return out
+
 
 	# @Deprecated:
 	def constrainOld(self,particle,periodic=True): # Only works with orientation = (0,0,1)
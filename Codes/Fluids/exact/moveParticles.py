@@ -18,6 +18,14 @@
 #	05 02 2019: Now uses MEAN velocity, instead of MAXimum velocity.
 #	05 04 2019: Implemented enhanced RTS "select" functionality by deleting lines that are now no longer necessary.
 #	15 05 2019: Implemented T=0 stop checks correctly. In that case this code simply writes the IC to t=0.
+#	18 10 2026: applyBC constrains all particles at once (geometry.constrainAll).
+#				Exact advection mode for axially uniform profiles: jumps to each write time without substeps.
+#				Evolves several realisations (independent particle seeds) together, each written to its own inner result directory.
+#				Positions are read and written through helpers.IO, optionally in the binary format.
+#				findFirstPosFN scans the directory with helpers.dirIndex.
+#				The velocity profile of the particles is cached for axially uniform profiles (ProfileCache).
+#				Explicit Runge-Kutta integrators (rk2, rk4) for profiles that vary along the flow direction (e.g., spatialProfiles.gridded).
+#				--flowargs for spatial profiles that take arguments.
 #
 # TODO:
 #	Set origin, orientation from CLI
@@ -28,7 +36,6 @@
 import re
 import sys
 import os.path, shutil
-from io import StringIO
 
 import inspect
 #import traceback
@@ -42,10 +49,38 @@ import numpy as np # Matrices
 # Import from optoFluids:
 import helpers.regex as myRE
 import helpers.nameConventions as names
+import helpers.dirIndex as dirIndex
 import helpers.RTS as RTS
+import helpers.IO as optoFluidsIO
 import geometries as geom
 import spatialProfiles, temporalModulation
 
+# Time integrators of moveOnce: forward Euler, explicit midpoint and classic fourth-order Runge-Kutta
+integrators = ("euler", "rk2", "rk4")
+
+# Caches the velocity profile, u(\vec{r}), of all particles.
+# An axiallyUniform profile only depends on the position perpendicular to shape.orientation, and it moves the particles
+#  along shape.orientation only (as does the periodic BC). Hence, the radial positions never change while advecting,
+#  and the profile is computed once for the particles given by setData; invalidate() when the particles are replaced.
+# Other profiles are simply recomputed on every call.
+class ProfileCache(object):
+	def __init__(self, profile):
+		self.profile = profile
+		self.cacheable = getattr(profile, "axiallyUniform", False)
+		self.invalidate()
+
+	def invalidate(self):
+		self.velocity = None
+		self.geometry = None
+
+	def __call__(self, data, geometry):
+		if not self.cacheable:
+			return self.profile(data, geometry)
+		if self.velocity is None or self.geometry is not geometry or np.shape(self.velocity) != np.shape(data):
+			self.velocity = self.profile(data, geometry)
+			self.geometry = geometry
+		return self.velocity
+
 class MoveParticles(object):
 	"""
 	MoveParticles takes as input a file with on each line (X Y Z) coordinates of a particle,
@@ -57,6 +92,10 @@ class MoveParticles(object):
 	Particles move in the z-direction
 	X,Y origin is centered around (0,0)
 
+	Several realisations (independent sets of N particles) can be evolved together.
+	They are stored as one (R*N,3) array, such that all are moved in a single vectorised pass,
+	and realisation r is written to the inner result directory outputDN/results_<r>.
+
 	Usage:
 	MoveParticles may be called in another Python file as follows:
 	from parentDir.filename import ClassName as mymodule
@@ -69,7 +108,7 @@ class MoveParticles(object):
 	## Constructors
 	####
 
-	def __init__(self, umean: float, spatialProfile, geometry, temporalModulation="none", outputDN="pos", starttime=0, verbose=False, overwrite=False):
+	def __init__(self, umean: float, spatialProfile, geometry, temporalModulation="none", outputDN="pos", starttime=0, exact=False, integrator="euler", binary=False, verbose=False, overwrite=False):
 	#def __init__(self, particlePosFileName: str, outputFolder: str, t_total: float, t_start: float, u: float, n_samples: int,
 	#			 flow_type: str, z_min: float, z_max: float, cyl_radius: float, overwrite, verbose=False):
 		"""
@@ -86,16 +125,22 @@ class MoveParticles(object):
 		:param cyl_radius: radius of the cylinder in mm
 		:param overwrite: overwrite the already existing output files, true or false
 		:param verbose: output debug message, true or false
+		:param exact: advect exactly, instead of with Euler substeps of size dt (requires an axially uniform spatial profile)
+		:param integrator: time integrator of the substeps of size dt, one of: integrators
+		:param binary: write the positions in the binary format instead of the (OpenFOAM-like) text format
 		"""
 
 		# Set these class member variables first
 		self.verbose = verbose
 		self.overwrite = overwrite
+		self.binary = bool(binary)
 		self.setTime(starttime)
 		self.setOutputDN(outputDN)
 
 		# Then set the other member variables 
-		self.data = None # List of particle position vectors
+		self.data = None # List of particle position vectors (of all realisations)
+		self.numRealisations = 1
+		self.realisationDNs = None # Names of the inner result directories, if there are multiple realisations
 		try:
 			self.umean = float(umean) # Mean velocity
 		except:
@@ -103,61 +148,129 @@ class MoveParticles(object):
 		self.setSpatialProfile(spatialProfile) # Callable that gives u(\vec{r})
 		self.setTemporalModulation(temporalModulation) # Callable that gives F(t) such that v(r,t)=u(r)F(t)
 		self.geometry = geometry
+		self.setExact(exact)
+		self.setIntegrator(integrator)
 		
 	
 	########
 	## I/O functions
 	####
 
+	# Reads the initial particle positions. FN is either
+	# - a particle positions filename;
+	# - a list of particle positions filenames: one per realisation;
+	# - a directory with inner result directories (results_<n>), which each contain the positions file of one realisation.
+	#	Its earliest positions file is used. The realisations are written to inner result directories with the same names.
 	def readData(self, FN):
+		if isinstance(FN, (list, tuple)):
+			if len(FN) == 1:
+				return self.readData(FN[0])
+			return self.readRealisations(FN)
 		# Check arguments
 		if ( FN is None or FN == "" ):
 			sys.exit("InvalidArgument: data filename cannot be None or \"\".\n" + str(locals()))
 		if ( not os.path.exists(FN) ):
 			sys.exit("\nERROR: Inputfile '" + FN + "' does not exist.\n" +
 					 "Terminating program.\n")
+		if os.path.isdir(FN):
+			resultDNs = optoFluidsIO.getResultDirs(FN)
+			FNs = [self.findFirstPosFN(DN) for DN in resultDNs]
+			return self.readRealisations(FNs, realisationDNs=[names.basename(DN) for DN in resultDNs])
 		
-		# Read start time from the particle positions file (if possible)
-		try:
-			groups = myRE.getMatchingGroups(names.basename(FN), re.compile(names.particlePositionsFNRE))
-			self.setTime(groups[0])
-		except:
-			pass
-
-		# Read inputfile and remove "(" and ")"
-		dataFile = open(FN)
-		dataStr = dataFile.read().replace("(", "").replace(")", "").strip()
-		# skip_header to skip the first two lines of the input file, which are (line 1) the number of particles integer and (line 2) just an opening bracket
-		self.setData(np.genfromtxt(StringIO(dataStr), skip_header=2))
-		dataFile.close()
+		(data, time) = self.readPositionsFile(FN)
+		if time is not None:
+			self.setTime(time)
+		self.setData(data)
+
+	# Reads one initial particle positions file per realisation and evolves them together.
+	# All realisations must have the same number of particles and the same start time.
+	# realisationDNs := names of the inner result directories to write them to. Defaults to results_1 ... results_R.
+	def readRealisations(self, FNs, realisationDNs=None):
+		if realisationDNs is None:
+			realisationDNs = [names.resInnerDN(r+1) for r in range(len(FNs))]
+		if len(realisationDNs) != len(FNs):
+			raise ValueError("Received " + str(len(FNs)) + " positions files, but " + str(len(realisationDNs)) + " realisation directories.")
+		datas = []
+		times = []
+		for FN in FNs:
+			if ( not os.path.isfile(FN) ):
+				sys.exit("\nERROR: Inputfile '" + str(FN) + "' does not exist.\n" +
+						 "Terminating program.\n")
+			(data, time) = self.readPositionsFile(FN)
+			if len(datas) > 0 and np.shape(data) != np.shape(datas[0]):
+				raise ValueError("All realisations must have the same number of particles, but \"" + str(FN) + "\" has " + 
+								str(len(data)) + " instead of " + str(len(datas[0])) + ".")
+			datas.append(data)
+			times.append(time)
+		if len(set(times)) != 1:
+			raise ValueError("All realisations must start at the same time, but received the start times: " + str(times) + ".")
+		if times[0] is not None:
+			self.setTime(times[0])
+		self.setData(np.array(datas))
+		self.realisationDNs = list(realisationDNs)
+
+	# Reads a particle positions file, in the text or binary format.
+	# @return: ( (N,3) array, time ), in which time is None if neither the file nor its name contains the time
+	def readPositionsFile(self, FN):
+		return optoFluidsIO.readFromFile_Positions(FN)
+
+	# Returns the earliest particle positions file inside DN.
+	def findFirstPosFN(self, DN):
+		posFiles = dirIndex.scan(DN, "positions")
+		if len(posFiles) == 0:
+			sys.exit("\nERROR: Directory '" + str(DN) + "' does not contain a particle positions file.\n" +
+					 "Terminating program.\n")
+		return posFiles.paths()[0]
 
+	# array is either (N,3) for a single realisation, or (R,N,3) for R realisations.
 	def setData(self, array):
 		# TODO: Validity check
-		self.data = array
+		array = np.asarray(array, dtype=float)
+		if array.ndim == 3:
+			self.numRealisations = array.shape[0]
+			self.data = np.reshape(array, (-1,3)) # Stored as (R*N,3), such that all are moved at once
+		else:
+			self.numRealisations = 1
+			self.data = array
+		self.realisationDNs = None
+		self.spatialProfileCache.invalidate() # new particles, so new radial positions
 		self.vprint("setData = " + str(self.data))
 
+	# View of the data as (R,N,3)
+	def getRealisations(self):
+		return np.reshape(self.data, (self.numRealisations, -1, 3))
+
 	def writeToFile(self, FN=None):
 		#outputFile = self.outputFolder + "particlePositions_t" + "{:.8f}.txt".format(
 		#	self.t_start + (j * self.t_total / (self.n_samples - 1))) #format well
 
+		if self.numRealisations > 1:
+			# Write each realisation to its own inner result directory
+			if self.realisationDNs is None:
+				self.realisationDNs = [names.resInnerDN(r+1) for r in range(self.numRealisations)]
+			for r, data in enumerate(self.getRealisations()):
+				if FN == None or FN == "":
+					FN_r = self.generatePosFN(self.time, self.realisationDNs[r])
+				else:
+					FN_r = names.joinPaths(names.joinPaths(self.outputDN, self.realisationDNs[r]), names.basename(FN))
+				self.writePositionsFile(FN_r, data)
+			return
+
 		if FN == None or FN == "":
 			FN = self.generatePosFN(self.time)
+		self.writePositionsFile(FN, self.data)
 
+	def writePositionsFile(self, FN, data):
 		if os.path.exists(FN) and not self.overwrite:
 			sys.exit("\nERROR: Outputfile '" + FN + "' already exists.\n" +
 					 "Terminating program to prevent overwrite. Use the -f option to enforce overwrite.\n")
 
 		# Create output directory if needed
-		if not os.path.exists(self.outputDN):
-			os.mkdir(self.outputDN)
-
-		f = open(FN, "w+")
-		f.write(str(len(self.data)) + "\n")
-		f.write("(\n")
-		for k, particle in enumerate(self.data):
-			f.write("(%0.15f %0.15f %0.15f)\n" % (self.data[k, 0], self.data[k, 1], self.data[k, 2]))
-		f.write(")")
-		f.close()
+		DN = os.path.dirname(FN)
+		if DN != "" and not os.path.exists(DN):
+			os.makedirs(DN)
+
+		optoFluidsIO.writeToFile_Positions(data, FN, time=self.time, binary=self.binary, overwrite=True)
 		
 
 	########
@@ -165,21 +278,69 @@ class MoveParticles(object):
 	####
 	def moveOnce(self, dt):
 		if dt == None: raise ValueError("Received dt="+str(dt)+", but expected a numeric value (float).")
-		profile = self.spatialProfile( self.data, self.geometry )
-		Ft = self.temporalModulation( self.time )
-		self.vprint("    Ft = " + str(Ft))
-		#print(self.data)
-		self.data = self.data + profile * self.umean * Ft * dt # update position dx = u * dt
+		if self.integrator == "euler":
+			profile = self.spatialProfileCache( self.data, self.geometry )
+			Ft = self.temporalModulation( self.time )
+			self.vprint("    Ft = " + str(Ft))
+			#print(self.data)
+			self.data = self.data + profile * self.umean * Ft * dt # update position dx = u * dt
+		else:
+			self.data = self.data + self.rungeKuttaStep(dt)
 		self.time = self.time + dt # tick
 		#print(self.data)
 		#profile = self.spatialProfile( (0,0,0), self.geometry )
 		#print( profile * self.umean * dt )
 		self.applyBC(periodic=True) # constrain in geometry
 
+	# Velocity v(\vec{r},t) = umean*u(\vec{r})*F(t) of the particles at the positions pos (all at once)
+	def velocity(self, pos, time):
+		return self.spatialProfileCache( pos, self.geometry ) * self.umean * self.temporalModulation( time )
+
+	# Displacement of the particles in one step dt, using the explicit midpoint ("rk2") or classic Runge-Kutta method ("rk4").
+	# The intermediate stages are not constrained by the geometry: moveOnce applies the BC once the step is complete.
+	def rungeKuttaStep(self, dt):
+		k1 = self.velocity( self.data, self.time )
+		if self.integrator == "rk2":
+			k2 = self.velocity( self.data + 0.5*dt*k1, self.time + 0.5*dt )
+			return dt * k2
+		k2 = self.velocity( self.data + 0.5*dt*k1, self.time + 0.5*dt )
+		k3 = self.velocity( self.data + 0.5*dt*k2, self.time + 0.5*dt )
+		k4 = self.velocity( self.data + dt*k3, self.time + dt )
+		return dt/6 * (k1 + 2*k2 + 2*k3 + k4)
+
+	# Advect the particles exactly from self.time to self.time+T.
+	# The velocity u(r)*F(t) does not vary along the direction of motion (axiallyUniform), so each particle
+	#  keeps its velocity profile and its displacement is simply u(r)*umean*integral(F(t),t,t+T).
+	# dt is only used if the temporalModulation has no "integral" method, see integrateModulation.
+	def moveExactly(self, T, dt=None):
+		profile = self.spatialProfileCache( self.data, self.geometry )
+		intF = self.integrateModulation( self.time, self.time + T, dt )
+		self.vprint("    integral(F) = " + str(intF))
+		self.data = self.data + profile * self.umean * intF
+		self.time = self.time + T
+		self.applyBC(periodic=True) # constrain in geometry
+
+	# Integral of the temporal modulation from t0 to t1.
+	# Uses its "integral" method if available, and otherwise the trapezoidal rule with a step of at most dt.
+	def integrateModulation(self, t0, t1, dt=None):
+		try:
+			return self.temporalModulation.integral(t0, t1)
+		except AttributeError:
+			pass
+		if dt == None: raise ValueError("The temporal modulation has no integral method, so a numeric dt (float) is required, but received dt="+str(dt)+".")
+		n = max(1, int(np.ceil( (t1-t0)/dt - 1e-6 )))
+		times = np.linspace(t0, t1, n+1)
+		F = np.broadcast_to(self.temporalModulation(times), np.shape(times)) # the modulations accept arrays
+		return np.sum( (F[1:]+F[:-1])/2 * np.diff(times) )
+
 	# Evolve particle positions (self.data) from t00 to t00+T with step dt
 	def evolveFor(self, dt, T, write=False):
 		t00=self.time # t00 := start time
 		self.vprint("self.evolveFor(dt="+str(dt)+", T="+str(T)+", write="+str(write)+") called from t="+str(t00)+":")
+		if self.exact:
+			if(T!=0): self.moveExactly(T, dt)
+			if(write): self.writeToFile()
+			return
 		if dt == None: raise ValueError("Received dt="+str(dt)+", but expected a numeric value (float).")
 		if(T==0): self.vprint("T=0, so nothing to evolve: returning."); return # Evolve for zero time? We're already done!
 		t0=t00 # t0 := last time, t1 := new (target) time
@@ -275,20 +436,34 @@ class MoveParticles(object):
 
 	# Bound/Constrain the particles by the geometry
 	def applyBC(self, periodic):
-		for k, particle in enumerate(self.data):
-			self.data[k] = self.geometry.constrain(particle, periodic=periodic)
+		self.geometry.constrainAll(self.data, periodic=periodic, inplace=True)
 
 	########
 	## Setters
 	####
-	def setSpatialProfile(self, prof):
+	# prof := name of a spatial profile (with its args and kwargs, if any), or an already selected callable
+	def setSpatialProfile(self, prof, *args, **kwargs):
 		self.vprint("setSpatialProfile: " + str(prof))
-		self.spatialProfile = RTS.select(spatialProfiles, str(opt.spatProf))
+		self.spatialProfile = RTS.select(spatialProfiles, prof if callable(prof) else str(prof), *args, **kwargs)
+		self.spatialProfileCache = ProfileCache(self.spatialProfile)
 
 	def setTemporalModulation(self, mod, *args, **kwargs):
 		self.vprint("setTemporalModulation: " + str(mod))
 		self.temporalModulation = RTS.select(temporalModulation, str(mod), *args, **kwargs)
 
+	def setExact(self, exact):
+		self.exact = bool(exact)
+		if self.exact and not getattr(self.spatialProfile, "axiallyUniform", False):
+			raise ValueError("Exact advection requires a spatial profile that does not vary along the flow direction, but received: " + str(self.spatialProfile) + ".")
+
+	def setIntegrator(self, integrator):
+		integrator = str(integrator).lower()
+		if integrator not in integrators:
+			raise ValueError("Unknown integrator \"" + str(integrator) + "\". Valid options are: " + str(integrators) + ".")
+		self.integrator = integrator
+		if self.exact and self.integrator != "euler":
+			self.vprint("Note: the integrator is not used in exact advection mode.")
+
 	def setOutputDN(self, DN):
 		# Check for existence of the files
 		if DN is None or DN == "":
@@ -323,8 +498,10 @@ class MoveParticles(object):
 			print(msg)
 
 	# Generate a name for the particlePositions filename using nameConvention
-	def generatePosFN(self, time):
-		return names.joinPaths(self.outputDN,names.particlePositionsFN(time))
+	# realisationDN := inner result directory, in case of multiple realisations
+	def generatePosFN(self, time, realisationDN=None):
+		DN = self.outputDN if realisationDN is None else names.joinPaths(self.outputDN, realisationDN)
+		return names.joinPaths(DN,names.particlePositionsFN(time))
 
 
 if __name__ == '__main__':
@@ -337,8 +514,10 @@ if __name__ == '__main__':
 	(opt, args) = (None, None)
 
 	# Parse options
-	parser.add_option('-i', dest='partPosFN',
-						   help="filename of the particle positions"),
+	parser.add_option('-i', dest='partPosFN', action="append",
+						   help="filename of the particle positions. " +
+							"Specify -i multiple times to evolve several realisations together, which are written to \"<outputfolder>/results_<n>\". " +
+							"Alternatively, specify a directory of inner result directories (\"results_<n>\") which each contain the initial positions file of one realisation."),
 	parser.add_option('-o', dest='outputDN', default=".",
 						   help="name of the output directory")
 #	parser.add_option('--t_start', dest='t_start',
@@ -347,6 +526,12 @@ if __name__ == '__main__':
 						   help="mean speed of the flow (both in space and time)")
 	parser.add_option('-d', '--dt', dest='dt', type="float",
 						   help="Timestep used for numerical integration. If the writeInterval is lower than dt, then a lower dt is automatically used.")
+	parser.add_option('--exact', action="store_true", dest="exact", default=False,
+						   help="Advect exactly to each write time instead of using Euler steps of size dt. " +
+							"Requires an axially uniform --flow profile. dt is then only used to integrate a --mod that has no exact integral. [default: %default]")
+	parser.add_option('--integrator', dest='integrator', default="euler", choices=integrators,
+						   help="time integrator of the steps of size dt, one of: " + str(integrators) + ". " +
+							"Use rk2 or rk4 for flow profiles that vary along the flow direction (e.g., gridded). [default: %default]")
 	parser.add_option('-T', dest='t_total', type="float",
 						   help="Total simulation time period")
 	parser.add_option('-n', dest='n_total', type="int",
@@ -357,6 +542,8 @@ if __name__ == '__main__':
 						   help="Number of camera integration samples. You'll have n+1 datafiles for each camera integration.")
 	parser.add_option('--flow', dest='spatProf',
 						   help="spatial flow profile, one of: " + str(RTS.getFunctions(spatialProfiles)))
+	parser.add_option('--flowargs', dest='spatProf_args',
+						   help="Required arguments for the spatial flow profile (if any). Separate the parameters with a semicolon (e.g., --flowargs \"U.npz;scaleToMeanOne=False\").")
 	parser.add_option('--mod', dest='tempMod', default="none",
 						   help="temporal flow modulation, one of: " + str(RTS.getFunctions(temporalModulation)))
 	parser.add_option('--modargs', dest='tempMod_args',
@@ -367,6 +554,8 @@ if __name__ == '__main__':
 						   help="origin '(x,y,z)' of cylinder")
 	parser.add_option('-R', dest='cyl_radius',
 						   help="radius of cylinder")
+	parser.add_option("--binary", action="store_true", dest="binary", default=False,
+						   help="write the positions in the binary format instead of as text. The optics code reads both. [default: %default]")
 	parser.add_option("-v", action="store_true", dest="verbose", default=False,
 						   help="verbose [default: %default]")
 	parser.add_option("-f", action="store_true", dest="overwrite", default=False,
@@ -384,11 +573,16 @@ if __name__ == '__main__':
 	#exit()
 
 	# Prepare moveParticles
+	(spatProf_args, spatProf_kwargs) = RTS.multiArgStringToArgs(opt.spatProf_args)
+	spatProf = RTS.select(spatialProfiles, str(opt.spatProf), *spatProf_args, **spatProf_kwargs)
 	mover = MoveParticles(
 		umean=opt.umean,
-		spatialProfile=opt.spatProf,
+		spatialProfile=spatProf,
 		geometry=myGeom,
 		outputDN=opt.outputDN,
+		exact=opt.exact,
+		integrator=opt.integrator,
+		binary=opt.binary,
 		verbose=opt.verbose,
 		overwrite=opt.overwrite
 	)
@@ -8,10 +8,16 @@
 #	23 11 2018: Original
 #	05 02 2019: "constant" is now overloaded with the name "plug"
 #	06 02 2019: Now gives a profile with mean one, instead of maximum one.
+#	18 10 2026: Profiles that do not vary along shape.orientation are flagged "axiallyUniform",
+#				which allows moveParticles to advect them exactly (and to cache them, see moveParticles.ProfileCache).
+#				Poiseuille now takes shape.orientation into account.
+#				"gridded": a velocity field sampled on a regular 3D grid (e.g., exported from an OpenFOAM case), trilinearly interpolated.
 #
 
 # Misc imports
 import sys
+import os.path
+from io import StringIO
 # Numerics
 import numpy as np # Matrices
 # Import from optoFluids:
@@ -26,6 +32,17 @@ def constant(pos, shape: 'Shape'):
 		return np.reshape([1],(1,1)) * shape.orientation
 def plug(pos, shape: 'Shape'):
 	return constant(pos,shape)
+constant.axiallyUniform = True
+plug.axiallyUniform = True
+
+##
+# Squared distance of the particle(s) to the axis through shape.origin in the direction shape.orientation.
+# Works on an (N,3) array or a single position; always returns an array of length N (or 1).
+def _radiusSquared(pos, shape):
+	posRel = np.reshape(pos, (-1,3)) - np.asarray(shape.origin, dtype=float) # relative to the axis
+	proj = np.dot(posRel, shape.orientation) # project on the axis
+	perp = posRel - proj[:,np.newaxis] * shape.orientation # component perpendicular to the axis
+	return np.sum(np.square(perp), axis=1)
 
 ##
 # Hagen-Poiseuille flow (i.e., laminar cylindrical flow) in the direction "shape.orientation"
@@ -33,18 +50,12 @@ def Poiseuille(pos, shape: 'Cylinder'):
 	# Check input
 	if ( not isinstance(shape, geom.Cylinder) ):
 		sys.exit("Poiseuille flow requires a cylindrical geometry, but was given a: " + str(type(shape)))
-	# Deal with both array and singular:
-	# TODO: x and y currently do not take orientation into account yet: they assume blindly that orientation=(0,0,1)
-	try: # Array
-		x = pos[:,0]
-		y = pos[:,1]
-	except: # Single: make them into an array of size 1
-		x = [pos[0]]
-		y = [pos[1]]
+	# Deal with both array and singular, and with any orientation of the cylinder:
+	r2 = _radiusSquared(pos, shape)
 	#print(shape.origin)
 	# Calculate profile:
 	profile = (
-			( shape.R ** 2 - (np.square(x-shape.origin[0]) + np.square(y-shape.origin[1])) )  # Poseuille like = R ^ 2 - r ^ 2
+			( shape.R ** 2 - r2 )  # Poseuille like = R ^ 2 - r ^ 2
 			/ (shape.R ** 2)	# Normalize = 1 - (r ^ 2) / (R ^ 2).
 			)
 	# Make its mean one:
@@ -57,5 +68,87 @@ def Poiseuille(pos, shape: 'Cylinder'):
 	profile = np.reshape(profile,(len(profile),1)) * shape.orientation
 	# Done:
 	return profile
-	
+Poiseuille.axiallyUniform = True
+
+##
+# Velocity field sampled on a regular 3D grid (e.g., exported from an OpenFOAM case), for geometries other than a straight cylinder.
+#  The field is trilinearly interpolated for all particles at once.
+#  Particles outside of the grid get the velocity of the nearest grid boundary.
+#  It varies along the flow direction, so it cannot be advected exactly: use the rk2 or rk4 integrator of moveParticles.
+# field := filename of either
+#	- an ".npz" file with the arrays "origin" (3), "spacing" (3) and "U" (nx,ny,nz,3), in which U[i,j,k] is located at origin+(i,j,k)*spacing;
+#	- a text file with on each row "x y z Ux Uy Uz" (brackets are ignored), in any order, which together form a complete regular grid.
+# scaleToMeanOne := divide the field by the mean speed of the grid points at which the fluid moves, such that umean sets the mean speed.
+#	Otherwise the field is used as-is (i.e., use umean=1).
+class gridded:
+	def __init__(self, field, scaleToMeanOne=True):
+		if isinstance(scaleToMeanOne, str): # from the CLI
+			scaleToMeanOne = scaleToMeanOne.strip().lower() not in ("false", "0", "no")
+		if ( field is None or field == "" ):
+			raise ValueError("Received field=" + str(field) + ", but it cannot be None or \"\".")
+		if ( not os.path.isfile(field) ):
+			raise ValueError("File \"" + str(field) + "\" does not exist.")
+		if str(field).endswith(".npz"):
+			with np.load(field) as npz:
+				(origin, spacing, U) = (npz["origin"], npz["spacing"], npz["U"])
+		else:
+			(origin, spacing, U) = _readGridFromText(field)
+		self.setField(origin, spacing, U, scaleToMeanOne)
+
+	def setField(self, origin, spacing, U, scaleToMeanOne=True):
+		self.origin = np.asarray(origin, dtype=float).reshape(3)
+		self.spacing = np.asarray(spacing, dtype=float).reshape(3)
+		self.U = np.asarray(U, dtype=float)
+		if self.U.ndim != 4 or self.U.shape[3] != 3:
+			raise ValueError("The velocity field must have the shape (nx,ny,nz,3), but has the shape " + str(self.U.shape) + ".")
+		self.n = np.array(self.U.shape[:3])
+		if np.any(self.n < 2):
+			raise ValueError("The grid requires at least two points in each direction, but has " + str(tuple(self.n)) + ".")
+		if np.any(self.spacing <= 0):
+			raise ValueError("The grid spacing must be positive, but is " + str(self.spacing) + ".")
+		if scaleToMeanOne:
+			speed = np.linalg.norm(self.U, axis=3)
+			speed = speed[speed > 0]
+			if len(speed) == 0:
+				raise ValueError("Cannot scale the velocity field to a mean of one, because it is zero everywhere.")
+			self.U = self.U / np.mean(speed)
+
+	def __call__(self, pos, shape: 'Shape' = None):
+		pos = np.reshape(pos, (-1,3))
+		f = (pos - self.origin) / self.spacing # fractional grid index
+		i0 = np.clip(np.floor(f).astype(int), 0, self.n - 2) # lower corner of the cell
+		w1 = np.clip(f - i0, 0, 1) # weight of the upper corner (clipped: nearest boundary outside the grid)
+		w0 = 1 - w1
+		profile = np.zeros((len(pos),3))
+		for di in (0, 1):
+			wx = w1[:,0] if di else w0[:,0]
+			for dj in (0, 1):
+				wxy = wx * (w1[:,1] if dj else w0[:,1])
+				for dk in (0, 1):
+					w = wxy * (w1[:,2] if dk else w0[:,2])
+					profile += w[:,np.newaxis] * self.U[i0[:,0]+di, i0[:,1]+dj, i0[:,2]+dk]
+		return profile
 
+# Reads a text file with on each row "x y z Ux Uy Uz" of which the points form a regular grid.
+# @return: (origin, spacing, U) as used by gridded
+def _readGridFromText(FN):
+	with open(FN) as dataFile:
+		dataStr = dataFile.read().replace("(", " ").replace(")", " ")
+	data = np.loadtxt(StringIO(dataStr), ndmin=2)
+	if data.shape[1] != 6:
+		raise ValueError("File \"" + str(FN) + "\" must have six columns (x y z Ux Uy Uz), but has " + str(data.shape[1]) + ".")
+	origin = np.min(data[:,:3], axis=0)
+	extent = np.max(data[:,:3], axis=0) - origin
+	# Number of distinct coordinates in each direction, insensitive to the round-off of the written coordinates:
+	n = np.array([ len(np.unique(np.rint((data[:,d]-origin[d])/extent[d]*1e9))) if extent[d] > 0 else 1 for d in range(3) ])
+	if np.any(n < 2) or np.prod(n) != len(data):
+		raise ValueError("The points in \"" + str(FN) + "\" do not form a complete regular grid (" + str(len(data)) + " points, " + str(tuple(n)) + " distinct coordinates).")
+	spacing = extent / (n - 1)
+	index = np.rint((data[:,:3] - origin) / spacing).astype(int)
+	if np.max(np.abs(origin + index*spacing - data[:,:3]) / spacing) > 1e-6:
+		raise ValueError("The points in \"" + str(FN) + "\" are not uniformly spaced.")
+	U = np.full((n[0], n[1], n[2], 3), np.nan)
+	U[index[:,0], index[:,1], index[:,2]] = data[:,3:6]
+	if np.any(np.isnan(U)):
+		raise ValueError("The points in \"" + str(FN) + "\" do not form a complete regular grid (duplicate points).")
+	return (origin, spacing, U)
@@ -8,13 +8,20 @@
 #	23 11 2018: Original
 #	04 12 2018: Implemented lookupTable
 #	05 02 2019: Implemented sine function
+#	18 10 2026: All modulations accept array input, and have an "integral(t0,t1)" method.
+#				"none" is now a class, like the others.
 
 import os.path
 import numpy as np
 from io import StringIO
 
-def none(t):
-	return 1
+class none:
+	def __call__(self, t):
+		if np.ndim(t) == 0:
+			return 1
+		return np.ones(np.shape(t))
+	def integral(self, t0, t1):
+		return np.subtract(t1, t0)
 
 class sin:
 	# 'frequency' is the frequency [Hz] of the sine function, such that period=1/f and omega=2*pi*f.
@@ -31,6 +38,12 @@ class sin:
 	def __call__(self, t):
 		# A*sin(wt+phi)+1 has mean one.
 		return np.sin(self.omega * t + self.phase)*self.amp + 1 + self.offset
+	# Integral of __call__ from t0 to t1 (closed form)
+	def integral(self, t0, t1):
+		mean = (1 + self.offset) * np.subtract(t1, t0)
+		if self.omega == 0:
+			return mean + np.sin(self.phase)*self.amp * np.subtract(t1, t0)
+		return mean - self.amp/self.omega * ( np.cos(self.omega * t1 + self.phase) - np.cos(self.omega * t0 + self.phase) )
 
 class lookupTable:
 	def __init__(self, table, boundaryStrategy="cyclic", scaleToMeanOne=True): #TODO: offset time;
@@ -97,53 +110,75 @@ class lookupTable:
 		## OK!
 		self.table = table
 		#print("Table = ", table)
+		# Cumulative trapezoidal integral at the table's times, used by "integral":
+		self.cumIntegral = np.concatenate(( [0], np.cumsum( (table[1:,1]+table[:-1,1])/2 * np.diff(table[:,0]) ) ))
 
 	# Apply the boundaryStrategy to determine at what time the table should be read:
 	# Clamp = min or max t of table
 	# Cyclic = apply modulus to bound t to the table's range
 	# Reverse = like cyclic, but reverse consecutive cycles
+	# Works for a single time and for an array of times.
 	def handleBoundary(self, t):
 		tmin = self.table[0,0]
 		tmax = self.table[-1,0]
 		if self.boundaryStrategy=="clamp":
-			return min(max(t,tmin),tmax)
+			return np.clip(t,tmin,tmax)
 		if self.boundaryStrategy=="cyclic":
 			T = tmax-tmin
-			return (t-tmin)%T+tmin
+			return np.mod(t-tmin,T)+tmin
 		if self.boundaryStrategy=="reverse":
 			T = tmax-tmin
-			numOff=int((t-tmin)/T)
-			if t<tmin: numOff=numOff-1 # int(-0.1)=0, but I need it to be -1. Otherwise the "numOff" series is: (...,-1,0,0,1,2,3,...), which is no good: 0 repeats.
+			numOff=np.trunc((t-tmin)/T)
+			numOff=numOff-np.less(t,tmin) # trunc(-0.1)=0, but I need it to be -1. Otherwise the "numOff" series is: (...,-1,0,0,1,2,3,...), which is no good: 0 repeats.
 			#print("numOff=", numOff)
-			if(numOff%2 == 0): #then cyclic
-				#print("just cyclic")
-				return (t-tmin)%T+tmin
-			else: #then reverse
-				#print("reverse cyclic")
-				return tmax-(t-tmin)%T
+			# Even numOff: cyclic; odd numOff: reverse cyclic
+			return np.where(np.mod(numOff,2) == 0, np.mod(t-tmin,T)+tmin, tmax-np.mod(t-tmin,T))
 		raise ValueError('[temporalModulation] "' + str(self.boundaryStrategy) + '" is not a valid boundaryStrategy.\n' + 
 						'Valid strategies are: "clamp", "cyclic", "reverse".')
 
+	# Works for a single time and for an array of times.
 	def __call__(self, t):
-		#t=1.34-1e-3-1e-4
 		#print("called with t = " + str(t))
-		#print("time1 = " + str(t))
 		t = self.handleBoundary(t) # Apply boundaryStrategy to time to bound it within the table's range
-		#print("time2 = " + str(t))
-		# Find location in table that t may be interpolated from:
-		ti = np.searchsorted(self.table[:,0],t) # Find first index >= t
-		#print("t=" + str(t) + "--> ti=" +str(ti) + "--> t(ti)=" + str(self.table[ti,0]))
-		# Interpolate between ti-1 and ti:
-		if not ti == 0:
-			f = (
-					( t - self.table[ti-1,0] )
-					/
-					( self.table[ti,0] - self.table[ti-1,0] )
-				)
-			val = self.table[ti,1]*f + self.table[ti-1,1]*(1-f)
-		else:
-			val = self.table[0,1]
-		return val
+		# Linearly interpolate in the table:
+		return np.interp(t, self.table[:,0], self.table[:,1])
+
+	# Integral of __call__ from t0 to t1, honouring the boundaryStrategy.
+	# Uses the precomputed cumulative integral, so it costs a single table lookup.
+	def integral(self, t0, t1):
+		return self.antiderivative(t1) - self.antiderivative(t0)
+
+	# Integral of __call__ from the table's first time to t (negative if t lies before it).
+	def antiderivative(self, t):
+		t = np.asarray(t, dtype=float)
+		tmin = self.table[0,0]
+		tmax = self.table[-1,0]
+		total = self.cumIntegral[-1] # integral over one period of the table
+		if self.boundaryStrategy=="clamp":
+			# Constant extension beyond the table
+			return np.where(t < tmin, (t-tmin)*self.table[0,1],
+				np.where(t > tmax, total + (t-tmax)*self.table[-1,1], self.tableAntiderivative(np.clip(t,tmin,tmax))))
+		if self.boundaryStrategy=="cyclic" or self.boundaryStrategy=="reverse":
+			T = tmax-tmin
+			numOff = np.floor((t-tmin)/T)
+			r = (t-tmin) - numOff*T # position within the current period
+			if self.boundaryStrategy=="cyclic":
+				return numOff*total + self.tableAntiderivative(tmin+r)
+			# Reverse: odd periods traverse the table backwards, so they accumulate from tmax downwards.
+			return np.where(np.mod(numOff,2) == 0,
+				numOff*total + self.tableAntiderivative(tmin+r),
+				(numOff+1)*total - self.tableAntiderivative(tmax-r))
+		raise ValueError('[temporalModulation] "' + str(self.boundaryStrategy) + '" is not a valid boundaryStrategy.\n' + 
+						'Valid strategies are: "clamp", "cyclic", "reverse".')
+
+	# Integral of the (linearly interpolated) table from its first time to t, for tmin <= t <= tmax.
+	def tableAntiderivative(self, t):
+		times = self.table[:,0]
+		values = self.table[:,1]
+		i = np.clip(np.searchsorted(times, t, side="right")-1, 0, len(times)-2) # t lies in [times[i], times[i+1]]
+		dt = t - times[i]
+		slope = (values[i+1]-values[i]) / (times[i+1]-times[i])
+		return self.cumIntegral[i] + values[i]*dt + 0.5*slope*np.square(dt)
 
 
 
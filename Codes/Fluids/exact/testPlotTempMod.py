@@ -96,9 +96,7 @@ if __name__ == '__main__':
 
 	# Sample data:	
 	t = np.arange(float(opt.t0), float(opt.t1), float(opt.dt))
-	y = np.zeros(len(t))
-	for ti in range(len(t)):
-		y[ti] = temporalModulation(t[ti])
+	y = temporalModulation(t)
 
 	# Plot:
 	fig = plt.figure(dpi=dpi)
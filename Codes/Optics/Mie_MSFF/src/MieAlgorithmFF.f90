@@ -22,6 +22,8 @@ module MieAlgorithmFF
     real*4 :: kihat(3) ! incident plane wave -> unit wave vector
     real*4 :: k       ! incident plane wave -> wave number [m-1]
     real*4 :: Eihat(3)! incident electric field polarisation -> unit vector. Orthogonal to kihat per definition. Linearly polarised per definition (real vector).
+    real*4 :: x       ! size parameter of the spheres
+    complex :: refrel ! refr. index of sphere / refr. index of surrounding medium
 !   complex :: E0     ! incident field amplitude, Ei = Eihat * Re{ E0 * exp(i(kz-wt)) }
 
     real*4, parameter :: xhat(3) = (/ 1, 0, 0 /)
@@ -36,7 +38,7 @@ module MieAlgorithmFF
 ! Flags
     logical :: dop0 ! Include p=0 term on the camera measurement?
     
-    public :: run
+    public :: run, runBatch
     
 contains
     
@@ -44,16 +46,17 @@ contains
 ! |           IO           |
 ! \************************/
         
-    subroutine init(inputfile)
+! When skipPositions is true, no particle positions are read and no SphereManager is created (see runBatch).
+    subroutine init(inputfile, skipPositions)
         character(len=*) :: inputfile
+        logical, optional :: skipPositions
     ! Camera parameters
         integer :: nPixel1, nPixel2
         real*4 :: r0(3), r1(3), r2(3)
     ! SphereManager parameters
         real*4, allocatable :: spherePos(:,:)
-        complex :: refrel
         real*4 :: refre, refim, refmed ! Re{refr. index of sphere}, Im{refr. index of sphere}, refr. index of surrounding medium
-        real*4 :: wavel, x, rad ! wavelength (vacuum), size parameter, radius of sphere
+        real*4 :: wavel, rad ! wavelength (vacuum), radius of sphere
     ! ScatterStrategy parameter		
         character(len=:), allocatable :: strategyKeyword ! Keyword of the scattering strategy to use
 
@@ -67,7 +70,7 @@ contains
 
     ! Obtain parameters from the input file
         call readParameters(inputfile, refre, refim, refmed, wavel, rad, kihat, Eihat, spherePos, &
-                            cam, conv_minp, conv_maxp, dop0, strategyKeyword)
+                            cam, conv_minp, conv_maxp, dop0, strategyKeyword, skipPositions)
         
     ! Derived parameters / Create objects
         refrel = cmplx(refre,refim)/refmed
@@ -97,7 +100,7 @@ contains
         !allocate(cam, sphmgr, scatterer)
         allocate(sphmgr, scatterer)
         !cam = Camera(nPixel1, nPixel2, r0, r1, r2)
-        sphmgr = SphereManager(spherePos, x, refrel)
+        if(allocated(spherePos)) sphmgr = SphereManager(spherePos, x, refrel)
 
         ! This is the new scatterer abstraction. Calculates scattering matrix either using the old style (mieAlgor each time), 
         ! or the new style: interpolation (runs mybhmie once on initialization)
@@ -123,6 +126,17 @@ contains
 ! /************************\
 ! |    		 Algorithm Logic  		  |
 ! \************************/
+
+! Scatters the incident field by all spheres of sphmgr and accumulates the result on the camera
+    subroutine compute()
+        if(conv_maxp >= 1)&      ! Only do initialScatter() for p>=1. I.e., when the spheres matter at all.
+            call initialScatter()   ! Call the scatter logic for the incident PW
+
+        if(conv_maxp > 2)&       ! Only do multiScatter() for p>=3. These scattering orders do not directly relate to the incident field.
+            call multiScatter()     ! Call the scatter logic for the multiscattering process
+
+        call scatter2Camera()   ! Scatter the fields of all scattering orders, accumulated at the spheres, to the camera
+    end subroutine compute
         
     subroutine initialScatter()
         real*8, allocatable :: CosSAngles(:)    ! All scattering angles which require computation; size = (numAngles = number of targets)
@@ -621,19 +635,77 @@ contains
         call startClock()
         call init(inputfile)    ! Read input parameters, declare constants, instantiate objects
 
-        if(conv_maxp >= 1)&      ! Only do initialScatter() for p>=1. I.e., when the spheres matter at all.
-            call initialScatter()   ! Call the scatter logic for the incident PW
-
-        if(conv_maxp > 2)&       ! Only do multiScatter() for p>=3. These scattering orders do not directly relate to the incident field.
-            call multiScatter()     ! Call the scatter logic for the multiscattering process
-
-        call scatter2Camera()   ! Scatter the fields of all scattering orders, accumulated at the spheres, to the camera
+        call compute()          ! Scatter the incident field by all spheres onto the camera
 
         call output()           ! Write output fields
 
         write(6,*) printGlobalElapsedTime()
         call debugmsg(0,"Starter",timestamp())
     end subroutine run
+
+! Like run, but computes the intensity for many particle positions files using the same input file.
+!  The batchfile holds one "<particlePositionsFN> <intensityFN>" pair per line (paths may not contain spaces).
+!  The parameters, camera and scatterer (incl. its interpolation tables) are set up only once,
+!  such that the start-up cost is paid once per batch rather than once per positions file.
+!  The particlePositionsFN and intensityFN of the input file itself are ignored.
+    subroutine runBatch(inputfile, batchfile)
+        character(len=*) :: inputfile, batchfile
+        character(len=1000) :: line
+        character(len=:), allocatable :: posFile, intFile
+        real*4, allocatable :: spherePos(:,:)
+        logical :: batchfileExists
+        integer :: i, ios, numDone
+
+        call debugmsg(0,"Starter",timestamp())
+        call startClock()
+
+        inquire(file=batchfile,exist=batchfileExists)
+        if(.not. batchfileExists) then
+            write(0,*) "---ERROR--- Specified batchfile does not exist: ", trim(batchfile)
+            call exit(1)
+        end if
+
+        call init(inputfile, skipPositions=.true.) ! Read input parameters, declare constants, instantiate camera and scatterer
+        call writeCoords(cam)   ! The pixel coordinates are identical for each positions file
+
+        numDone = 0
+        open(unit=12, file=batchfile, form="FORMATTED", status="OLD", action="READ")
+        do
+            read(unit=12, fmt='(A)', iostat=ios) line
+            if(ios /= 0) exit
+            line = adjustl(line)
+            if(len_trim(line) == 0 .or. line(1:1) == '!') cycle
+            i = index(trim(line),' ')
+            if(i == 0) then
+                write(0,*) "---ERROR--- Expected '<particlePositionsFN> <intensityFN>' in batchfile, but found: ", trim(line)
+                call exit(1)
+            end if
+            posFile = trim(line(1:i-1))
+            intFile = trim(adjustl(line(i+1:)))
+            call debugmsg(1,"MieAlgorithmFF","Batch: '" // posFile // "' -> '" // intFile // "'")
+
+            ! New spheres for the new positions, same camera
+            call readPositions(posFile, spherePos)
+            if(allocated(sphmgr)) then
+                call sphmgr%clear()
+                deallocate(sphmgr)
+            end if
+            allocate(sphmgr)
+            sphmgr = SphereManager(spherePos, x, refrel)
+            call cam%resetEField()
+
+            call compute()
+            call setIntensityOutFile(intFile)
+            call writeOutput(cam)
+            call flush(6) ! Important progress point -> flush stdout
+            numDone = numDone + 1
+        end do
+        close(unit=12)
+
+        call debugmsg(1,"MieAlgorithmFF","Batch: number of positions files processed = ", numDone)
+        write(6,*) printGlobalElapsedTime()
+        call debugmsg(0,"Starter",timestamp())
+    end subroutine runBatch
     
 end module MieAlgorithmFF
 
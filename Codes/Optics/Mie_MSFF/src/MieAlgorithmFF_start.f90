@@ -3,10 +3,16 @@
 ! \************************/
 
 program main
-    use MieAlgorithmFF, only: run
+    use MieAlgorithmFF, only: run, runBatch
 
     character(len=1000) :: inputfile
+    character(len=1000) :: batchfile ! optional: list of "<particlePositionsFN> <intensityFN>" pairs
 
     call getarg(1,inputfile)
-    call run(inputfile)
+    call getarg(2,batchfile)
+    if(len_trim(batchfile) > 0) then
+        call runBatch(inputfile, batchfile)
+    else
+        call run(inputfile)
+    end if
 end program main
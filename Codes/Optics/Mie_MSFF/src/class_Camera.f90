@@ -22,7 +22,7 @@ module class_Camera
         final :: destroy
         procedure         :: generatePixels
         procedure, public :: getPixelCoords
-        procedure, public :: addEField, getIntensity
+        procedure, public :: addEField, getIntensity, resetEField
     end type Camera
     interface Camera ! Constructor: http://climate-cms.unsw.wikispaces.net/Object-oriented+Fortran#Constructors
         procedure :: create
@@ -72,6 +72,12 @@ contains
         if(allocated(this%rp))      deallocate(this%rp)
     end subroutine destroy
 
+!	Clears the accumulated electric field, such that the same camera can measure a new scatterer configuration.
+    subroutine resetEField(this)
+        class(Camera) :: this
+        this%eField = 0
+    end subroutine resetEField
+
 !	Converts r1, r2, nPixel1 and nPixel2 into rp(3,nPixel1*nPixel2): the positions of all pixels.
     subroutine generatePixels(this)
         class(Camera) :: this
@@ -84,7 +84,8 @@ contains
     subroutine deallocateS(this)
         class(Sphere) :: this
           call debugmsg(4,"Sphere","Deallocating S for " // this%toString())
-        deallocate(this%S1,this%S2)
+        if(allocated(this%S1)) deallocate(this%S1)
+        if(allocated(this%S2)) deallocate(this%S2)
     end subroutine deallocateS
 
     subroutine allocateE(this,Nsph)
@@ -100,7 +101,9 @@ contains
 
     subroutine deallocateE(this)
         class(Sphere) :: this
-        deallocate(this%eField_new,this%eField_old,this%eField_acm)
+        if(allocated(this%eField_new)) deallocate(this%eField_new)
+        if(allocated(this%eField_old)) deallocate(this%eField_old)
+        if(allocated(this%eField_acm)) deallocate(this%eField_acm)
     end subroutine deallocateE
 
 ! Moves eField_new to eField_old and clears eField_new afterwards
@@ -17,7 +17,7 @@ module class_SphereManager
         private
         final :: destroy
         procedure         :: initSpheres
-        procedure, public :: getNumSpheres, getSphere
+        procedure, public :: getNumSpheres, getSphere, clear
 !        procedure, public :: computeCosScatteringAngles
     end type SphereManager
     interface SphereManager ! Constructor: http://climate-cms.unsw.wikispaces.net/Object-oriented+Fortran#Constructors
@@ -45,6 +45,21 @@ contains
 !        if(associated(this%sphereList)) deallocate(this%sphereList)
     end subroutine destroy
 
+! Deallocates all spheres and the list that points to them.
+!  Not done by the finaliser, as the constructor result is copied by pointer upon assignment.
+    subroutine clear(this)
+        class(SphereManager) :: this
+        type(Sphere), pointer :: sph
+        integer :: i
+        if(.not. allocated(this%sphereList)) return
+        do i = 1, size(this%sphereList)
+            sph => this%sphereList(i)%sphPtr ! Deallocate through a local pointer (gfortran 12 ICE with -O3 -fbounds-check)
+            if(associated(sph)) deallocate(sph)
+            nullify(this%sphereList(i)%sphPtr)
+        end do
+        deallocate(this%sphereList)
+    end subroutine clear
+
 ! Initialises all spheres based on the given input positions
     subroutine initSpheres(this, spherePos)
         class(SphereManager) :: this
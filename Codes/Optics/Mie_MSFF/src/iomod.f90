@@ -5,6 +5,8 @@
 !  Perhaps this can be changed to used a general set of IO methods the strategies can use as needed... later.
 ! Kevin van As
 !  - Now reads all strings while using an allocatable and a common buffer
+!  - readPositions also reads the binary particle positions format (see helpers/IO.py)
+!  - readParameters can skip reading the positions, and the intensity output file can be changed afterwards (batch mode)
 ! 
 module iomod
     use DEBUG
@@ -18,15 +20,16 @@ module iomod
     character (len=:), allocatable :: intensityOutFile
     
     public :: readParameters, readPositions
-    public :: writeCoords, writeOutput
+    public :: writeCoords, writeOutput, setIntensityOutFile
 
     public :: skipcomments, removecomment
     
 contains
     
     subroutine readParameters(inputfile, refre, refim, refmed, wavel, rad, khat, Eihat, spherePos, &
-                                cam, conv_minp, conv_maxp, dop0, strategyKeyword)
+                                cam, conv_minp, conv_maxp, dop0, strategyKeyword, skipPositions)
         character(len=*), intent(in) :: inputfile
+        logical, optional, intent(in) :: skipPositions ! If true, do not read the particle positions file (batch mode)
         logical inputfileExists
 
     ! Helpers
@@ -54,7 +57,7 @@ contains
         inquire(file=inputfile,exist=inputfileExists)
         if(.not. inputfileExists) then
             write(0,*) "---ERROR--- Specified inputfile does not exist: ", inputfile
-            call exit(0) 
+            call exit(1)
         end if
         open(unit=10, file=inputfile, form="FORMATTED", status="OLD", action="READ")
 
@@ -182,9 +185,20 @@ contains
         endif
 
     ! Read sphere positions
+        if(present(skipPositions)) then
+            if(skipPositions) return
+        endif
         call readPositions(prtcPosFile, spherePos)
 
     end subroutine readParameters
+
+! Changes the file to which writeOutput writes the intensity
+    subroutine setIntensityOutFile(filename)
+        character (len=*), intent(in) :: filename
+        if(allocated(intensityOutFile)) deallocate(intensityOutFile)
+        allocate(intensityOutFile, source = trim(filename))
+        call debugmsg(2, "IO","intensityOutFile = " // intensityOutFile)
+    end subroutine setIntensityOutFile
     
     subroutine readPositions(filename,r)
         character (len=*), intent(in) :: filename
@@ -197,8 +211,9 @@ contains
         inquire(file=filename,exist=inputfileExists)
         if(.not. inputfileExists) then
             write(0,*) "---ERROR--- Specified ParticlePosition file does not exist: ", trim(filename)
-            call exit(0) 
+            call exit(1)
         end if
+        if (readPositionsBinary(filename,r)) return
         open(unit=10, file=filename, form="FORMATTED", status="OLD", action="READ")
         call debugmsg(3, "IO","File opened, starting reading: " // filename)
 
@@ -224,6 +239,47 @@ contains
         call debugmsg(3, "IO","Finished reading. File closed: " // filename)
     end subroutine readPositions
 
+! Reads the particle positions if the file is in the binary format, and then returns true.
+! Returns false, without reading, if it is not.
+! Binary format: a 32-byte header, followed by the positions as (x,y,z) float64 triplets.
+!  header: magic "OFPOSBIN", version (int32), reserved (int32), N (int64), time (float64)
+! The data is little-endian, as is the native byte order of the machines we run on.
+    function readPositionsBinary(filename,r) result(isBinary)
+        character (len=*), intent(in) :: filename
+        real*4, allocatable, intent(out) :: r(:,:)
+        logical :: isBinary
+        character (len=8) :: magic
+        integer*4 :: version, reserved
+        integer*8 :: numPos
+        real*8 :: time
+        real*8, allocatable :: buffer(:,:)
+        integer :: ios
+
+        isBinary = .false.
+        open(unit=10, file=filename, access="STREAM", form="UNFORMATTED", status="OLD", action="READ")
+        read(10, iostat=ios) magic
+        if (ios /= 0 .or. magic /= "OFPOSBIN") then
+            close(unit=10)
+            return
+        end if
+        isBinary = .true.
+        call debugmsg(3, "IO","Binary file opened, starting reading: " // filename)
+        read(10) version, reserved, numPos, time
+        if (version /= 1) then
+            write(0,*) "---ERROR--- Unsupported version of the binary ParticlePosition file: ", version
+            call exit(1)
+        end if
+
+        allocate(buffer(3,numPos))
+        read(10) buffer
+        allocate(r(3,numPos))
+        r = real(buffer,4)
+        call debugmsg(4, "IO","r = ", r)
+
+        close(unit=10)
+        call debugmsg(3, "IO","Finished reading. File closed: " // filename)
+    end function readPositionsBinary
+
 ! Obtain the vector-part of a string. I.e., everything between "(" and ")".
     function obtainVector(line) result(str)
         character (len=*), intent(in) :: line
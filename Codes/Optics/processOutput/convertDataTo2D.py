@@ -7,6 +7,10 @@
 #				Parallel.
 #	16 10 2018: Works with outputDir=inputDir --> restructure Intensity & Coord files in "1D" and "2D" directories
 #	12 02 2019: Implemented the helpers.IO I/O-handler module.
+#	18 10 2026: Added -b to write the 2D intensity files in the binary format.
+#				-C is now actually parsed, and the files are distributed over the pool in chunks.
+#				Added -s to convert the whole directory into a single intensity stack file (see helpers.IO).
+#				Writes the camera geometry cache of the output directory.
 #
 
 # Misc imports
@@ -142,7 +146,14 @@ def processIntensityFile(npix, i_file):
 		pass
 	else: # no exception occured, so:
 		# Output to file
-		optoFluidsIO.writeToFile_Intensity2D(data2D, outputDN, time, index=index, overwrite=overwrite)
+		if binary:
+			optoFluidsIO.writeToFile_IntensityBinary(data2D, outputDN, time, index=index, overwrite=overwrite)
+		else:
+			optoFluidsIO.writeToFile_Intensity2D(data2D, outputDN, time, index=index, overwrite=overwrite)
+
+# Worker function which reads the 1D intensity vector as a 2D array, for the stack
+def readIntensityFile(npix, i_file):
+	return optoFluidsIO.readFromFile_Intensity1D(i_file, npix)[0]
 
 
 # Restructure the input directory such that all Intensity files & the PixelCoordinates file
@@ -177,20 +188,24 @@ inputDN = ""
 outputDN = ""
 numCores = 1
 overwrite = False
+binary = False
+stack = False
 outputIsInput = False
 #
 usageString = "This script automatically loops over all intensity files in the given directory (-i) and then writes them to a different format in the output directory (-o)\n" \
 			+ "Filename for coordinates: 'PixelCoords.out'. Filename for intensity: 'Intensity_tFLOAT.out'\n" \
 			+ "   usage: " + sys.argv[0] + " -i <intensity and pixelCoords dirName> [-o <outputDir for 2D data>] " \
-			+ "[-f]" \
+			+ "[-f] [-b | -s]" \
 			+ "[-C <number of cores to use>]" \
 			+ "\n" \
 			+ "		where:\n" \
 			+ "		  -o := output directory. If omitted, uses the input directory by creating a 1D (for the original data) and 2D (for the new data) folder into it." \
 			+ "		  -f := force overwrite. WARNING: This will remove any existing directory specified using the -o option\n" \
+			+ "		  -b := write the 2D intensity files in the binary format (same filenames) instead of as text\n" \
+			+ "		  -s := write all 2D intensities to a single intensity stack file ('" + names.intensityStackFN + "') instead of one file per time\n" \
 			+ "		  -C defaults to '1' (serial run). Use '0' to use all available system cores\n"
 try:
-	opts, args = getopt.getopt(sys.argv[1:],"hfi:o:")
+	opts, args = getopt.getopt(sys.argv[1:],"hfbsi:o:C:")
 except getopt.GetoptError:
 	print(usageString )
 	sys.exit(2)
@@ -206,6 +221,10 @@ for opt, arg in opts:
 		numCores = int(arg)
 	elif opt == '-f':
 		overwrite = True
+	elif opt == '-b':
+		binary = True
+	elif opt == '-s':
+		stack = True
 	else :
 		print(usageString )
 		sys.exit(2)
@@ -216,6 +235,11 @@ if (inputDN == "") :
 	print("		inputDN="+inputDN)
 	sys.exit(2)
 #
+if (binary and stack):
+	print(usageString )
+	print("    Note: -b and -s are mutually exclusive.")
+	sys.exit(2)
+#
 if (outputDN == ""):
 	outputDN=inputDN
 	outputIsInput=True
@@ -303,6 +327,8 @@ print("npix = ", npix)
 # Write
 optoFluidsIO.writeToFile_Coords2D(data2D, outputDN, span, npix, overwrite=overwrite) 
 optoFluidsIO.writeToFile_CoordsComps2D(data2D, outputDN, npix, overwrite=overwrite) 
+# Parse the written file once into the camera geometry cache, such that all post-processing tools can skip that:
+geometry = optoFluidsIO.readCameraGeometry(names.joinPaths(outputDN,names.pixelCoords2DFN))
 #write2DCoordsToFile(data2D, npix, span)
 #write2DCoordsCompToFile(data2Dx, npix, "x")
 #write2DCoordsCompToFile(data2Dy, npix, "y")
@@ -325,12 +351,28 @@ print("Number of valid Intensity files found in \"" + \
 	intInputDN + "\" (rel. to total number) = " + \
 	str(num_valid) + "/" + str(num_total))
 ## Now start iterating over the files to convert the 1D vector data to a 2D array of size (npix_a, npix_b)
-if(numCores > 0):
-	pool = Pool(processes=numCores)
-else:
-	pool = Pool()
-func = partial(processIntensityFile, npix)
-pool.map(func, intFilesList)
+## The files are handed to the workers in chunks, a few chunks per worker, to limit the inter-process traffic.
+numWorkers = numCores if numCores > 0 else multiprocessing.cpu_count()
+chunksize = max(1, int(num_valid / (4*numWorkers)))
+with Pool(processes=numWorkers) as pool:
+	if stack:
+		# Sort the files by time, and stream the frames in that order from the workers into the stack file:
+		intFilesAndGroups = myRE.getMatchingItemsAndGroups([os.path.basename(FN) for FN in intFilesList], intensityFNRO)
+		intFiles = []
+		for item in intFilesAndGroups:
+			(index, time) = names.extractTimeAndIndexFromMatch(item[1:])
+			intFiles.append( (float(time), index if index != "" else None, names.joinPaths(intInputDN,item[0])) )
+		intFiles.sort(key=lambda item: item[0])
+		stackFN = names.joinPaths(outputDN,names.intensityStackFN)
+		func = partial(readIntensityFile, npix)
+		optoFluidsIO.writeToFile_IntensityStack(pool.imap(func, [item[2] for item in intFiles], chunksize=chunksize), stackFN,
+			times=[item[0] for item in intFiles], indices=[item[1] for item in intFiles],
+			npix=npix, span=geometry.span, overwrite=overwrite)
+		print("Wrote " + str(len(intFiles)) + " frames to \"" + stackFN + "\".")
+	else:
+		func = partial(processIntensityFile, npix)
+		for _ in pool.imap_unordered(func, intFilesList, chunksize=chunksize):
+			pass
 
 
 
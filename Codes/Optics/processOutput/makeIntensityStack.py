@@ -0,0 +1,68 @@
+#! /usr/bin/env python3
+#
+# makeIntensityStack.py
+#
+#  Converts a directory of intensity files into a single intensity stack file,
+# which holds all frames as one contiguous (Nframes, Na, Nb) array, together with their times and the camera span.
+# See helpers.IO for the file format and for the IntensityStack reader.
+#
+# Accepted input layouts:
+# - a directory of 1D or 2D intensity files (timeLooperParallel.py or convertDataTo2D.py output);
+# - a directory sorted by sortOpticsResults.py;
+# - a result directory containing a "2D" directory of either of the above.
+# PixelCoords2D.out must be present (i.e., convertDataTo2D.py must have been run).
+#
+# Kevin van As
+#	18 10 2026: Original
+#
+
+# Numerics
+import numpy as np # Matrices
+
+# OptoFluids imports
+import helpers.IO as optoFluidsIO
+import helpers.nameConventions as names
+
+
+
+##############
+## Command-Line Interface (CLI)
+####
+if __name__=='__main__':
+	import optparse
+	class CLI(object):
+		usageString = "   usage: %prog -i <inputDir> [options]"
+		requiredOpts = "inputDir".split()
+
+		def parse_options(self):
+			parser = optparse.OptionParser(usage=self.usageString)
+			parser.add_option('-i', dest='inputDir',
+				help="directory with the intensity files")
+			parser.add_option('-o', dest='outputFN', default=None,
+				help="output stack filename, defaults to \"<inputDir>[/2D]/" + names.intensityStackFN + "\"")
+			parser.add_option("-f", action="store_true", dest="overwrite", default=False,
+				help="force overwrite output? [default: %default]")
+			parser.add_option("--float32", action="store_true", dest="float32", default=False,
+				help="store the frames in single precision, which halves the file size [default: %default]")
+			(self.opt, self.args) = parser.parse_args()
+
+			for r in self.requiredOpts:
+				if self.opt.__dict__[r] is None:
+					parser.error("Parameter '%s' is required!"%r)
+
+		def run(self):
+			self.parse_options()
+			outputFN = optoFluidsIO.convertToIntensityStack(
+				inputDN=self.opt.inputDir,
+				outputFN=self.opt.outputFN,
+				dtype=np.float32 if self.opt.float32 else np.float64,
+				overwrite=self.opt.overwrite
+			)
+			stack = optoFluidsIO.IntensityStack(outputFN)
+			print("Wrote " + str(len(stack)) + " frames of npix=" + str(stack.npix) + " to \"" + outputFN + "\".")
+
+	CLI().run()
+
+
+
+# EOF
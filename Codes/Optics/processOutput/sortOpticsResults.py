@@ -35,6 +35,11 @@
 # 
 #
 #
+# Index mode (--index):
+#  Instead of moving the files, writes the sorting as an index file ("sortedIndex.csv", see helpers.IO) with
+#  "majorTime;intensityFN" lines, and leaves the intensity files in place. The index is written to the output directory,
+#  with the filenames relative to it. timeIntegrateOptics_timeLooper.py reads through the index when present.
+#
 # Notes on preserveInputDir:
 # if inputDir == outputDir:
 #	move inputDir to a hidden version of the same directory,
@@ -52,20 +57,24 @@
 #	19 10 2018: dt_us_tol criterion to deal with input precision errors (e.g., dt_us=3.9e-07 and dt_us=4.0e-07).
 #				output directory names are now floats instead of strings: "0.0000" --> "0.0" and "0.000001" --> "1e-06"
 #	29 11 2018: Implemented myRound in nameConventions
+#	18 10 2026: Added index mode (--index)
+#				The dt/dt_us detection is vectorised, and moved to helpers.timeSteps
+#				Scans the input directory with helpers.dirIndex
 #
 
-import re
 import sys
 import os.path
 import shutil
 
 # Import from optoFluids:
-import helpers.regex as myRE
 import helpers.nameConventions as names
+import helpers.IO as optoFluidsIO
+import helpers.timeSteps as timeSteps
+import helpers.dirIndex as dirIndex
 
 
 
-DEFAULT_dt_us_tol=1.5
+DEFAULT_dt_us_tol=timeSteps.DEFAULT_dt_us_tol
 
 
 ##############
@@ -73,7 +82,7 @@ DEFAULT_dt_us_tol=1.5
 ####
 class OpticsResultSorter(object):
 
-	def __init__(self, inputDN, outputDN="", overwrite=False, verbose=False, preserveInputDir=False, dt_us_tol=DEFAULT_dt_us_tol):
+	def __init__(self, inputDN, outputDN="", overwrite=False, verbose=False, preserveInputDir=False, dt_us_tol=DEFAULT_dt_us_tol, indexOnly=False):
 
 		self.inputDN = inputDN
 		if ( outputDN == "" or outputDN == None ):
@@ -83,6 +92,7 @@ class OpticsResultSorter(object):
 		self.overwrite = overwrite
 		self.verbose = verbose
 		self.preserveInputDir = preserveInputDir
+		self.indexOnly = indexOnly
 
 		self.dt_us_tol = float(dt_us_tol)
 
@@ -102,7 +112,7 @@ class OpticsResultSorter(object):
 		if ( not os.path.exists(self.inputDN) ) :
 			sys.exit("\nERROR: Inputfile '" + self.inputDN + "' does not exist.\n" + \
 					 "Terminating program.\n" )
-		if ( not self.outputIsInput and os.path.isdir(self.outputDN) and not self.overwrite ) :
+		if ( not self.outputIsInput and not self.indexOnly and os.path.isdir(self.outputDN) and not self.overwrite ) :
 			sys.exit("Output directory '" + self.outputDN + "' already exists, but overwrite=False.")
 
 		# Done with init(). Note: Validity of input directory is evaluated in "run", while analysing the available times.
@@ -146,19 +156,12 @@ class OpticsResultSorter(object):
 		
 		## 1) Read all intensity filenames with regex
 		## 2) Make a list of all times; sort it numerically
-		intFNRO = re.compile(names.intensityFNRE)
-		resultFileList=os.listdir(self.inputDN)
-		intFiles = myRE.getMatchingItemsAndGroups(resultFileList,intFNRO)
-		# intFiles is now an array of tuples of the form: (filename, time)
-
-		# Sort the times
-		intFiles.sort(key=lambda time: float(time[1])) # sort by time, incl. exp.not.
+		intFiles = dirIndex.scan(self.inputDN, "intensity")
+		# intFiles.names and intFiles.times are now the filenames and times, sorted by time
+		times = intFiles.times
 
 		# Show found times to user:
-		out="Found (sorted) times: "
-		for FN,time in intFiles:
-			out += time+" "
-		self.vprint ( out )
+		self.vprint ( "Found (sorted) times: " + " ".join(str(time) for time in times) )
 
 		if (len(intFiles) == 0):
 			sys.exit("Did not find any intensity files in the input directory ('"+self.inputDN+"'). Exiting.")
@@ -170,57 +173,30 @@ class OpticsResultSorter(object):
 					 self.unsortMsg(" ") + \
 					 " Exiting.")
 
-		## 3) Detect dt and dt_us
-		deltaTimes = makeDeltaList(intFiles,1)
-		self.vprint ("Resulting dts are:  " + str(deltaTimes))
-		## 3a) Compare first and second timename, that is dt_us.
-		dt_us = deltaTimes[0]
-		## 3b) Make a list of indices in which the jump is larger than dt_us
-		big_start_ilist=[0]
-		data_lengths=[]
-		prev=0
-		for idt in range(len(deltaTimes)):
-			#if ( deltaTimes[idt] != dt_us):
-			if ( deltaTimes[idt] > self.dt_us_tol * dt_us):
-				big_start_ilist.append(idt+1)
-				data_lengths.append(idt+1-prev)
-				prev=idt+1
-		data_lengths.append(idt+2-prev)
-		del prev
+		## 3) Detect dt and dt_us, and make a list of indices in which the jump is larger than dt_us.
+		##    Apply a check to make sure dt_us and dt are constants. Otherwise raise an error.
+		try:
+			(dt_us, dt, big_start_ilist, data_lengths) = timeSteps.detectMajorSteps(times, self.dt_us_tol)
+		except Exception as e:
+			sys.exit("ERROR\n" + \
+					 " " + str(e) + "\n" + \
+					 " Terminating without sorting.")
+		self.vprint ("Found dt_us = " + str(dt_us) + " and major dt = " + str(dt))
 		self.vprint ("Big-step starting indices: " + str(big_start_ilist))
 		self.vprint ("Big-step data lengths:     " + str(data_lengths))
-
-		## 3c) Apply a check to make sure dt_us and dt are constants. Otherwise raise an error.
-		if(len(big_start_ilist)>1): # else only one major timestep
-			dt1 =  myRound(myRound(float(intFiles[big_start_ilist[1]][1])) - myRound(float(intFiles[0][1])))
-			prev=0
-			for i in range(1,len(big_start_ilist)):
-				ijump=big_start_ilist[i]
-				dt2 =  myRound(myRound(float(intFiles[ijump][1])) - myRound(float(intFiles[prev][1])))
-				self.vprint("("+str(i)+") Found major dt = " + str(dt2))
-				if ( dt1 != dt2 ):
-					sys.exit("ERROR\n" + \
-							 " Found different major timesteps: dt1="+str(dt1)+", dt2="+str(dt2)+".\n" + \
-							 " Terminating without sorting.")
-				prev=ijump
-			del prev
 			
 		## 4) Make an array of the different sets of microsteps
-		sortedFNs=[]
-		sortedMajorTimes=[]
+		sortedMajorTimes = [ float(times[i0]) for i0 in big_start_ilist ]
+		sortedFNs = [ tuple(intFiles.names[i0:i0+n]) for (i0, n) in zip(big_start_ilist, data_lengths) ]
 		self.vprint("Sorted filenames: ")
-		for i in range(len(big_start_ilist)):
-			#print(i)
-			sortedMajorTimes.append(intFiles[big_start_ilist[i]][1])
-			tupleMaker=()
-			for j in range(big_start_ilist[i],big_start_ilist[i]+data_lengths[i]):
-				#print(" " + str(j))
-				tupleMaker += (intFiles[j][0],)
-			self.vprint(" " + str(tupleMaker))
-			sortedFNs.append(tupleMaker)
+		for FNs in sortedFNs:
+			self.vprint(" " + str(FNs))
 			
 		self.vprint("Major start times: " + str(sortedMajorTimes))
 
+		if ( self.indexOnly ):
+			self.writeIndex(sortedMajorTimes, sortedFNs)
+			return
 
 		##############
 		## Sort times into output directory
@@ -285,6 +261,21 @@ class OpticsResultSorter(object):
 				self.vprint("Moving: " + str(FN)  + " --> "  + str(dirOut))
 				shutil.move ( os.path.join( self.outputDN, FN ) , dirOut )
 
+	# Index mode: writes the sorting to the index file in the output directory, without touching the intensity files
+	def writeIndex(self, sortedMajorTimes, sortedFNs):
+		if not os.path.exists(self.outputDN):
+			os.makedirs(self.outputDN)
+		indexFN = names.joinPaths(self.outputDN, names.intensitySortedIndexFN)
+		if ( os.path.exists(indexFN) and not self.overwrite ):
+			sys.exit("ERROR:\n" + \
+					" Index file '" + str(indexFN) + "' already exists. Use -f to overwrite.\n" + \
+					" Exiting.")
+		relDN = os.path.relpath(self.inputDN, self.outputDN)
+		fileLists = [ [ os.path.normpath(names.joinPaths(relDN, FN)) for FN in FNs ] for FNs in sortedFNs ]
+		majorTimes = [ names.intensitySortedDN(time) for time in sortedMajorTimes ]
+		optoFluidsIO.writeToFile_SortedIndex(majorTimes, fileLists, indexFN, overwrite=self.overwrite)
+		self.vprint("Wrote index of " + str(len(majorTimes)) + " major timesteps to '" + str(indexFN) + "'.")
+
 
 
 
@@ -297,14 +288,6 @@ class OpticsResultSorter(object):
 def myRound(value):
 	return names.myRound(value) #float('%.8e' % value)
 
-# Take a list of tuples in which the index'd element is float.
-# Return a list of length N-1 with the delta values.
-def makeDeltaList(lstIn, index=0):
-	lstOut=[]
-	for i in range(len(lstIn)-1):
-		lstOut.append( myRound( float(lstIn[i+1][index]) - float(lstIn[i][index]) ) )
-	return lstOut
-
 
 
 
@@ -328,6 +311,9 @@ if __name__=='__main__':
 				help="force overwrite output? [default: %default]")
 			parser.add_option("-p", action="store_true", dest="preserveInputDir", default=False,
 				help="preserve input directory? [default: %default]")
+			parser.add_option("--index", action="store_true", dest="indexOnly", default=False,
+				help="only write a sorted index file (" + names.intensitySortedIndexFN + ") to the output directory, " + \
+					"instead of moving/copying the intensity files into major-timestep directories [default: %default]")
 			parser.add_option("--tol", type="float", dest="dt_us_tol", default=DEFAULT_dt_us_tol,
 				help="the step between the last time of the microstepping to the next major timename is greater than \"tol\".\n" + \
 					"This allows non-constant dt_us to be seen as \"the same\" microstep.\n" + \
@@ -348,6 +334,7 @@ if __name__=='__main__':
 				overwrite=self.opt.overwrite,
 				preserveInputDir=self.opt.preserveInputDir,
 				dt_us_tol=self.opt.dt_us_tol,
+				indexOnly=self.opt.indexOnly,
 				verbose=True
 			).run()
 
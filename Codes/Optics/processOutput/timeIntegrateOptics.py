@@ -11,6 +11,11 @@
 #	16 10 2018: Implemented nameConvention
 #				Python3
 #	17 10 2018:	Is now an importable module
+#	18 10 2026: Accepts an intensity stack file as input
+#	18 10 2026: Streaming accumulation (StreamingAverage), which reads the files through helpers.IO (binary or fast text),
+#				and can emit the average of several exposure times (numbers of frames) in one sweep.
+#	18 10 2026: -R now reads every file only once for all resolutions together (averageFilesMultiRes).
+#	18 10 2026: Scans the input directory with helpers.dirIndex.
 #
 # Known bugs:
 #	If "foo" is a file, and -o is "foo/bar", then the code detects that "foo/bar" does not yet exist,
@@ -31,6 +36,7 @@ import numpy as np # Matrices
 import helpers.regex as myRE
 import helpers.nameConventions as names
 import helpers.IO as optoFluidsIO
+import helpers.dirIndex as dirIndex
 
 
 
@@ -85,58 +91,135 @@ def findValidResolutions(numFiles):
 def getFilesThatSatisfyRes(fileList, T, timeRange):
 	#print("Getting files that satisfy period: " + str(T) + ".")
 	outList=[]
-	tmin = timeRange[0]
-	step = timeRange[1]
 	intensityFNRO = re.compile(names.intensityFNRE)
 	okFileList = myRE.getMatchingItemsAndGroups(fileList, intensityFNRO)
-	numFiles=len(okFileList)
 	for (intensityFN, time) in okFileList :
 		time=float(time)
 		#print(" Now analysing file: '"+intensityFN+"' with t=" + str(time) + ".")
-		# Only use the times that satisfy (t-tmin)/T=integer:
-		x=(time-tmin)/T # normalised & origin-shifted coordinate
-		xstep=step/T #=Tm
-		#print(" xstep=",xstep)
-		if ( not x == 0 ):
-			#print("error=",abs(x-float(int(x)))/xstep)
-			if ( abs(x-float(int(x+1e-6)))/xstep > 1e-5 ): # approximately an integer, due to rounding errors
-				print("  " + str(time) + " is invalid for T=" + str(T) + ". Ignoring this file.")
-#				print("abs(x-float(int(x+1e-6)))/xstep=",abs(x-float(int(x+1e-6)))/xstep)
-#				print("abs(x-float(int(x+1e-6)))/x=",abs(x-float(int(x+1e-6)))/x)
-				continue # Then invalid time!
+		if not satisfiesRes(time, T, timeRange):
+			print("  " + str(time) + " is invalid for T=" + str(T) + ". Ignoring this file.")
+			continue # Then invalid time!
 		# Else valid:
 		outList.append(intensityFN)
 	return outList
 
+# Returns whether the time satisfies (t-tmin)/T=integer, i.e., whether it should be used for period T.
+def satisfiesRes(time, T, timeRange):
+	tmin = timeRange[0]
+	step = timeRange[1]
+	x=(time-tmin)/T # normalised & origin-shifted coordinate
+	xstep=step/T #=Tm
+	#print(" xstep=",xstep)
+	if ( not x == 0 ):
+		#print("error=",abs(x-float(int(x)))/xstep)
+		if ( abs(x-float(int(x+1e-6)))/xstep > 1e-5 ): # approximately an integer, due to rounding errors
+#			print("abs(x-float(int(x+1e-6)))/xstep=",abs(x-float(int(x+1e-6)))/xstep)
+#			print("abs(x-float(int(x+1e-6)))/x=",abs(x-float(int(x+1e-6)))/x)
+			return False
+	return True
+
+# Stack equivalent of getFilesThatSatisfyRes: returns the frame numbers instead of the filenames.
+def getFramesThatSatisfyRes(stack, T, timeRange):
+	outList=[]
+	for i_frame, time in enumerate(stack.times):
+		if not satisfiesRes(time, T, timeRange):
+			print("  " + str(time) + " is invalid for T=" + str(T) + ". Ignoring this frame.")
+			continue
+		outList.append(i_frame)
+	return outList
+
 
-def averageFiles(DN, fileList):
-	firstFile=True
+# Streaming time integration: the frames are added one at a time, such that only the running sum is kept in memory.
+# exposures := optional list of numbers of frames. When the number of added frames reaches one of them,
+#  the running average is stored in self.emitted[numFrames]. Hence, several exposure times are obtained in one sweep,
+#  provided that the frames are added in time order.
+class StreamingAverage():
+	def __init__(self, exposures=None):
+		self.exposures = set() if exposures is None else set(int(n) for n in exposures)
+		self.emitted = dict()
+		self.dataAccum = None
+		self.numTerms = 0
+
+	# Adds a frame. Returns False (and ignores the frame) if its shape differs from the first frame.
+	def add(self, dataIn):
+		if self.dataAccum is None:
+			self.dataAccum = np.array(dataIn, dtype=float) # copy, such that a (memory-mapped) input is never modified
+		elif np.shape(dataIn) == np.shape(self.dataAccum):
+			self.dataAccum += dataIn
+		else:
+			return False
+		self.numTerms += 1
+		if self.numTerms in self.exposures:
+			self.emitted[self.numTerms] = self.average()
+		return True
+
+	def average(self):
+		return self.dataAccum/self.numTerms
+
+# Reads an intensity file (1D or 2D, text or binary) through the (fast) readers of helpers.IO
+def readIntensityFile(FN):
+	return optoFluidsIO.readFromFile_Intensity(FN, forceRead=True)[0]
+
+# Returns the average over the files.
+# If exposures is given, the files are added in time order and (average, {numFrames: average over the first numFrames files})
+#  is returned instead (see StreamingAverage).
+def averageFiles(DN, fileList, exposures=None):
 	intensityFNRO = re.compile(names.intensityFNRE)
+	timedFileList = []
 	for intensityFN in fileList :
 		groups = myRE.getMatchingGroups(os.path.basename(intensityFN), intensityFNRO)
 		if groups: # If filename matches the regex
 			(index, time) = names.extractTimeAndIndexFromMatch(groups)
-			#print("Now trying to read file: '"+intensityFN+"' with t=",time)
-			dataIn = np.loadtxt(open(DN+"/"+intensityFN,"rb"),dtype=float)
-			if firstFile:
-				# Store info about first file to check whether the subsequent files are consistent
-				firstFile=False
-				dataAccum=dataIn
-				numTerms=1
-				fileShape=np.shape(dataIn)
-			else:
-				# Check whether file is consistent with the first file
-				if ( np.shape(dataIn) == fileShape ):
-					# Compute the sum of the data files
-					dataAccum=dataAccum+dataIn
-					numTerms=numTerms+1
-				else:
-					print("WARNING. '"+intensityFN+"' does not have the same shape as the first file read!!!\n" \
-						+ "			First file has a shape: "+str(fileShape)+", whereas this file has shape: "+str(np.shape(dataIn)) \
-						+ "\n" \
-						+ "			The present file will be IGNORED.\n")
-	dataAv=dataAccum/numTerms
-	return dataAv
+			timedFileList.append( (float(time), intensityFN) )
+	if exposures is not None:
+		timedFileList.sort(key=lambda item: item[0])
+	accumulator = StreamingAverage(exposures)
+	for (time, intensityFN) in timedFileList:
+		#print("Now trying to read file: '"+intensityFN+"' with t=",time)
+		dataIn = readIntensityFile(names.joinPaths(DN,intensityFN))
+		if not accumulator.add(dataIn):
+			print("WARNING. '"+intensityFN+"' does not have the same shape as the first file read!!!\n" \
+				+ "			First file has a shape: "+str(np.shape(accumulator.dataAccum))+", whereas this file has shape: "+str(np.shape(dataIn)) \
+				+ "\n" \
+				+ "			The present file will be IGNORED.\n")
+	if exposures is not None:
+		return (accumulator.average(), accumulator.emitted)
+	return accumulator.average()
+
+# Stack equivalent of averageFiles. Accumulates frame-by-frame, such that only one frame is read into memory at a time.
+# (The frames of a stack are already in time order.)
+def averageFrames(stack, frameList, exposures=None):
+	accumulator = StreamingAverage(exposures)
+	for i_frame in frameList:
+		accumulator.add(stack[i_frame])
+	if exposures is not None:
+		return (accumulator.average(), accumulator.emitted)
+	return accumulator.average()
+
+# Time integration for all resolutions (periods in m, see findValidResolutions) in a single pass over the files:
+#  each file is read once, and added to the StreamingAverage of every resolution that it satisfies.
+# @return: {res: average}
+def averageFilesMultiRes(DN, fileList, resList, timeRange):
+	accumulators = dict( (res, StreamingAverage()) for res in resList )
+	for (intensityFN, time) in optoFluidsIO.getIntensityFilesAndGroups(fileList):
+		resOK = [ res for res in resList if satisfiesRes(float(time), res*timeRange[1], timeRange) ]
+		if len(resOK) == 0: continue
+		dataIn = readIntensityFile(names.joinPaths(DN,intensityFN))
+		for res in resOK:
+			if not accumulators[res].add(dataIn):
+				print("WARNING. '"+intensityFN+"' does not have the same shape as the first file read. It will be IGNORED.")
+	return dict( (res, accumulators[res].average()) for res in resList if accumulators[res].numTerms > 0 )
+
+# Stack equivalent of averageFilesMultiRes
+def averageFramesMultiRes(stack, resList, timeRange):
+	accumulators = dict( (res, StreamingAverage()) for res in resList )
+	for i_frame, time in enumerate(stack.times):
+		resOK = [ res for res in resList if satisfiesRes(time, res*timeRange[1], timeRange) ]
+		if len(resOK) == 0: continue
+		dataIn = stack[i_frame]
+		for res in resOK:
+			accumulators[res].add(dataIn)
+	return dict( (res, accumulators[res].average()) for res in resList if accumulators[res].numTerms > 0 )
 
 # Writes {1D vector, 2D matrix} "data" to file "outputFN".
 def writeData(outputFN, data):
@@ -214,11 +297,13 @@ def timeIntegrateOptics(intensityDN, outputName, doResolution=False, overwrite=F
 		os.makedirs(outputDN)
 		print("Output directory '" + outputDN + "' was created.")
 	### Algorithm
+	if optoFluidsIO.isIntensityStack(intensityDN):
+		timeIntegrateStack(optoFluidsIO.IntensityStack(intensityDN), outputName, doResolution)
+		return
 	## Analyse which times we have
-	intFilesAndTimes = optoFluidsIO.getIntensityFilesAndGroups(os.listdir(intensityDN))
-	intFilesList = myRE.untupleList(intFilesAndTimes,index=0)
-	timesList = myRE.untupleList(intFilesAndTimes,index=1)
-	intFilesAndTimes = None
+	intFilesIndex = dirIndex.scan(intensityDN, "intensity")
+	intFilesList = intFilesIndex.names
+	timesList = intFilesIndex.times
 	timeRange = computeTimeRange(timesList)
 	numFiles = len(intFilesList)
 	step = timeRange[1]
@@ -226,21 +311,32 @@ def timeIntegrateOptics(intensityDN, outputName, doResolution=False, overwrite=F
 	if doResolution :
 		resList = findValidResolutions(numFiles)
 		print("resList = " + str(resList))
+		dataAvs = averageFilesMultiRes(intensityDN, intFilesList, resList, timeRange)
 		for res in resList:
-			print("\n== res = " + str(res) + " ==")
-			intFiles = getFilesThatSatisfyRes( os.listdir(intensityDN), res*step, timeRange )
-			print("intFiles = " + str(intFiles))
-			dataAv = averageFiles(intensityDN, intFiles)
-			#print("dataAv = " +str(dataAv))
 			outputFN = names.joinPaths(outputDN, str( int((numFiles-1)/res) ))
-			writeData(outputFN,dataAv)
+			writeData(outputFN,dataAvs[res])
 	else: # single resolution
-		intFiles = getFilesThatSatisfyRes( os.listdir(intensityDN), 1*step , timeRange) # TODO: This demands a uniform time sampling
+		intFiles = getFilesThatSatisfyRes( intFilesList, 1*step , timeRange) # TODO: This demands a uniform time sampling
 		print("intFiles = " + str(intFiles))
 		dataAv = averageFiles(intensityDN, intFiles)
 		#print("dataAv = " +str(dataAv))
 		writeData(outputFN,dataAv)
 
+# Same as the algorithm of timeIntegrateOptics, but for an intensity stack.
+def timeIntegrateStack(stack, outputName, doResolution=False):
+	timeRange = computeTimeRange(stack.times)
+	numFiles = len(stack)
+	step = timeRange[1]
+	if doResolution :
+		resList = findValidResolutions(numFiles)
+		print("resList = " + str(resList))
+		dataAvs = averageFramesMultiRes(stack, resList, timeRange)
+		for res in resList:
+			writeData(names.joinPaths(outputName, str( int((numFiles-1)/res) )), dataAvs[res])
+	else: # single resolution
+		dataAv = averageFrames(stack, getFramesThatSatisfyRes(stack, 1*step, timeRange))
+		writeData(outputName,dataAv)
+
 
 
 
@@ -263,7 +359,8 @@ usageString = "   Sums all intensity files pixel-by-pixel. Time-integration requ
 			+ "				The filenames are such that '1' means using only tmin and tmax, and the highest value uses all.\n" \
 			+ "				In other words, the higher the value, the finer the time resolution.\n" \
 			+ "		  -o := If not -R, output fileName. If -R, output dirName.\n" \
-			+ "		  -i := input directory containing all intensity files with uniformly sampled times. NO OTHER FILES ALLOWED.\n" 
+			+ "		  -i := input directory containing all intensity files with uniformly sampled times. NO OTHER FILES ALLOWED.\n" \
+			+ "				Alternatively, an intensity stack file (see makeIntensityStack.py).\n" 
 
 if __name__=='__main__':
 	### Read input arguments
@@ -4,10 +4,16 @@
 #
 # Calls timeIntegrateOptics.py to average over the microsteps for every major step found in the optics results directory (-i).
 # Automatically chooses the "2D" directory if present, otherwise "1D" if present, otherwise uses the root directory.
+# The major timesteps are read from the sorted index (sortOpticsResults.py --index) if that directory has one,
+#  otherwise from the sorted major-timestep directories (sortOpticsResults.py).
 #
 # Kevin van As
 #	17 10 2018: Original
 #	18 02 2019: Added progress bar with tdqm
+#	18 10 2026: The major timesteps are now processed in a process pool (-C),
+#				and the average over the first n microsteps can be written for several n in the same sweep (-E).
+#				Reads the major timesteps from the sorted index file, if present.
+#				Scans the directories with helpers.dirIndex.
 #			
 
 # Misc imports
@@ -15,6 +21,7 @@ import re # Regular-Expressions
 import sys, getopt # Command-Line options
 import os.path
 from shutil import rmtree
+from multiprocessing import Pool
 
 # Progress bar
 from tqdm import tqdm
@@ -22,7 +29,9 @@ from tqdm import tqdm
 # Import from optoFluids:
 import helpers.regex as myRE
 import helpers.nameConventions as names
-from timeIntegrateOptics import timeIntegrateOptics as integrateOneDir
+import helpers.IO as optoFluidsIO
+import helpers.dirIndex as dirIndex
+import timeIntegrateOptics as TIO
 
 
 
@@ -49,16 +58,50 @@ def checkArgumentValidity(inputDN, outputDN, overwrite=False):
 				 "BE WARNED: This will remove the existing file with the same name!!")
 
 
+########
+## Worker
+####
+# Camera-integrates a single major timestep, given by its microstep files (fileList, relative to DN).
+# job := (time, DN, fileList, outputDN, outputFN, exposures)
+# Without exposures, this is timeIntegrateOptics.py on the time directory.
+# With exposures, the microsteps are streamed in time order once, and besides the average over all microsteps (outputFN),
+#  the average over the first n microsteps is written to <outputDN>/<n>/ for every n in exposures.
+def integrateMajorStep(job):
+	(time, DN, fileList, outputDN, outputFN, exposures) = job
+	outputFN_full = names.joinPaths(outputDN,outputFN)
+	# Same file selection as timeIntegrateOptics.py (uniform time sampling), on the basenames:
+	byBasename = dict( (os.path.basename(FN), FN) for FN in fileList )
+	content = list(byBasename.keys())
+	timesList = myRE.untupleList(optoFluidsIO.getIntensityFilesAndGroups(content),index=1)
+	timeRange = TIO.computeTimeRange(timesList)
+	intFiles = [ byBasename[FN] for FN in TIO.getFilesThatSatisfyRes(content, timeRange[1], timeRange) ]
+	if exposures is None:
+		TIO.writeData(outputFN_full, TIO.averageFiles(DN, intFiles))
+		return
+	(dataAv, emitted) = TIO.averageFiles(DN, intFiles, exposures)
+	TIO.writeData(outputFN_full, dataAv)
+	for n in exposures:
+		if n in emitted:
+			TIO.writeData(names.joinPaths(names.joinPaths(outputDN,str(n)),outputFN), emitted[n])
+		else:
+			print("WARNING: Major timestep t=" + str(time) + " has only " + str(len(intFiles)) + " microsteps, so exposure n=" + str(n) + " is skipped.")
+
+
+
+
+
 ########
 ## MAIN
 ####
-def timeIntegrateOptics(inputDN, outputDN, overwrite=False):
+# numCores := number of major timesteps to process concurrently. Use 0 to use all available system cores.
+# exposures := optional list of numbers of microsteps, see integrateMajorStep.
+def timeIntegrateOptics(inputDN, outputDN, overwrite=False, numCores=1, exposures=None):
 	### Preamble
 	## Process parameters
 	if ( outputDN == None or outputDN == "" ):
 		outputDN = inputDN # Write to same directory
 	checkArgumentValidity(inputDN, outputDN, overwrite=overwrite)
-	outputIsInput = os.path.samefile(inputDN, outputDN)
+	outputIsInput = os.path.exists(outputDN) and os.path.samefile(inputDN, outputDN)
 
 	## Detect "2D" and "1D" directories, if exists:
 	input1DDN = names.joinPaths(inputDN,names.input1DDN)
@@ -74,12 +117,21 @@ def timeIntegrateOptics(inputDN, outputDN, overwrite=False):
 	if ( outputIsInput ) :
 		outputDN = inputDN
 	
-	## In the input directory, there should be sorted directories with the microsteps. Detect them:
-	RO = re.compile(names.intensitySortedDNRE)
-	timeDNList = myRE.getMatchingItems(os.listdir(inputDN), RO)
-	print("Found the following major timesteps: " + str(timeDNList))
-	if (len(timeDNList) == 0):
-		sys.exit("\nERROR: Did not find any sorted major-timestep time directories.")
+	## The microsteps of each major timestep: from the sorted index if present, else from the sorted directories.
+	# majorSteps := list of (time, directory, [microstep files relative to directory])
+	majorSteps = []
+	indexFN = optoFluidsIO.findSortedIndex(inputDN)
+	if indexFN is not None:
+		print("Found sorted index. Using it to find the major timesteps: " + str(indexFN))
+		for (time, fileList) in optoFluidsIO.readFromFile_SortedIndex(indexFN):
+			majorSteps.append( (time, inputDN, fileList) )
+	else:
+		for time in dirIndex.scan(inputDN, "sorted").names:
+			timeDN = names.joinPaths(inputDN,time)
+			majorSteps.append( (time, timeDN, dirIndex.scan(timeDN, "intensity").names) )
+	print("Found the following major timesteps: " + str([time for (time, DN, fileList) in majorSteps]))
+	if (len(majorSteps) == 0):
+		sys.exit("\nERROR: Did not find any sorted major-timestep time directories, nor a sorted index.")
 
 	## Prepare output directory
 	if ( outputIsInput ) :
@@ -95,15 +147,19 @@ def timeIntegrateOptics(inputDN, outputDN, overwrite=False):
 	elif ( os.path.exists(outputDN) and overwrite ) :
 		rmtree(outputDN)
 	os.makedirs(outputDN)
+	if exposures is not None:
+		exposures = sorted(set(int(n) for n in exposures))
+		for n in exposures:
+			os.makedirs(names.joinPaths(outputDN,str(n)))
 
 	## Process every timestep
-	for timeDN in tqdm(timeDNList):
-		time = timeDN
-		timeDN = names.joinPaths(inputDN,timeDN)
+	jobs = []
+	for (time, timeDN, fileList) in majorSteps:
 		# Count #1D intensities:
-		num1D = myRE.countMatchingItems(os.listdir(timeDN),re.compile(names.intensity1DFNRE))
-		num2D = myRE.countMatchingItems(os.listdir(timeDN),re.compile(names.intensity2DFNRE))
-		numTot = len(os.listdir(timeDN))
+		content = [ os.path.basename(FN) for FN in fileList ]
+		num1D = myRE.countMatchingItems(content,re.compile(names.intensity1DFNRE))
+		num2D = myRE.countMatchingItems(content,re.compile(names.intensity2DFNRE))
+		numTot = len(content)
 		#print("Found for time " + str(timeDN) + ":\n" + \
 		#		"num1D = " + str(num1D) + "; num2D = " + str(num2D) + "; numTot = " + str(numTot))
 		if(num1D > 0 and num2D == 0):
@@ -111,24 +167,34 @@ def timeIntegrateOptics(inputDN, outputDN, overwrite=False):
 		elif(num2D > 0 and num1D == 0):
 			outputFN = names.intensity2DFN(time)
 		else:
-			sys.exit("\nERROR: Input direction '" + str(timeDN) + "' mixes 1D and 2D formatted intensity files.")
-		outputFN = names.joinPaths(outputDN,outputFN)
-		print(str(timeDN) +  " --> " + str(outputFN))
-		# Camera-integrate this timestep:
-		integrateOneDir(intensityDN=timeDN, outputName=outputFN, overwrite=overwrite)
+			sys.exit("\nERROR: Major timestep '" + str(time) + "' in '" + str(timeDN) + "' mixes 1D and 2D formatted intensity files.")
+		print(str(timeDN) + " (t=" + str(time) + ") --> " + str(names.joinPaths(outputDN,outputFN)))
+		jobs.append( (time, timeDN, fileList, outputDN, outputFN, exposures) )
+	# Camera-integrate the timesteps:
+	if numCores == 1:
+		for job in tqdm(jobs):
+			integrateMajorStep(job)
+	else:
+		with Pool(processes=(numCores if numCores > 0 else None)) as pool:
+			for _ in tqdm(pool.imap_unordered(integrateMajorStep, jobs), total=len(jobs)):
+				pass
 	
 
 
 
 usageString = "   Sums all intensity files pixel-by-pixel for each major timestep found in the input directory.\n" \
-			+ "  It is required that the input directory is already sorted by major timestep with the directory name being the time.\n" \
+			+ "  It is required that the input directory is already sorted by major timestep with the directory name being the time,\n" \
+			+ "   or that it holds a sorted index file (" + names.intensitySortedIndexFN + ", see sortOpticsResults.py --index).\n" \
 			+ "   (If not, returns an error.)\n" \
 			+ "  This works with both 1D vector and 2D matrix data format for the intensity.\n" \
 			+ "  Time-integration requires that time is UNIFORMLY sampled.\n" \
 			+ "  usage: " + sys.argv[0] + "  -i <optics results directory> -o <output directory> " \
-			+ "[-f]\n" \
+			+ "[-f] [-C <number of cores>] [-E <n1,n2,...>]\n" \
 			+ "		where:\n" \
 			+ "		  -f := force overwrite. WARNING: This will remove any existing directory specified using the -o option\n" \
+			+ "		  -C := number of major timesteps to process concurrently. Defaults to '1' (serial run). Use '0' to use all available system cores\n" \
+			+ "		  -E := also write the average over the first n1, n2, ... microsteps of each major timestep,\n" \
+			+ "				to the subdirectories n1, n2, ... of the output directory (computed in the same sweep)\n" \
 			+ "		  -o := name of output directory.\n" \
 			+ "		  -i := name of input directory (the optics results)\n" 
 
@@ -145,9 +211,11 @@ if __name__=='__main__':
 	inputDN = "" # input
 	outputDN = "" # output = dir or file, depending on value of -R
 	overwrite = False
+	numCores = 1
+	exposures = None
 	## Read
 	try:
-		opts, args = getopt.getopt(sys.argv[1:],"hfi:o:")
+		opts, args = getopt.getopt(sys.argv[1:],"hfi:o:C:E:")
 	except getopt.GetoptError:
 		print(usageString )
 		sys.exit(2)
@@ -161,12 +229,16 @@ if __name__=='__main__':
 			outputDN = arg
 		elif opt == '-f':
 			overwrite = True
+		elif opt == '-C':
+			numCores = int(arg)
+		elif opt == '-E':
+			exposures = [int(n) for n in arg.split(',')]
 		else :
 			print(usageString )
 			sys.exit(2)
 	
 	### Call main function
-	timeIntegrateOptics(inputDN=inputDN, outputDN=outputDN, overwrite=overwrite)
+	timeIntegrateOptics(inputDN=inputDN, outputDN=outputDN, overwrite=overwrite, numCores=numCores, exposures=exposures)
 
 
 
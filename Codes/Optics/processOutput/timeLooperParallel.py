@@ -19,6 +19,11 @@
 #	03 10 2018: Implemented helpers.regex import
 #				Added log as subdir of outputDir
 #				Removed unused commented variables
+#	18 10 2026: Added batch mode (-b): each optics launch processes a list of particlePositions files,
+#				such that the optics set-up (input, camera, interpolation tables) is done once per core instead of once per file.
+#	18 10 2026: Added resume mode (-r) and a manifest of completed intensity files in the log directory.
+#	18 10 2026: Files are now scheduled dynamically, most expensive first (cost ~ N^p, with p fitted from past runtimes),
+#				and the utilisation of each worker is reported at the end.
 #
 
 # Regular imports
@@ -26,15 +31,19 @@ import re # Regular-Expressions
 import sys, getopt # Command-Line options
 import os.path, inspect
 import subprocess # Execute shell commands
+import zlib # crc32 checksum
+import math
+from timeit import default_timer as timer
 from shutil import copyfile, rmtree
 import multiprocessing
-from multiprocessing import Pool, Value
+from multiprocessing import Pool, Value, Lock
 from ctypes import c_bool, c_wchar_p
 
 # OptoFluids imports
 from templating.templateSubstitutor import TemplateSubstitutor as ts
 import helpers.regex as myRE
 import helpers.nameConventions as names
+import helpers.IO as optoFluidsIO
 
 #############
 # Initialisation
@@ -55,18 +64,24 @@ overwrite = False
 logOptics = False
 numCores = 1
 debug = False
+batchMode = False
+resume = False
 #
 usageString = "   usage: " + sys.argv[0] + " -i <particlePositions dir> -o <output dir> " \
-            + "[-c <optics code executable>] [-C <number of cores to use>] [-t <opticsInputTemplate file>] [-f] [-l]\n" \
+            + "[-c <optics code executable>] [-C <number of cores to use>] [-t <opticsInputTemplate file>] [-f|-r] [-l] [-b]\n" \
             + "     where:\n" \
             + "       -f := force overwrite. WARNING: This will remove any existing directory specified using the -o option\n" \
+            + "       -r := resume an interrupted run in the existing output directory: only the particlePositions files\n" \
+            + "             without a valid intensity file (see log/manifest.dat) are computed.\n" \
             + "       -l := write optics output to a log file in the output directory. Default: do not write.\n" \
             + "       -t defaults to '"+opticsInputTemplateFN+"'\n" \
             + "       -c defaults to '"+opticsCode+"'\n" \
 	    + "       -C defaults to '1' (serial run). Use '0' to use all available system cores\n" \
-	    + "       -d := debug mode (leaves hidden tmp files)"
+	    + "       -d := debug mode (leaves hidden tmp files)\n" \
+	    + "       -b := batch mode: launch the optics code once per core with a list of particlePositions files,\n" \
+	    + "             instead of once per file. Saves the optics set-up time (e.g. the interpolation tables) per file."
 try:
-    opts, args = getopt.getopt(sys.argv[1:],"hfli:o:t:c:C:d")
+    opts, args = getopt.getopt(sys.argv[1:],"hfrli:o:t:c:C:db")
 except getopt.GetoptError:
     print(usageString)
     sys.exit(2)
@@ -86,10 +101,14 @@ for opt, arg in opts:
         numCores = int(arg)
     elif opt == '-f':
         overwrite = True
+    elif opt == '-r':
+        resume = True
     elif opt == '-l':
         logOptics = True
     elif opt == '-d':
         debug = True
+    elif opt == '-b':
+        batchMode = True
     else :
         print(usageString)
         sys.exit(2)
@@ -112,9 +131,11 @@ if ( not os.path.exists(partPosDir) ) :
 if ( not os.path.exists(opticsInputTemplateFN) ) :
     sys.exit("\nERROR: Inputfile '" + opticsInputTemplateFN + "' does not exist.\n" + \
              "Terminating program.\n" )
-if ( os.path.exists(outputDir) and not overwrite ) :
+if ( overwrite and resume ) :
+    sys.exit("\nERROR: The -f and -r options are mutually exclusive.\n")
+if ( os.path.exists(outputDir) and not overwrite and not resume ) :
     sys.exit("\nERROR: Outputdir '" + outputDir + "' already exists.\n" + \
-             "Terminating program to prevent overwrite. Use the -f option to enforce overwrite.\n" + \
+             "Terminating program to prevent overwrite. Use the -f option to enforce overwrite, or -r to resume.\n" + \
              "BE WARNED: This will removed the existing Outputdir!")
 
 
@@ -131,8 +152,10 @@ pixelCoordsFN  = outputDir + "/PixelCoords.out"
 # Formatters:
 intensityFNf   = outputDir + "/Intensity_t{}.out"
 logFNf         = logDir    + "/log_t{}.out"
+manifestFN     = logDir    + "/manifest.dat"
 variablesFNf   = logDir    + "/.kva_vars_{}.tmp"
 opticsInputFNf = logDir    + "/.kva_opticsinput_{}.tmp"
+batchFNf       = logDir    + "/.kva_batch_{}.tmp"
 
 
 
@@ -159,8 +182,13 @@ opticsInputFNf = logDir    + "/.kva_opticsinput_{}.tmp"
 ## Create output directory
 if ( os.path.exists(outputDir) and overwrite ) :
 	rmtree(outputDir)
-os.makedirs(outputDir)
-os.makedirs(logDir) # subdir of outputdir
+if ( resume and os.path.exists(logDir+"/input.tmplt") ) :
+	# Resuming with different optics parameters would silently mix two experiments
+	with open(opticsInputTemplateFN) as f1, open(logDir+"/input.tmplt") as f2:
+		if f1.read() != f2.read():
+			sys.exit("\nERROR: Cannot resume: template '" + opticsInputTemplateFN + "' differs from the one used before ('" + \
+				logDir+"/input.tmplt').\n")
+os.makedirs(logDir, exist_ok=resume) # subdir of outputdir
 if(debug): print("Output directory '" + outputDir + "' was created.")
 # Save the template in the output directory for future reference
 copyfile(opticsInputTemplateFN,logDir+"/input.tmplt")
@@ -192,20 +220,122 @@ print("Number of valid ParticlePositions files found in \"" + \
 
 
 
+########
+## Manifest of completed intensity files
+## Each line reads "particlePositionsFN;intensityFN;size;crc32;runtime", and is appended once the intensity file was written.
+## The runtime [s] of the optics code is left empty if unknown (e.g. in batch mode).
+####
+manifestLock = Lock()
+
+def checksum(FN):
+	with open(FN, 'rb') as f:
+		return zlib.crc32(f.read()) & 0xffffffff
+
+def countLines(FN):
+	with open(FN, 'rb') as f:
+		return sum(1 for line in f if line.strip())
+
+# Appends the given intensity file to the manifest, if it was written by the optics code
+def recordCompleted(partPosFN, intensityFN, runtime=None):
+	if not os.path.isfile(intensityFN):
+		print("WARNING: The optics code did not write '" + intensityFN + "' for '" + partPosFN + "'.")
+		return False
+	line = partPosFN + ";" + intensityFN + ";" + str(os.path.getsize(intensityFN)) + ";" + str(checksum(intensityFN)) + ";" + \
+		("" if runtime is None else "%.3f"%runtime) + "\n"
+	with manifestLock:
+		with open(manifestFN, 'a') as manifest:
+			manifest.write(line)
+	return True
+
+# Returns {intensityFN: (size, crc32)} of the intensity files in the manifest,
+#  and a list of (particlePositionsFN, runtime) of the entries with a known runtime.
+def readManifest():
+	completed = dict()
+	runtimes = []
+	if not os.path.isfile(manifestFN):
+		return completed, runtimes
+	with open(manifestFN) as manifest:
+		for line in manifest:
+			items = line.rstrip("\n").split(";")
+			if len(items) not in (4,5): continue # e.g. the last line of an interrupted run
+			completed[items[1]] = (int(items[2]), int(items[3]))
+			if len(items) == 5 and items[4] != "":
+				runtimes.append( (items[0], float(items[4])) )
+	return completed, runtimes
+
+# An intensity file is complete if its size and checksum agree with the manifest.
+# Files that are not in the manifest are accepted if they hold one value per pixel
+#  (and are then added to the manifest).
+def isCompleted(partPosFN, intensityFN, completed, numPixels):
+	if not os.path.isfile(intensityFN):
+		return False
+	if intensityFN in completed:
+		return completed[intensityFN] == (os.path.getsize(intensityFN), checksum(intensityFN))
+	if numPixels is not None and countLines(intensityFN) == numPixels:
+		recordCompleted(partPosFN, intensityFN)
+		return True
+	return False
+
+
+
+
+
+########
+## Cost estimate of a particlePositions file
+## The multiscattering is O(N^2) per scattering order, so the cost is estimated as N^p with p=2,
+## unless the runtimes in the manifest (of a previous run in the same output directory) say otherwise.
+####
+defaultCostExponent = 2.0
+
+def getNumParticles(partPosFN):
+	try:
+		return optoFluidsIO.readFromFile_Positions_N(partPosFN)
+	except Exception:
+		return 1 # unreadable -> cheap; the optics code will complain about it
+
+# Least-squares fit of log(runtime) = log(a) + p*log(N). Falls back to the default if N does not vary.
+def fitCostExponent(runtimes):
+	points = []
+	for (partPosFN, runtime) in runtimes:
+		if runtime > 0 and os.path.isfile(partPosFN):
+			N = getNumParticles(partPosFN)
+			if N > 0: points.append( (math.log(N), math.log(runtime)) )
+	if len(set(x for (x,y) in points)) < 2:
+		return defaultCostExponent
+	xm = sum(x for (x,y) in points)/len(points)
+	ym = sum(y for (x,y) in points)/len(points)
+	p = sum((x-xm)*(y-ym) for (x,y) in points) / sum((x-xm)**2 for (x,y) in points)
+	return min(max(p, 0.5), 4.0) # Guard against nonsensical fits from noisy runtimes
+
+def estimateCost(i_file, costExponent):
+	return float(getNumParticles(partPosDir+"/"+i_file))**costExponent
+
+
+
+
+
 ########
 ## Define worker function which calls the optics code
 ## Will be executed in parallel.
 ####
 progressCounter = Value('i',0)
-def processFile(i_file):
-	proc_id="["+multiprocessing.current_process().name+"] "
-	if(debug): print(proc_id + "Processing file: " + i_file)
+# Returns the "[index_]time" identifier of a particlePositions file, or None if the filename does not match the regex
+def getFileID(i_file):
 	r = partPosFNRO.match(i_file)
 	if not r: # Continue iff filename matches the regex
-	    return
+	    return None
 	index = r.group(1)+"_" if r.group(1) else "" # index is optional
 	time = r.group(2) # Will only match the first group = the time (by the regex definition)
-	file_id=str(index)+str(time)
+	return str(index)+str(time)
+
+# Returns (worker name, busy time [s], number of files processed), for the utilisation report.
+def processFile(i_file):
+	startTime = timer()
+	proc_id="["+multiprocessing.current_process().name+"] "
+	if(debug): print(proc_id + "Processing file: " + i_file)
+	file_id = getFileID(i_file)
+	if file_id is None:
+	    return (multiprocessing.current_process().name, timer()-startTime, 0)
 	#print("r.groups = ", r.groups())
 	#print("index = " + str(index))
 	#print("r.group(2) = " + r.group(2))
@@ -233,15 +363,119 @@ def processFile(i_file):
 	print(proc_id + "Calling optics code for ParticlePositions file '" + i_file + "'")
 	logFN = logFNf.format(file_id)
 	with open(logFN,'w') as logFile:
-	    subprocess.call([opticsCode,opticsInputFN], shell=False, stdout=logFile)
+	    opticsStartTime = timer()
+	    returnCode = subprocess.call([opticsCode,opticsInputFN], shell=False, stdout=logFile)
+	    opticsTime = timer() - opticsStartTime
+	if(not debug): os.remove(opticsInputFN) # Remove temporarily file
+	if returnCode == 0:
 	    if not logOptics :
 	        os.remove(logFN)
-	if(not debug): os.remove(opticsInputFN) # Remove temporarily file
+	    recordCompleted(partPosDir+"/"+i_file, intensityFNf.format(file_id), opticsTime)
+	else: # Keep the log, and do not record the (possibly incomplete) intensity file
+	    print(proc_id + "WARNING: The optics code failed (exit code " + str(returnCode) + ") for ParticlePositions file '" + i_file + "'. " \
+	        + "See its log: '" + logFN + "'")
 	#
 	#if (((num_valid%(progressCounter.value))%5 == 0) and (float(num_valid)/float(progressCounter.value) != float(1))):
 	with progressCounter.get_lock():
 	    progressCounter.value +=1
-	    print(proc_id + str(100*float(progressCounter.value)/float(num_valid))+"% Done")
+	    print(proc_id + str(100*float(progressCounter.value)/float(num_todo))+"% Done")
+	return (multiprocessing.current_process().name, timer()-startTime, 1)
+
+
+# Like processFile, but calls the optics code once for a whole list of particlePositions files.
+# The optics code receives a batch file with one "<particlePositionsFN> <intensityFN>" pair per line,
+#  and only reads its input file, builds its camera and sets up its scattering strategy once.
+def processBatch(batch):
+	startTime = timer()
+	(batch_id, i_files) = batch
+	proc_id="["+multiprocessing.current_process().name+"] "
+	if(debug): print(proc_id + "Processing batch " + str(batch_id) + " of " + str(len(i_files)) + " files.")
+	pairs = []
+	for i_file in i_files:
+	    file_id = getFileID(i_file)
+	    if file_id is None:
+	        continue
+	    pairs.append( (partPosDir+"/"+i_file, intensityFNf.format(file_id)) )
+	if len(pairs) == 0:
+	    return (multiprocessing.current_process().name, timer()-startTime, 0)
+	batchFN = batchFNf.format(batch_id)
+	with open(batchFN, "w") as batchFile:
+	    for pair in pairs:
+	        batchFile.write(pair[0] + " " + pair[1] + "\n")
+	variablesFN = variablesFNf.format("batch"+str(batch_id))
+	opticsInputFN = opticsInputFNf.format("batch"+str(batch_id))
+	# Create the variables file for templateSubstitutor.py input
+	# (The optics code takes the particlePositions and intensity filenames from the batch file instead.)
+	variablesFile = open( variablesFN, "w" )
+	variablesFile.write(
+	    "particlePositionsFN=" + pairs[0][0] + "\n" +
+	    "intensityFN=DONOTWRITE\n" +
+	    "pixelCoordsFN=DONOTWRITE\n"
+	    "onlyWriteCoords=false"
+	    )
+	variablesFile.close()
+	ts(template=opticsInputTemplateFN,varfile=variablesFN,output=opticsInputFN,overwrite=True).run()
+	if(not debug): os.remove(variablesFN) # Remove temporarily file
+	# Call the optics code, using the generated optics-input-file and the batch file:
+	print(proc_id + "Calling optics code for a batch of " + str(len(pairs)) + " ParticlePositions files")
+	logFN = logFNf.format("batch"+str(batch_id))
+	with open(logFN,'w') as logFile:
+	    returnCode = subprocess.call([opticsCode,opticsInputFN,batchFN], shell=False, stdout=logFile)
+	if(not debug):
+	    os.remove(opticsInputFN) # Remove temporarily files
+	    os.remove(batchFN)
+	# The optics code writes the intensity files in batch order, so only the leading complete files are recorded,
+	#  also if the optics code stopped early without an error code.
+	# (As in isCompleted, a complete intensity file holds one value per pixel.)
+	numPixels = countLines(pixelCoordsFN) if os.path.isfile(pixelCoordsFN) else None
+	numDone = 0
+	for pair in pairs:
+	    if numPixels is None or not os.path.isfile(pair[1]) or countLines(pair[1]) != numPixels:
+	        break
+	    numDone += 1
+	pairsDone = pairs[:numDone]
+	if returnCode == 0 and numDone == len(pairs):
+	    if not logOptics :
+	        os.remove(logFN)
+	else: # Keep the log
+	    print(proc_id + "WARNING: The optics code completed only " + str(numDone) + " of " + str(len(pairs)) + " ParticlePositions files " \
+	        + "in batch " + str(batch_id) + " (exit code " + str(returnCode) + "). See its log: '" + logFN + "'")
+	for pair in pairsDone:
+	    recordCompleted(pair[0], pair[1])
+	#
+	with progressCounter.get_lock():
+	    progressCounter.value += len(pairs)
+	    print(proc_id + str(100*float(progressCounter.value)/float(num_todo))+"% Done")
+	return (multiprocessing.current_process().name, timer()-startTime, len(pairs))
+
+# Divides the files over numBatches batches of (approximately) equal total cost.
+# Greedy: the files are taken most expensive first, and each goes to the batch with the lowest cost so far.
+# The returned batches are sorted most expensive first as well.
+def makeBatches(fileList, costs, numBatches):
+	numBatches = max(1, min(numBatches, len(fileList)))
+	batches = [ [] for i in range(numBatches) ]
+	loads = [ 0.0 ]*numBatches
+	for j in sorted(range(len(fileList)), key=lambda j: costs[j], reverse=True):
+		i = loads.index(min(loads))
+		batches[i].append(fileList[j])
+		loads[i] += costs[j]
+	order = sorted(range(numBatches), key=lambda i: loads[i], reverse=True)
+	return [ (i, batches[i]) for i in order ]
+
+# Prints, for each worker, the fraction of the wall time that it was busy
+def reportUtilisation(results, wallTime):
+	busy = dict()
+	for (name, busyTime, numFiles) in results:
+		(prevTime, prevFiles) = busy.get(name, (0.0, 0))
+		busy[name] = (prevTime+busyTime, prevFiles+numFiles)
+	print("[Master] Worker utilisation (wall time = " + "%.1f"%wallTime + " s):")
+	for name in sorted(busy):
+		(busyTime, numFiles) = busy[name]
+		print("  " + name + ": " + str(numFiles) + " files, busy " + "%.1f"%busyTime + " s = " + \
+			"%.1f"%(100*busyTime/wallTime if wallTime > 0 else 0) + "%")
+	if len(busy) > 0:
+		total = sum(busyTime for (busyTime, numFiles) in busy.values())
+		print("  average: " + "%.1f"%(100*total/len(busy)/wallTime if wallTime > 0 else 0) + "%")
 
 
 
@@ -293,13 +527,42 @@ def writePixelCoords():
 #print("CPU_count = " + str(multiprocessing.cpu_count()))
 if(debug): print("")
 # Pixel coordinates:
-writePixelCoords()
+if not ( resume and os.path.isfile(pixelCoordsFN) and countLines(pixelCoordsFN) > 0 ):
+	writePixelCoords()
+completed, runtimes = readManifest()
+# Resume: skip the particlePositions files of which the intensity file was completed before
+if resume:
+	numPixels = countLines(pixelCoordsFN) if os.path.isfile(pixelCoordsFN) else None
+	partPosList = [ i_file for i_file in partPosList \
+		if not isCompleted(partPosDir+"/"+i_file, intensityFNf.format(getFileID(i_file)), completed, numPixels) ]
+	print("Resuming: number of ParticlePositions files left to compute = " + str(len(partPosList)) + "/" + str(num_valid))
+num_todo = max(1, len(partPosList))
+# Schedule the most expensive files first (LPT), such that no core is left with a large file at the end
+costExponent = fitCostExponent(runtimes)
+if(debug): print("[Master] Cost model: N^" + str(costExponent))
+costs = [ estimateCost(i_file, costExponent) for i_file in partPosList ]
+order = sorted(range(len(partPosList)), key=lambda j: costs[j], reverse=True)
+partPosList = [ partPosList[j] for j in order ]
+costs = [ costs[j] for j in order ]
 # Intensity files:
 if(numCores > 0):
 	pool = Pool(processes=numCores)
 else:
 	pool = Pool()
-pool.map(processFile, partPosList)
+if(batchMode):
+	# Sanity check: the optics code splits the lines of the batch file on spaces
+	if any(" " in name for name in [partPosDir, outputDir]+partPosList):
+		sys.exit("\nERROR: Batch mode (-b) does not support spaces in the particlePositions or output path.\n")
+	numBatches = numCores if numCores > 0 else multiprocessing.cpu_count()
+	jobs, worker = makeBatches(partPosList, costs, numBatches), processBatch
+else:
+	jobs, worker = partPosList, processFile
+# chunksize=1: each worker picks up the next job as soon as it is idle
+startTime = timer()
+results = list(pool.imap_unordered(worker, jobs, chunksize=1))
+pool.close()
+pool.join()
+reportUtilisation(results, timer()-startTime)
 
 
 
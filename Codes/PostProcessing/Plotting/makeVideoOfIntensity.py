@@ -12,21 +12,26 @@ import os.path
 import numpy as np # Matrices
 import cv2 # Video processing
 #import matplotlib
-#import matplotlib.pyplot as plt
+import matplotlib.pyplot as plt
+
+import helpers.IO as optoFluidsIO
 
 # Command-Line Options
 #
 intensity2DDir = ""
 pixelCoordsFileName = ""
+stackFileName = ""
 pixelCoords=0
 filenummer = 1
 #
 usageString = "   usage: " + sys.argv[0] + " -i <intensity2D dir>" + "[-c <pixelCoords2D file>]"+"[-n filenumberToPlot]\n" \
+			  + "   or:    " + sys.argv[0] + " -s <intensity stack file>" + "[-n framenumberToPlot]\n" \
 			  + "	where:\n" \
-			  + "	-c: By default tries to locate pixelCoords2D file inside the dir specified at -i"
+			  + "	-c: By default tries to locate pixelCoords2D file inside the dir specified at -i\n" \
+			  + "	-s: Read the frames from an intensity stack (see makeIntensityStack.py) instead. Its frames are sorted by time."
 
 try:
-	opts, args = getopt.getopt(sys.argv[1:],"hfli:o:t:c:n:")
+	opts, args = getopt.getopt(sys.argv[1:],"hfli:o:t:c:n:s:")
 except getopt.GetoptError:
 	print(usageString)
 	sys.exit(2)
@@ -40,17 +45,24 @@ for opt, arg in opts:
 		pixelCoordsFileName = arg
 	elif opt == '-n':
 		filenummer = int(arg)
+	elif opt == '-s':
+		stackFileName = arg
 	else :
 		print(usageString)
 		sys.exit(2)
 
-if intensity2DDir == "" :
+if stackFileName != "":
+	pass # The stack holds npix itself, so pixelCoords are not needed
+elif intensity2DDir == "" :
 	print(usageString)
 	print("    Note: dir-/filenames cannot be an empty string:")
 	print("     intensityDirName="+intensity2DDir )
 	sys.exit(2)
 
-if pixelCoordsFileName == "":
+if stackFileName != "":
+	stack = optoFluidsIO.IntensityStack(stackFileName)
+	print("Loaded intensity stack " + stackFileName + " with " + str(len(stack)) + " frames")
+elif pixelCoordsFileName == "":
 	print("Checking if 'pixelCoords2D.out' file available in "+intensity2DDir)
 	if(os.path.isfile(intensity2DDir+"/PixelCoords.out")):
 		pixelCoords = np.loadtxt(intensity2DDir+"/PixelCoords.out",delimiter=' ', skiprows=2)
@@ -88,6 +100,20 @@ def computeContrastByLocalContrast(img):
 
 
 
+if stackFileName != "":
+	# Normalised (a,b) coordinates; the span vectors are in stack.span.
+	(X, Y) = np.meshgrid(np.linspace(0,1,stack.npix[0]), np.linspace(0,1,stack.npix[1]), indexing="ij")
+	(image, time, index) = stack.frame(filenummer-1)
+	print("Plotting frame " + str(filenummer) + " at t=" + str(time))
+	fig = plt.figure()
+	plt.pcolormesh(X,Y, image, edgecolor='face')
+	plt.axis("off")
+	cb=plt.colorbar()
+	cb.set_label(r"$I$ [a.u]")
+	plt.title(r"$\langle C \rangle _{window} =$ "+str(computeContrastByLocalContrast(image)))
+	plt.show(block=True)
+	sys.exit("Done")
+
 floatRE=r"[-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?"
 myRegex = "Intensity2D_t("+floatRE+")\.out"
 intensityFileNameRE = re.compile(myRegex)
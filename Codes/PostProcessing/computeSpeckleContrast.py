@@ -9,6 +9,10 @@
 #	15 11 2018: Original
 #	05 04 2019: Implemented enhanced RTS "select" functionality by deleting lines that are now no longer necessary.
 #	14 05 2019:	Now accepts a result directory as -i, as well as an intensity file. --> Bram Simons
+#	18 10 2026: Now accepts an intensity stack file as -i.
+#	18 10 2026: Added batch mode (--batch): computes several speckle contrast variants for all frames of one or more
+#				result directories in a single process pool, and writes the "t;..." csv directly.
+#				listFrames scans the directory with helpers.dirIndex.
 #
 # TODO:
 # - If intensity1D is read, windowing cannot be used, unless we automatically detect pixelCoords and reshape.
@@ -19,6 +23,7 @@
 import sys, getopt # Command-Line options
 import os.path
 import traceback
+from multiprocessing import Pool
 
 # Numerics
 import numpy as np # Matrices
@@ -28,6 +33,7 @@ import helpers.IO as optoFluidsIO
 import helpers.RTS as RTS
 import helpers.regex as myRE
 import helpers.nameConventions as names
+import helpers.dirIndex as dirIndex
 import speckleContrast as SC
 import helpers.printFuncs as myPrint
 
@@ -40,6 +46,94 @@ def computeSpeckleContrast(data, SC_func, *args, **kwargs):
 	return SC
 
 
+##############
+## Batch mode
+####
+
+# Parses a variant string of the form "label:SC_func[:args]" or "SC_func", e.g. "grid16:grid:(16,16)".
+# args is as for --args (semicolon-separated). The label defaults to SC_func, and is used as csv header.
+# @return: (label, SC_func, args, kwargs)
+def parseVariant(variant):
+	items = variant.split(':', 2)
+	if len(items) == 1:
+		items = [items[0], items[0]]
+	(SC_args, SC_kwargs) = RTS.multiArgStringToArgs(items[2] if len(items) == 3 else None)
+	return (items[0], items[1], SC_args, SC_kwargs)
+
+# Directory with the frames of a result directory: the blurred 2D intensity if present, else the 2D intensity.
+def findFramesDir(resDN, framesDN=None):
+	if framesDN is not None:
+		return names.joinPaths(resDN, framesDN)
+	input2DDN = names.joinPaths(resDN, names.input2DDN)
+	for DN in ( names.joinPaths(input2DDN, names.intensityBlurredDN()), input2DDN ):
+		if os.path.isdir(DN):
+			return DN
+	raise Exception("Cannot find the 2D intensity of result directory \"" + str(resDN) + "\". Run convertDataTo2D.py first.")
+
+# Lists the frames in DN as [(time, frame)], sorted by time, where frame is either an intensity filename,
+#  or a (stack filename, frame number) tuple if DN holds an intensity stack.
+def listFrames(DN):
+	stackFN = names.joinPaths(DN, names.intensityStackFN)
+	if os.path.isfile(stackFN):
+		stack = optoFluidsIO.IntensityStack(stackFN)
+		return [ (float(stack.times[i]), (stackFN, i)) for i in range(len(stack)) ]
+	intFiles = dirIndex.scan(DN, "intensity")
+	return [ (float(time), FN) for (time, FN) in zip(intFiles.times, intFiles.paths()) ]
+
+# Per-process state of the batch workers: the selected variants are constructed once per process,
+#  and intensity stacks are opened once per process.
+_batchFuncs = None
+_batchStacks = dict()
+def _initBatchWorker(variants):
+	global _batchFuncs
+	_batchFuncs = [ select(SC_func, *SC_args, **SC_kwargs) for (label, SC_func, SC_args, SC_kwargs) in variants ]
+
+def _computeBatchFrame(frame):
+	if isinstance(frame, tuple):
+		(stackFN, i) = frame
+		if stackFN not in _batchStacks:
+			_batchStacks[stackFN] = optoFluidsIO.IntensityStack(stackFN)
+		data = _batchStacks[stackFN][i]
+	else:
+		(data, time, index) = optoFluidsIO.readFromFile_Intensity(frame)
+	return [ SCfunc(data) for SCfunc in _batchFuncs ]
+
+# Computes all variants (see parseVariant) for all frames of the result directory inputDN.
+# If inputDN holds multiple result directories (results_<n>), then the mean and std over those are returned
+#  for each variant. All result directories must have the same frame times.
+# numCores := number of processes. Use 0 to use all available system cores.
+# @return: (times, header, table), with table of shape (len(times), len(header)-1) and header[0]="t"
+def computeSpeckleContrastBatch(inputDN, variants, framesDN=None, numCores=1):
+	variants = [ parseVariant(v) if isinstance(v, str) else v for v in variants ]
+	resultDNs = optoFluidsIO.getResultDirs(inputDN)
+	frameLists = [ listFrames(findFramesDir(resDN, framesDN)) for resDN in resultDNs ]
+	times = [ time for (time, frame) in frameLists[0] ]
+	if len(times) == 0:
+		raise Exception("No intensity frames found in \"" + str(findFramesDir(resultDNs[0], framesDN)) + "\".")
+	for (resDN, frameList) in zip(resultDNs, frameLists):
+		if [ time for (time, frame) in frameList ] != times:
+			raise Exception("The frame times of \"" + str(resDN) + "\" differ from those of \"" + str(resultDNs[0]) + "\".")
+
+	# Compute all frames of all result directories in one pool:
+	jobs = [ frame for frameList in frameLists for (time, frame) in frameList ]
+	initargs = (variants,)
+	if numCores == 1:
+		_initBatchWorker(*initargs)
+		SCs = [ _computeBatchFrame(job) for job in jobs ]
+	else:
+		numCores = numCores if numCores > 0 else os.cpu_count()
+		with Pool(processes=numCores, initializer=_initBatchWorker, initargs=initargs) as pool:
+			SCs = pool.map(_computeBatchFrame, jobs, chunksize=max(1, len(jobs)//(8*numCores)))
+	SCs = np.array(SCs, dtype=float).reshape((len(resultDNs), len(times), len(variants)))
+
+	labels = [ label for (label, SC_func, SC_args, SC_kwargs) in variants ]
+	if len(resultDNs) == 1:
+		return (times, ["t"] + labels, SCs[0])
+	header = ["t"] + [ label + suffix for label in labels for suffix in ("_mean", "_std") ]
+	table = np.stack( (np.mean(SCs, axis=0), np.std(SCs, axis=0)), axis=2 ).reshape((len(times), 2*len(variants)))
+	return (times, header, table)
+
+
 ##############
 ## Command-Line Interface (CLI)
 ####
@@ -55,12 +149,30 @@ if __name__=='__main__':
 
 	# Parse options
 	parser.add_option('-i', dest='inFDN',
-						   help="Name of results directory, or single intensity filename"),
+						   help="Name of results directory, single intensity filename, or intensity stack filename"),
 	parser.add_option('-t', dest='SC_func', default="basic",
 						   help="Name of the speckle contrast function: " + str(RTS.getFunctions(SC)) + ". [default: %default]"),
 	parser.add_option('--args', dest='SC_args',
 						   help="Required arguments for the chosen speckle contrast function (if any). " +
 							"Separate the parameters with a semicolon (e.g., --args \"a;b\").")
+	parser.add_option('--time', dest='time', type="float", default=None,
+						   help="Time of the frame to use if -i is an intensity stack. If omitted, all frames are used."),
+	parser.add_option('--batch', action="store_true", dest="batch", default=False,
+						   help="Batch mode: compute the speckle contrast of all frames of the result directory (-i), " +
+							"and output a \"t;...\" csv. Multiple result directories (results_<n>) give a mean and std column per variant. " +
+							"[default: %default]")
+	parser.add_option('-V', '--variant', dest='variants', action='append', default=None,
+						   help="Batch mode: speckle contrast variant \"label:SC_func[:args]\" (e.g., -V \"grid16:grid:(16,16)\"). " +
+							"May be given multiple times. Defaults to the -t and --args options.")
+	parser.add_option('--frames', dest='framesDN', default=None,
+						   help="Batch mode: directory with the frames, relative to the result directory. " +
+							"[default: 2D/blurred if present, otherwise 2D]")
+	parser.add_option('-C', dest='numCores', type="int", default=1,
+						   help="Batch mode: number of processes. Use 0 to use all available system cores. [default: %default]")
+	parser.add_option('-o', dest='outFN', default=None,
+						   help="Batch mode: output csv filename. [default: stdout]")
+	parser.add_option("-f", action="store_true", dest="overwrite", default=False,
+						   help="force overwrite output? [default: %default]")
 	parser.add_option("-v", action="store_true", dest="verbose", default=False,
 						   help="verbose [default: %default]")
 	(opt, args) = parser.parse_args()
@@ -70,12 +182,33 @@ if __name__=='__main__':
 	(SC_args, SC_kwargs) = RTS.multiArgStringToArgs(opt.SC_args)
 
 	# Detect whether input is an intensity file or a directory:
-	if myRE.doesItemMatch(os.path.basename(opt.inFDN), myRE.compile(names.intensityFNRE)):
+	if opt.batch:
+		if opt.variants is None:
+			variants = [ (opt.SC_func, opt.SC_func, SC_args, SC_kwargs) ]
+		else:
+			variants = [ parseVariant(v) for v in opt.variants ]
+		(times, header, table) = computeSpeckleContrastBatch(opt.inFDN, variants, framesDN=opt.framesDN, numCores=opt.numCores)
+		if opt.outFN is None:
+			print(*header, sep=';')
+			for (time, row) in zip(times, table):
+				print(time, *row, sep=';')
+		else:
+			optoFluidsIO.writeCSV(table, opt.outFN, dataCol1=times, header=header, overwrite=opt.overwrite)
+	elif myRE.doesItemMatch(os.path.basename(opt.inFDN), myRE.compile(names.intensityFNRE)):
 		# Then input is an intensity filename
 		# Read input:
 		(data, time, index) = optoFluidsIO.readFromFile_Intensity(opt.inFDN)
 		# Compute and output:
 		print( computeSpeckleContrast(data, opt.SC_func, *SC_args, **SC_kwargs) )
+	elif optoFluidsIO.isIntensityStack(opt.inFDN):
+		# Then input is an intensity stack
+		stack = optoFluidsIO.IntensityStack(opt.inFDN)
+		if opt.time is not None:
+			print( computeSpeckleContrast(stack.atTime(opt.time), opt.SC_func, *SC_args, **SC_kwargs) )
+		else: # Output all frames as "t;SC"
+			print("t", opt.SC_func, sep=';')
+			for i_frame in range(len(stack)):
+				print(stack.times[i_frame], computeSpeckleContrast(stack[i_frame], opt.SC_func, *SC_args, **SC_kwargs), sep=';')
 	else:
 		# Else input is not an intensity filename. Check whether it is a result directory.
 		# Get multiple result directories (if any):
@@ -1,5 +1,5 @@
-#! /usr/bin/env python2
-# 
+#! /usr/bin/env python3
+#
 # genCylParticles.py
 #  Kevin van As
 #  11th June 2015
@@ -14,146 +14,177 @@
 # - It should include the r=R_max point (I suppose with a guaranteed zero probability?)
 #
 # Usage:
-#  phi2probdens.py -h 
-#  phi2probdens.py -i fig4.dat -o fig4 
+#  phi2probdens.py -h
+#  phi2probdens.py -i fig4.dat -o fig4
+#
+# 18 10 2026: To Python3.
+#             All N particles are sampled at once (inverse transform sampling with np.searchsorted on the accumulated
+#             probability), and written in a single call. Optional seed (-s) for a reproducible numpy Generator.
+#             Optionally writes the binary particle positions format of helpers.IO (-b), which the optics code reads directly.
 #
 import sys, getopt # Command-Line options
 import os.path, inspect
-import subprocess # Execute another python program
-from shutil import copyfile, rmtree
+from shutil import rmtree
 import numpy as np # Matrices
-import random # random-number generator
-import math # mathematics
+#
+# Import from optoFluids:
+import helpers.IO as optoFluidsIO
 #
 filename = inspect.getframeinfo(inspect.currentframe()).filename
 scriptDir = os.path.dirname(os.path.abspath(filename))
 #
-# Command-Line Options
-#
-cumProbFileName = ""
-N = 1000
-R = 1
-L = 1
-O = "(0,0,0)"
-outputFileName= ""
-overwrite = False
-#
-usageString = "   usage: " + sys.argv[0] + " -i <accumProbFunctionFileName for r> -o <output fileName>" \
-            + " [-N <numParticles>] [-R <radius of cylinder>] [-L <length of cylinder>]\n" \
-            + " [-O <origin of cylinder>] [-f]\n" \
-            + "     where:\n" \
-            + "       -i := a two-column >=2 row data file which starts at (0,0) and ends at (1,0), which describes the accumulated probability density function\n" \
-            + "       -N (int) := number of particles to be generated. Defaults to 1000.\n" \
-            + "       -R (float) := maximum radius of cylinder in which the particles are generated. Must be positive. Defaults to 1.\n" \
-            + "       -L (float) := length of cylinder in which the particles are generated. Can be negative. Defaults to 1.\n" \
-            + "       -O '(float,float,float)' := 3-vector, origin of coordinate system. The base of the cylinder at r=0,z=0. Defaults to (0,0,0).\n" \
-            + "       -f := force overwrite. WARNING: This will remove any existing directory specified using the -o option\n"
-try:
-    opts, args = getopt.getopt(sys.argv[1:],"hfi:o:N:R:L:O:")
-except getopt.GetoptError:
-    print usageString 
-    sys.exit(2)
-for opt, arg in opts:
-    if opt == '-h':
-        print usageString 
-        sys.exit(0)
-    elif opt == '-i':
-        cumProbFileName = arg
-    elif opt == '-o':
-        outputFileName= arg
-    elif opt == '-f':
-        overwrite = True
-    elif opt == '-N':
-        N = int(arg)
-    elif opt == '-R':
-        R = float(arg)
-    elif opt == '-L':
-        L = float(arg)
-    elif opt == '-O':
-        O = arg
-    else :
-        print usageString 
-        sys.exit(2)
-#
-if R<=0 :
-    print usageString
-    print "    R must be positive: R>0. R was: ", R
-    sys.exit(2)
-if cumProbFileName == "" or outputFileName == "" :
-    print usageString 
-    print "    Note: dir-/filenames cannot be an empty string:"
-    print "     cumProbFileName="+cumProbFileName+" outputFileName="+outputFileName
-    sys.exit(2)
-#
-# Check for existence of the files
-if not os.path.exists(cumProbFileName) or not os.path.isfile(cumProbFileName) :
-    print "\nERROR: inputfile '"+cumProbFileName+"' (-i) must exist and be a file."
-    print usageString 
-    sys.exit(2)
-if ( os.path.exists(outputFileName) and not overwrite ) :
-    sys.exit("\nERROR: OutputFile '" + outputFileName + "' (-o) already exists.\n" + \
-             "Terminating program to prevent overwrite. Use the -f option to enforce overwrite.\n" + \
-             "BE WARNED: This will remove the existing OutputFile!")
+#####
+# Sampler
+##
+# Reads the accumulated probability file (phi2probdens.py output), which has two columns: r and the accumulated probability.
+def readCumProb(cumProbFileName):
+    dt = np.dtype([('r',float),('prob',float)])
+    return np.loadtxt(cumProbFileName,dt)
 #
-if ( os.path.exists(outputFileName) and overwrite ) :
-    if os.path.isdir(outputFileName) :
-        rmtree(outputFileName)
-    else :
-        os.remove(outputFileName)
+# Draws N radii from the accumulated probability cumProb, rescaled to a cylinder of radius R.
+# Inverse transform sampling: for uniform rnd, find the bracket cumProb['prob'][i-1] <= rnd < cumProb['prob'][i]
+#  with a binary search, and interpolate the radius linearly inside it.
+def sampleRadii(cumProb, N, R, rng):
+    rnd = rng.random(N)
+    index2 = np.searchsorted(cumProb['prob'], rnd, side='right') # Index just above the requested value
+    index2 = np.clip(index2, 1, len(cumProb)-1)
+    # Intepolate the radial value
+    #  Interpolation coefficient. 0<=f<1. r = r[index2-1]*(1-f)+r[index2]*f:
+    p0 = cumProb['prob'][index2-1]
+    p1 = cumProb['prob'][index2]
+    r0 = cumProb['r'][index2-1]
+    r1 = cumProb['r'][index2]
+    f = (rnd-p0) / (p1-p0)
+    r = r0+f*(r1-r0)
+    return r*R/cumProb['r'][-1] # rescale
 #
-# Get the origin into numpy:
-O = O.strip('(')
-O = O.strip(')')
-O = O.strip('[')
-O = O.strip(']')
-O = np.fromstring(O,dtype=float,sep=',')
-if np.size(O) != 3 :
-    print "\nERROR: Origin must have three space coordinates. "+str(np.size(O))+" were given.\n"
-    print usageString
-    sys.exit(2)
+# Returns (N,3) particle positions in the cylinder of radius R and length L (along z) with its base at origin O,
+#  with the radial distribution cumProb and uniformly distributed in the angle and in z.
+# rng := numpy.random.Generator, e.g. np.random.default_rng(seed)
+def sampleCylinder(cumProb, N, R, L, O, rng):
+    r = sampleRadii(cumProb, N, R, rng)
+    phi = rng.random(N)*2*np.pi
+    z = rng.random(N)*L
+    positions = np.empty((N,3))
+    positions[:,0] = r*np.cos(phi)
+    positions[:,1] = r*np.sin(phi)
+    positions[:,2] = z
+    return positions + np.asarray(O, dtype=float) # Shift origin
 #
-#####
-# Convert phi=V/V to a number probability density function
-##
-# 1) Load the phi-file, which has two columns: r and phi(r) and convert to [0,1] domain
-dt = np.dtype([('r',float),('prob',float)])
-cumProb=np.loadtxt(cumProbFileName,dt)
-# 2) For each particle, generate a position
-with open(outputFileName,'w') as f_handle:
-#    f_handle.write("(\n")
-    for i in xrange(0,N) :
-    # a) Sample random numbers
-        rnd = random.random()
-        index2 = (cumProb['prob'] > rnd).nonzero()[0][0] # Index just above the requested value
-        # Intepolate the radial value
-        #  Interpolation coefficient. 0<=f<1. r = r[index2-1]*(1-f)+r[index2]*f:
-        f = (rnd-cumProb['prob'][index2-1]) / (cumProb['prob'][index2]-cumProb['prob'][index2-1])
-        r = cumProb['r'][index2-1]+f*(cumProb['r'][index2]-cumProb['r'][index2-1])
-        r = r*R/cumProb['r'][-1]; # rescale
-#        print "maxR=", cumProb['r'][-1];
-#        print "rnd=",rnd
-#       print "matching_index=",index2
-#       print "f=", f
-#       print "r=", r
-        phi = random.random()*2*math.pi
-#       print "phi=",phi
-# Original:
-        z = random.random()*L
-        x = r*math.cos(phi)
-        y = r*math.sin(phi)
-#        z = r*math.cos(phi)
-#        x = random.random()*L
-#        y = r*math.sin(phi)
-#        print "(x,y,z)_preshift=(",x,",",y,",",z,")"
-        # b) Shift origin
-        x = x + O[0]
-        y = y + O[1]
-        z = z + O[2]
-#        print "(x,y,z)_postshift=(",x,",",y,",",z,")"
-        # c) Write to file
-        f_handle.write("("+str(x)+" "+str(y)+" "+str(z)+")\n")
-#    f_handle.write(")")
+# Writes one "(x y z)" line per particle, in a single buffered call.
+# (convertParticles2OptoFormat.sh adds the header that the optics code requires.)
+def writePositionLines(positions, outputFileName):
+    np.savetxt(outputFileName, positions, fmt="(%.17g %.17g %.17g)")
 #
 #
-#print "Done."
+if __name__ == '__main__':
+    #
+    # Command-Line Options
+    #
+    cumProbFileName = ""
+    N = 1000
+    R = 1
+    L = 1
+    O = "(0,0,0)"
+    outputFileName= ""
+    overwrite = False
+    seed = None
+    binary = False
+    #
+    usageString = "   usage: " + sys.argv[0] + " -i <accumProbFunctionFileName for r> -o <output fileName>" \
+                + " [-N <numParticles>] [-R <radius of cylinder>] [-L <length of cylinder>]\n" \
+                + " [-O <origin of cylinder>] [-s <seed>] [-b] [-f]\n" \
+                + "     where:\n" \
+                + "       -i := a two-column >=2 row data file which starts at (0,0) and ends at (1,0), which describes the accumulated probability density function\n" \
+                + "       -N (int) := number of particles to be generated. Defaults to 1000.\n" \
+                + "       -R (float) := maximum radius of cylinder in which the particles are generated. Must be positive. Defaults to 1.\n" \
+                + "       -L (float) := length of cylinder in which the particles are generated. Can be negative. Defaults to 1.\n" \
+                + "       -O '(float,float,float)' := 3-vector, origin of coordinate system. The base of the cylinder at r=0,z=0. Defaults to (0,0,0).\n" \
+                + "       -s (int) := seed of the random-number generator, for reproducible particles. Defaults to a random seed.\n" \
+                + "       -b := write the binary particle positions format (see helpers/IO.py), which the optics code reads directly,\n" \
+                + "             instead of \"(x y z)\" lines (which require convertParticles2OptoFormat.sh).\n" \
+                + "       -f := force overwrite. WARNING: This will remove any existing directory specified using the -o option\n"
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"hfbi:o:N:R:L:O:s:")
+    except getopt.GetoptError:
+        print(usageString)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usageString)
+            sys.exit(0)
+        elif opt == '-i':
+            cumProbFileName = arg
+        elif opt == '-o':
+            outputFileName= arg
+        elif opt == '-f':
+            overwrite = True
+        elif opt == '-b':
+            binary = True
+        elif opt == '-N':
+            N = int(arg)
+        elif opt == '-R':
+            R = float(arg)
+        elif opt == '-L':
+            L = float(arg)
+        elif opt == '-O':
+            O = arg
+        elif opt == '-s':
+            seed = int(arg)
+        else :
+            print(usageString)
+            sys.exit(2)
+    #
+    if R<=0 :
+        print(usageString)
+        print("    R must be positive: R>0. R was: ", R)
+        sys.exit(2)
+    if cumProbFileName == "" or outputFileName == "" :
+        print(usageString)
+        print("    Note: dir-/filenames cannot be an empty string:")
+        print("     cumProbFileName="+cumProbFileName+" outputFileName="+outputFileName)
+        sys.exit(2)
+    #
+    # Check for existence of the files
+    if not os.path.exists(cumProbFileName) or not os.path.isfile(cumProbFileName) :
+        print("\nERROR: inputfile '"+cumProbFileName+"' (-i) must exist and be a file.")
+        print(usageString)
+        sys.exit(2)
+    if ( os.path.exists(outputFileName) and not overwrite ) :
+        sys.exit("\nERROR: OutputFile '" + outputFileName + "' (-o) already exists.\n" + \
+                 "Terminating program to prevent overwrite. Use the -f option to enforce overwrite.\n" + \
+                 "BE WARNED: This will remove the existing OutputFile!")
+    #
+    if ( os.path.exists(outputFileName) and overwrite ) :
+        if os.path.isdir(outputFileName) :
+            rmtree(outputFileName)
+        else :
+            os.remove(outputFileName)
+    #
+    # Get the origin into numpy:
+    O = O.strip('(')
+    O = O.strip(')')
+    O = O.strip('[')
+    O = O.strip(']')
+    O = np.array(O.split(','), dtype=float) if O.strip() else np.zeros(0)
+    if np.size(O) != 3 :
+        print("\nERROR: Origin must have three space coordinates. "+str(np.size(O))+" were given.\n")
+        print(usageString)
+        sys.exit(2)
+    #
+    #####
+    # Convert phi=V/V to a number probability density function
+    ##
+    # 1) Load the accumulated probability file
+    cumProb = readCumProb(cumProbFileName)
+    # 2) Generate all positions
+    positions = sampleCylinder(cumProb, N, R, L, O, np.random.default_rng(seed))
+    # 3) Write to file
+    if binary:
+        optoFluidsIO.writeToFile_Positions(positions, outputFileName, binary=True, overwrite=overwrite)
+    else:
+        writePositionLines(positions, outputFileName)
+    #
+    #
+    #print("Done.")
 # EOF
@@ -16,6 +16,13 @@
 #	04 04 2019: Added readCSV functionality
 #	10 04 2019:	Added writeCSV functionality
 #	14 05 2019: Added getResultDirs function, and sorting functionality
+#	18 10 2026: Added a binary intensity format with a self-describing header, read back as a memory map.
+#				Added the intensity stack: all frames of a result directory in a single file.
+#				Added particle positions I/O, in the text and in a binary format.
+#				IntensityStack.majorSteps detects the major timesteps of the stack.
+#				writeToFile_Intensity2D writes with a single np.savetxt call.
+#				Added the camera geometry cache (CameraGeometry), which readFromFile_CoordsAB[_header] go through.
+#				convertToIntensityStack scans the directories with helpers.dirIndex.
 #
 # TODO:
 # - auto detect pixelCoords location?
@@ -36,6 +43,8 @@ import numpy as np # Matrices
 # OptoFluids imports
 import helpers.regex as myRE
 import helpers.nameConventions as names
+import helpers.timeSteps as timeSteps
+import helpers.dirIndex as dirIndex
 
 
 ####
@@ -215,9 +224,9 @@ def readFromFile_CoordsXYZ(FN, forceRead=False):
 	assert (fileExists(FN))
 
 	# Read (x,y,z) coordinate:
-	#dataRegex = myRE.compile(myRE.withinSpaces(myRE.floatREx3))
-	dataRegex = myRE.compile(myRE.floatREx3)
-	coords = np.fromregex(FN,dataRegex,dtype='f')
+	coords = np.loadtxt(FN, dtype=np.float32, ndmin=2) # single precision, as the optics code writes it
+	if coords.shape[1] != 3:
+		raise Exception("PixelCoordinates \"" + str(FN) + "\" does not have three columns. Invalid file format - cannot be read.")
 	# Return the array
 	return coords
 
@@ -227,10 +236,16 @@ def readFromFile_CoordsXYZ(FN, forceRead=False):
 # Usage example:
 #	(A,B) = readFromFile_CoordsAB(FN) # extract meshgrids of coordinates
 #	npix = np.shape(A) # first tuple index = a direction; second is b
+# Goes through the camera geometry cache (see readCameraGeometry), so only the first call per directory parses the file.
 def readFromFile_CoordsAB(FN, forceRead=False):
 	# Sanity check filename:
 	if not forceRead:
 		doRegexMatch(FN,names.pixelCoords2DFNRE)
+	geometry = readCameraGeometry(FN)
+	return (geometry.A.copy(), geometry.B.copy())
+
+# Parses the (A,B) meshgrids from PixelCoords2D.out, without the cache.
+def parseCoordsAB(FN):
 	assert (fileExists(FN))
 
 	# Read coordinates:
@@ -259,10 +274,16 @@ def readFromFile_CoordsAB(FN, forceRead=False):
 #	(npix, span) = readFromFile_CoordsAB_header(FN)
 # Then, span[0] is the a-direction vector, span[1] is the b-direction vector,
 # and npix = (Na, Nb) are the number of pixels in both directions.
+# Goes through the camera geometry cache (see readCameraGeometry).
 def readFromFile_CoordsAB_header(FN, forceRead=False):
 	# Sanity check filename:
 	if not forceRead:
 		doRegexMatch(FN,names.pixelCoords2DFNRE)
+	geometry = readCameraGeometry(FN)
+	return (geometry.npix, geometry.span)
+
+# Parses the header of PixelCoords2D.out, without the cache.
+def parseCoordsAB_header(FN):
 	assert (fileExists(FN))
 
 	# Read header from coordinates file:
@@ -300,6 +321,77 @@ def readFromFile_CoordsAB_header(FN, forceRead=False):
 	# Done!
 	return (npix, (span_a,span_b))
 
+
+## Camera geometry (cache)
+
+# The camera geometry of a results directory: npix, span and the (A,B) meshgrids of PixelCoords2D.out.
+# It is parsed once, and then persisted next to PixelCoords2D.out as a hidden .npz sidecar (names.cameraGeometryFN),
+# which is valid for as long as the modification time and size of PixelCoords2D.out are unchanged.
+# Within a process, the geometry is additionally kept in memory, so repeated calls return instantly.
+#
+# Usage example:
+#	geometry = readCameraGeometry(FN) # or: findCameraGeometry(DN)
+#	(geometry.npix, geometry.span, geometry.A, geometry.B)
+# The arrays are shared between the callers: copy them before modifying them.
+class CameraGeometry():
+	def __init__(self, npix, span, A, B):
+		self.npix = tuple(int(n) for n in npix)
+		self.span = tuple(tuple(float(x) for x in vector) for vector in span)
+		self.A = A
+		self.B = B
+
+_cameraGeometries = {} # abspath of PixelCoords2D.out --> (stamp, CameraGeometry)
+
+def _fileStamp(FN):
+	stat = os.stat(FN)
+	return (int(stat.st_mtime_ns), int(stat.st_size))
+
+def _cameraGeometrySidecar(FN):
+	return names.joinPaths(os.path.dirname(FN), names.cameraGeometryFN)
+
+def _readCameraGeometrySidecar(FN, stamp):
+	sidecarFN = _cameraGeometrySidecar(FN)
+	if not os.path.isfile(sidecarFN):
+		return None
+	try:
+		with np.load(sidecarFN) as sidecar:
+			if tuple(int(x) for x in sidecar["stamp"]) != stamp:
+				return None
+			return CameraGeometry(sidecar["npix"], sidecar["span"], sidecar["A"], sidecar["B"])
+	except Exception:
+		return None # corrupt or incompatible sidecar: it is simply rebuilt
+
+def _writeCameraGeometrySidecar(FN, stamp, geometry):
+	try:
+		np.savez(_cameraGeometrySidecar(FN), stamp=np.array(stamp, dtype=np.int64), npix=np.array(geometry.npix),
+			span=np.array(geometry.span), A=geometry.A, B=geometry.B)
+	except OSError:
+		pass # e.g. a read-only results directory: then only the in-memory cache is used
+
+# Returns the CameraGeometry of PixelCoords2D.out (FN), from the cache if it is still valid.
+def readCameraGeometry(FN):
+	assert (fileExists(FN))
+	FN = os.path.abspath(FN)
+	stamp = _fileStamp(FN)
+	cached = _cameraGeometries.get(FN)
+	if cached is not None and cached[0] == stamp:
+		return cached[1]
+	geometry = _readCameraGeometrySidecar(FN, stamp)
+	if geometry is None:
+		(npix, span) = parseCoordsAB_header(FN)
+		(A, B) = parseCoordsAB(FN)
+		geometry = CameraGeometry(npix, span, A, B)
+		_writeCameraGeometrySidecar(FN, stamp, geometry)
+	_cameraGeometries[FN] = (stamp, geometry)
+	return geometry
+
+# Returns the CameraGeometry belonging to the intensity files in DN (see findPixelCoords2D), or None if there is none.
+def findCameraGeometry(DN):
+	FN = findPixelCoords2D(DN)
+	if FN is None:
+		return None
+	return readCameraGeometry(FN)
+
 	
 
 ####
@@ -314,14 +406,10 @@ def writeToFile_Intensity2D(data2D, outputDN, time, index=None, overwrite=False,
 	# Sanity:
 	assert (fileNotAlreadyExists(outputFN,overwrite))
 	# Write data to file:
-	outputFile = open(outputFN, "w")
-	for i_x in range(0, len(data2D[:,0]) ) : # x (a-direction) goes into different rows = vertical
-		#(note: this is row-column convention, not an x-y-axis convention, such that "first index" = "x")
-		line = ""
-		for i_y in range(0, len(data2D[0,:])) : # y (b-direction) goes into different columns = horizontal
-			line = line + str(data2D[i_x,i_y]) + " "
-		outputFile.write(line[0:-1] + "\n")
-	outputFile.close()
+	# x (a-direction) goes into different rows = vertical; y (b-direction) goes into different columns = horizontal
+	#(note: this is row-column convention, not an x-y-axis convention, such that "first index" = "x")
+	# 17 significant digits, such that the numbers are read back exactly.
+	np.savetxt(outputFN, np.atleast_2d(data2D), fmt="%.17g", delimiter=" ")
 
 
 ## Reading
@@ -358,6 +446,11 @@ def readFromFile_Intensity1D(FN, N=None, forceRead=False):
 		else:
 			raise Exception(str(error) + " And forceRead=False.")
 	assert (fileExists(FN))
+	if isBinaryIntensity(FN):
+		(data, binTime, binIndex) = readFromFile_IntensityBinary(FN, N)
+		if time is None: # forceRead: take (time,index) from the header instead
+			(time, index) = (binTime, binIndex)
+		return (data, time, index)
 
 	# Read data:
 	data = np.fromfile(FN,dtype=float,count=-1,sep=" ")
@@ -389,9 +482,14 @@ def readFromFile_Intensity2D(FN, forceRead=False):
 		else:
 			raise Exception(str(error) + " And forceRead=False.")
 	assert (fileExists(FN))
+	if isBinaryIntensity(FN):
+		(data, binTime, binIndex) = readFromFile_IntensityBinary(FN)
+		if time is None: # forceRead: take (time,index) from the header instead
+			(time, index) = (binTime, binIndex)
+		return (data, time, index)
 
 	# Read data:
-	data = np.loadtxt(open(FN,"rb"),dtype=float)
+	data = np.loadtxt(FN, dtype=float, ndmin=2)
 	return (data, time, index)
 
 # Automatically calls the correct intensity reader: 1D or 2D.
@@ -412,12 +510,404 @@ def readFromFile_Intensity(FN, N=None, forceRead=False):
 		return readFromFile_Intensity1D(FN, N, forceRead)
 	
 
+## Binary format
+#
+# A binary intensity file is a fixed 64-byte header followed by the raw, C-ordered pixel values.
+# It uses the same filenames as the text format (Intensity_t... for 1D, Intensity2D_t... for 2D),
+# such that all regex-based tools keep working, and the readers above detect it by its magic bytes.
+# The header makes the file self-describing: the dtype, npix, time and index need not be known by the reader.
+
+binaryIntensityMagic = b"OFINTBIN"
+binaryIntensityVersion = 1
+binaryIntensityHeader = np.dtype([
+	("magic", "S8"),
+	("version", "<u4"),
+	("ndim", "<u4"), # 1: 1D vector; 2: 2D (Na,Nb) array
+	("dtype", "S8"), # numpy dtype string of the data, e.g. "<f8" or "<f4"
+	("npix", "<u8", (2,)), # (N,1) for 1D; (Na,Nb) for 2D
+	("time", "<f8"),
+	("index", "<i8"), # -1 if there is no index
+	("reserved", "V8")
+])
+assert binaryIntensityHeader.itemsize == 64
+
+# Returns True if FN starts with the magic bytes of the binary intensity format.
+def isBinaryIntensity(FN):
+	with open(FN, "rb") as f:
+		return f.read(len(binaryIntensityMagic)) == binaryIntensityMagic
+
+# Writes a 1D or 2D intensity array in the binary format.
+# The filename follows the regular (text) naming convention, decided by the dimension of data.
+#
+# dtype := dtype in which to store the data. Use np.float32 to halve the file size.
+# @return: the name of the written file
+def writeToFile_IntensityBinary(data, outputDN, time, index=None, dtype=np.float64, overwrite=False, suffix=""):
+	data = np.ascontiguousarray(data, dtype=np.dtype(dtype).newbyteorder("<"))
+	if data.ndim == 1:
+		outputFN = names.joinPaths(outputDN,names.intensity1DFN(time,index)) + str(suffix)
+		npix = (len(data), 1)
+	elif data.ndim == 2:
+		outputFN = names.joinPaths(outputDN,names.intensity2DFN(time,index)) + str(suffix)
+		npix = np.shape(data)
+	else:
+		raise Exception("Binary intensity files hold 1D or 2D data, but received data of shape " + str(np.shape(data)) + ".")
+	# Sanity:
+	assert (fileNotAlreadyExists(outputFN,overwrite))
+
+	header = np.zeros(1, dtype=binaryIntensityHeader)
+	header["magic"] = binaryIntensityMagic
+	header["version"] = binaryIntensityVersion
+	header["ndim"] = data.ndim
+	header["dtype"] = data.dtype.str.encode()
+	header["npix"] = npix
+	header["time"] = float(time)
+	header["index"] = int(index) if index else -1
+	with open(outputFN, "wb") as outputFile:
+		header.tofile(outputFile)
+		data.tofile(outputFile)
+	return outputFN
+
+# Reads the header of a binary intensity file.
+# @return: ( ndim, dtype, npix, time, index )
+def readFromFile_IntensityBinary_header(FN):
+	header = np.fromfile(FN, dtype=binaryIntensityHeader, count=1)
+	if len(header) != 1 or header["magic"][0] != binaryIntensityMagic:
+		raise Exception("File \"" + str(FN) + "\" is not a binary intensity file.")
+	header = header[0]
+	if header["version"] != binaryIntensityVersion:
+		raise Exception("File \"" + str(FN) + "\" has binary format version " + str(header["version"]) + \
+			", but only version " + str(binaryIntensityVersion) + " is supported.")
+	ndim = int(header["ndim"])
+	npix = tuple(int(n) for n in header["npix"][:ndim])
+	index = float(header["index"]) if header["index"] >= 0 else "" # cf. names.extractTimeAndIndexFromMatch
+	return (ndim, np.dtype(header["dtype"].decode()), npix, float(header["time"]), index)
+
+# Reads a binary intensity file without copying it: the data is a copy-on-write memory map of the file,
+# so only the pixels that are actually used are read from disk, and modifying it does not alter the file.
+#
+# N := (Na,Nb) to reshape 1D data to 2D, as readFromFile_Intensity1D. Ignored for 2D data.
+# @return: ( 1D or 2D numpy memmap, time, index )
+def readFromFile_IntensityBinary(FN, N=None):
+	(ndim, dtype, npix, time, index) = readFromFile_IntensityBinary_header(FN)
+	data = np.memmap(FN, dtype=dtype, mode="c", offset=binaryIntensityHeader.itemsize, shape=npix)
+	if ndim == 1 and N is not None:
+		data = reshapeTo2D(data,N)
+	return (data, time, index)
+
+
+## Stack format
+#
+# An intensity stack holds all 2D frames of a result directory in a single file,
+# which saves the filesystem from handling (tens of) thousands of small files. Layout:
+#	header (128 bytes): magic, version, dtype, nframes, npix=(Na,Nb) and the span vectors of PixelCoords2D.out
+#	table: nframes records of (time, index), with index=-1 if there is no index
+#	frames: one contiguous C-ordered (nframes, Na, Nb) array
+# The frames are ordered as they were written; the converter below sorts them by time.
+
+intensityStackMagic = b"OFINTSTK"
+intensityStackVersion = 1
+intensityStackHeader = np.dtype([
+	("magic", "S8"),
+	("version", "<u4"),
+	("hasSpan", "<u4"), # 0 if span is unknown
+	("dtype", "S8"),
+	("nframes", "<u8"),
+	("npix", "<u8", (2,)),
+	("span", "<f8", (2,3)), # a- and b-direction vector of the camera, as in PixelCoords2D.out
+	("reserved", "V32")
+])
+assert intensityStackHeader.itemsize == 128
+intensityStackTable = np.dtype([("time", "<f8"), ("index", "<i8")])
+
+# Returns True if FN starts with the magic bytes of the intensity stack format.
+def isIntensityStack(FN):
+	if not os.path.isfile(FN):
+		return False
+	with open(FN, "rb") as f:
+		return f.read(len(intensityStackMagic)) == intensityStackMagic
+
+# Writes an intensity stack.
+#
+# frames := iterable of 2D (Na,Nb) arrays, e.g. a generator, such that only one frame is held in memory.
+#			Must yield exactly len(times) frames.
+# times := time of each frame
+# indices := index of each frame, or None if the frames have no index
+# npix := (Na,Nb). If None, the first frame is taken from the iterable to determine it.
+# span := (span_a, span_b) as returned by readFromFile_CoordsAB_header, or None if unknown
+# dtype := dtype in which to store the frames. Use np.float32 to halve the file size.
+def writeToFile_IntensityStack(frames, outputFN, times, indices=None, npix=None, span=None, dtype=np.float64, overwrite=False):
+	# Sanity:
+	assert (fileNotAlreadyExists(outputFN,overwrite))
+	nframes = len(times)
+	if indices is None:
+		indices = [None]*nframes
+	if len(indices) != nframes:
+		raise Exception("In writeToFile_IntensityStack: received " + str(nframes) + " times, but " + str(len(indices)) + " indices.")
+	dtype = np.dtype(dtype).newbyteorder("<")
+	frames = iter(frames)
+	firstFrame = None
+	if npix is None:
+		firstFrame = next(frames)
+		npix = np.shape(firstFrame)
+	if len(npix) != 2:
+		raise Exception("In writeToFile_IntensityStack: expected npix=(Na,Nb), but received npix=" + str(npix) + ".")
+
+	header = np.zeros(1, dtype=intensityStackHeader)
+	header["magic"] = intensityStackMagic
+	header["version"] = intensityStackVersion
+	header["dtype"] = dtype.str.encode()
+	header["nframes"] = nframes
+	header["npix"] = npix
+	if span is not None:
+		header["hasSpan"] = 1
+		header["span"] = span
+	table = np.zeros(nframes, dtype=intensityStackTable)
+	table["time"] = [float(time) for time in times]
+	table["index"] = [int(index) if index else -1 for index in indices]
+	with open(outputFN, "wb") as outputFile:
+		header.tofile(outputFile)
+		table.tofile(outputFile)
+	if nframes == 0:
+		return outputFN
+
+	# Stream the frames into the file:
+	offset = intensityStackHeader.itemsize + intensityStackTable.itemsize*nframes
+	data = np.memmap(outputFN, dtype=dtype, mode="r+", offset=offset, shape=(nframes,)+tuple(npix))
+	i_frame = 0
+	if firstFrame is not None:
+		data[0] = firstFrame
+		i_frame = 1
+	for frame in frames:
+		if i_frame >= nframes:
+			raise Exception("In writeToFile_IntensityStack: received more frames than times (" + str(nframes) + ").")
+		if np.shape(frame) != tuple(npix):
+			raise Exception("In writeToFile_IntensityStack: frame " + str(i_frame) + " has shape " + str(np.shape(frame)) + \
+				", but expected npix=" + str(tuple(npix)) + ".")
+		data[i_frame] = frame
+		i_frame += 1
+	if i_frame != nframes:
+		raise Exception("In writeToFile_IntensityStack: received " + str(i_frame) + " frames, but " + str(nframes) + " times.")
+	data.flush()
+	del data
+	return outputFN
+
+# Reader of an intensity stack.
+# The frames are a copy-on-write memory map, so constructing a stack is cheap
+# and a frame is only read from disk when it is accessed.
+#
+# Usage example:
+#	stack = IntensityStack(FN)
+#	for i in range(len(stack)):
+#		(data, time, index) = stack.frame(i) # same return value as readFromFile_Intensity
+#	data = stack.atTime(0.5)
+class IntensityStack():
+	def __init__(self, FN):
+		assert (fileExists(FN))
+		header = np.fromfile(FN, dtype=intensityStackHeader, count=1)
+		if len(header) != 1 or header["magic"][0] != intensityStackMagic:
+			raise Exception("File \"" + str(FN) + "\" is not an intensity stack.")
+		header = header[0]
+		if header["version"] != intensityStackVersion:
+			raise Exception("File \"" + str(FN) + "\" has stack format version " + str(header["version"]) + \
+				", but only version " + str(intensityStackVersion) + " is supported.")
+		self.FN = FN
+		self.npix = tuple(int(n) for n in header["npix"])
+		self.span = tuple(tuple(float(x) for x in vector) for vector in header["span"]) if header["hasSpan"] else None
+		nframes = int(header["nframes"])
+		table = np.fromfile(FN, dtype=intensityStackTable, count=nframes, offset=intensityStackHeader.itemsize)
+		self.times = table["time"]
+		self.indices = table["index"]
+		offset = intensityStackHeader.itemsize + intensityStackTable.itemsize*nframes
+		if nframes > 0:
+			self.frames = np.memmap(FN, dtype=np.dtype(header["dtype"].decode()), mode="c", offset=offset, shape=(nframes,)+self.npix)
+		else:
+			self.frames = np.zeros((0,)+self.npix)
+	
+	def __len__(self):
+		return len(self.times)
+	
+	def __getitem__(self, i):
+		return self.frames[i]
+
+	# @return: ( 2D numpy memmap, time, index ) of the i-th frame, like readFromFile_Intensity
+	def frame(self, i):
+		index = float(self.indices[i]) if self.indices[i] >= 0 else "" # cf. names.extractTimeAndIndexFromMatch
+		return (self.frames[i], float(self.times[i]), index)
+
+	# Returns the position of the frame at the given time (compared with names.myRound, as the filenames are).
+	# Raises an exception if there is no such frame.
+	def findTime(self, time):
+		i_closest = np.argmin(np.abs(self.times - float(time))) if len(self) > 0 else None
+		if i_closest is None or names.myRound(self.times[i_closest]) != names.myRound(time):
+			raise Exception("Intensity stack \"" + str(self.FN) + "\" has no frame at time t=" + str(time) + ".")
+		return int(i_closest)
+
+	# Returns the 2D frame at the given time.
+	def atTime(self, time):
+		return self.frames[self.findTime(time)]
+
+	# Detects the microsteps and major steps in the times of the frames (which are sorted), see helpers.timeSteps.
+	# @return: (dt_us, dt, starts, lengths), with frames starts[i]:starts[i]+lengths[i] forming major step i
+	def majorSteps(self, dt_us_tol=timeSteps.DEFAULT_dt_us_tol):
+		return timeSteps.detectMajorSteps(self.times, dt_us_tol)
+
+# Reads an intensity stack.
+def readFromFile_IntensityStack(FN):
+	return IntensityStack(FN)
+
+# Looks for PixelCoords2D.out belonging to the intensity files in DN:
+# either inside DN, or inside the "2D" directory next to or inside DN.
+# Returns None if it cannot be found.
+def findPixelCoords2D(DN):
+	for candidateDN in (DN, names.joinPaths(DN,names.input2DDN), names.joinPaths(os.path.dirname(os.path.abspath(DN)),names.input2DDN)):
+		FN = names.joinPaths(candidateDN,names.pixelCoords2DFN)
+		if os.path.isfile(FN):
+			return FN
+	return None
+
+# Converts a directory of intensity files into an intensity stack. Accepted layouts are:
+# - a directory of 1D or 2D intensity files (e.g. the output of timeLooperParallel or convertDataTo2D);
+# - a directory sorted by sortOpticsResults, whose intensity files reside in the major-time subdirectories;
+# - a result directory containing a "2D" directory of either of the above.
+# The frames are sorted by time. The npix and span are taken from PixelCoords2D.out (see findPixelCoords2D).
+#
+# @return: outputFN
+def convertToIntensityStack(inputDN, outputFN=None, dtype=np.float64, overwrite=False):
+	input2DDN = names.joinPaths(inputDN,names.input2DDN)
+	if os.path.isdir(input2DDN):
+		inputDN = input2DDN
+	if outputFN is None:
+		outputFN = names.joinPaths(inputDN,names.intensityStackFN)
+	# Sanity:
+	assert (fileNotAlreadyExists(outputFN,overwrite))
+	geometry = findCameraGeometry(inputDN)
+	if geometry is None:
+		raise Exception("Cannot find \"" + names.pixelCoords2DFN + "\" for the intensity files in \"" + str(inputDN) + "\". " + \
+			"Run convertDataTo2D.py first.")
+	(npix, span) = (geometry.npix, geometry.span)
+
+	# Collect all intensity files, including those inside the sorted (major time) directories:
+	DNs = [inputDN] + [names.joinPaths(inputDN,item) for item in dirIndex.scan(inputDN, "sorted").names]
+	intFiles = []
+	for DN in DNs:
+		DNFiles = dirIndex.scan(DN, "intensity")
+		for (time, index, FN) in zip(DNFiles.times, DNFiles.indices, DNFiles.paths()):
+			intFiles.append( (float(time), None if np.isnan(index) else index, FN) )
+	if len(intFiles) == 0:
+		raise Exception("No intensity files found in \"" + str(inputDN) + "\".")
+	intFiles.sort(key=lambda item: item[0])
+
+	def frames():
+		for (time, index, FN) in intFiles:
+			yield readFromFile_Intensity(FN, npix)[0]
+	return writeToFile_IntensityStack(frames(), outputFN,
+		times=[item[0] for item in intFiles], indices=[item[1] for item in intFiles],
+		npix=npix, span=span, dtype=dtype, overwrite=overwrite)
+
+
 
 
 
 
 
 
+####
+## Particle Positions
+########
+
+# Text format (as OpenFOAM, but without celli):
+#	N
+#	(
+#	(x y z)
+#	...
+#	)
+# Binary format: a fixed 32-byte header followed by the (N,3) positions as raw little-endian float64,
+# with x, y, z of a particle adjacent. The optics code (iomod.f90: readPositions) reads both formats.
+# Both formats use the same filenames, and readers detect the format by its magic bytes.
+
+binaryPositionsMagic = b"OFPOSBIN"
+binaryPositionsVersion = 1
+binaryPositionsHeader = np.dtype([
+	("magic", "S8"),
+	("version", "<u4"),
+	("reserved", "<u4"),
+	("N", "<u8"),
+	("time", "<f8")
+])
+assert binaryPositionsHeader.itemsize == 32
+
+
+## Writing
+
+# Writes (N,3) particle positions to FN in a single write.
+# time := stored in the header of the binary format. The text format does not store it (only the filename does).
+def writeToFile_Positions(data, FN, time=None, binary=False, overwrite=False):
+	# Sanity:
+	assert (fileNotAlreadyExists(FN,overwrite))
+	data = np.asarray(data, dtype=float)
+	if data.ndim != 2 or data.shape[1] != 3:
+		raise Exception("Particle positions must have the shape (N,3), but received " + str(np.shape(data)) + ".")
+	N = len(data)
+	if binary:
+		header = np.zeros(1, dtype=binaryPositionsHeader)
+		header["magic"] = binaryPositionsMagic
+		header["version"] = binaryPositionsVersion
+		header["N"] = N
+		header["time"] = float(time) if time is not None else np.nan
+		with open(FN, "wb") as outputFile:
+			outputFile.write(header.tobytes() + np.ascontiguousarray(data, dtype="<f8").tobytes())
+	else:
+		with open(FN, "w") as outputFile:
+			outputFile.write(str(N) + "\n(\n" + ("(%0.15f %0.15f %0.15f)\n"*N) % tuple(data.ravel()) + ")")
+
+
+## Reading
+
+# Returns True if FN starts with the magic bytes of the binary particle positions format.
+def isBinaryPositions(FN):
+	with open(FN, "rb") as f:
+		return f.read(len(binaryPositionsMagic)) == binaryPositionsMagic
+
+# Reads particle positions in either format.
+# @return: ( (N,3) numpy array, time ). time is read from the header (binary format) or the filename (text format),
+#	and is None if it is unknown.
+def readFromFile_Positions(FN):
+	assert (fileExists(FN))
+	if isBinaryPositions(FN):
+		header = np.fromfile(FN, dtype=binaryPositionsHeader, count=1)[0]
+		if header["version"] != binaryPositionsVersion:
+			raise Exception("File \"" + str(FN) + "\" has binary format version " + str(header["version"]) + \
+				", but only version " + str(binaryPositionsVersion) + " is supported.")
+		N = int(header["N"])
+		data = np.fromfile(FN, dtype="<f8", count=3*N, offset=binaryPositionsHeader.itemsize).reshape((N,3))
+		time = None if np.isnan(header["time"]) else float(header["time"])
+		return (data, time)
+
+	# Text: the first token is N, followed by 3N coordinates (brackets are ignored).
+	with open(FN) as dataFile:
+		tokens = dataFile.read().replace("(", " ").replace(")", " ").split()
+	N = int(tokens[0])
+	data = np.array(tokens[1:1+3*N], dtype=float).reshape((N,3))
+	time = None
+	groups = myRE.getMatchingGroups(names.basename(FN), re.compile(names.particlePositionsFNRE))
+	if groups:
+		(index, time) = names.extractTimeAndIndexFromMatch(groups)
+	return (data, time)
+
+# Reads only the number of particles from a particle positions file in either format
+def readFromFile_Positions_N(FN):
+	assert (fileExists(FN))
+	if isBinaryPositions(FN):
+		return int(np.fromfile(FN, dtype=binaryPositionsHeader, count=1)[0]["N"])
+	with open(FN) as dataFile:
+		for line in dataFile:
+			if line.strip():
+				return int(line.split()[0])
+	raise Exception("File \"" + str(FN) + "\" is empty.")
+
+
+
+
 ####
 ## CSV files
 ########
@@ -496,6 +986,56 @@ def readCSVs(FNs, delimiter=';', skip_header=1):
 
 
 
+####
+## Sorted index
+########
+
+# Written by sortOpticsResults.py --index, instead of moving the intensity files into major-timestep directories.
+# A csv file with the header "majorTime;intensityFN", followed by one line per microstep file (in time order),
+# where the filenames are relative to the directory of the index file.
+
+
+## Writing
+
+# majorTimes := list of the major times (strings or floats)
+# fileLists := for each major time, the list of its intensity files, relative to the directory of outputFN
+def writeToFile_SortedIndex(majorTimes, fileLists, outputFN, overwrite=False):
+	# Sanity:
+	assert (fileNotAlreadyExists(outputFN,overwrite))
+	assert (len(majorTimes) == len(fileLists)), "majorTimes and fileLists must have the same length."
+	with open(outputFN, "w") as outputFile:
+		outputFile.write("majorTime;intensityFN\n")
+		for (majorTime, fileList) in zip(majorTimes, fileLists):
+			for FN in fileList:
+				outputFile.write(str(majorTime) + ";" + str(FN) + "\n")
+
+
+## Reading
+
+# @return: list of (majorTime, [intensity filenames relative to the directory of FN]), in the order of the file
+def readFromFile_SortedIndex(FN):
+	assert (fileExists(FN))
+	majorSteps = []
+	with open(FN) as inputFile:
+		inputFile.readline() # header
+		for line in inputFile:
+			items = line.rstrip("\n").split(";")
+			if len(items) < 2: continue
+			if len(majorSteps) == 0 or majorSteps[-1][0] != items[0]:
+				majorSteps.append( (items[0], []) )
+			majorSteps[-1][1].append(items[1])
+	return majorSteps
+
+# Returns the filename of the sorted index in directory DN, or None if there is none.
+def findSortedIndex(DN):
+	FN = names.joinPaths(DN, names.intensitySortedIndexFN)
+	if os.path.isfile(FN):
+		return FN
+	return None
+
+
+
+
 ####
 ## Result directories
 ########
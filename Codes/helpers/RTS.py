@@ -11,11 +11,13 @@
 #	23 11 2018: Original
 #	03 12 2018: multiArgStringToArgs
 #	05 04 2019: added "callable" type as valid input to "select"
+#	18 10 2026: import traceback, which "select" uses to report a failed selection
 #
 # TODO: Return meaningful error when construction fails in select(): What parameters did the constructor require?
 # TODO: getFunctionRequiredArguments to see what arguments are missing in case of "too few arguments given" exception
 
 import inspect
+import traceback
 
 # Import from optoFluids:
 import helpers.strConversions as str2
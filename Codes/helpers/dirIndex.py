@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+#
+# dirIndex.py
+#
+# Index of the files in a directory that satisfy one of the nameConventions, e.g. all intensity files.
+# Scans the directory once with os.scandir, matches every entry against a pre-compiled pattern,
+# and stores the parsed times and indices as numpy arrays, sorted by time.
+# Indices are cached per (directory, convention) for as long as the modification time of the directory is unchanged,
+# so several tools (or several calls within one tool) share a single scan.
+#
+# Usage example:
+#	index = dirIndex.scan(DN, "intensity")
+#	for (FN, time) in zip(index.paths(), index.times):
+#		...
+#
+# Kevin van As
+#	18 10 2026: Original
+#
+
+# Misc imports
+import os
+import time as _time
+
+# Numerics
+import numpy as np
+
+# Import from optoFluids:
+import helpers.regex as myRE
+import helpers.nameConventions as names
+
+
+
+# One compiled pattern per convention. All patterns store the time in their groups (cf. names.extractTimeAndIndexFromMatch).
+_patterns = {
+	"intensity": myRE.compile(names.intensityFNRE),
+	"intensity1D": myRE.compile(names.intensity1DFNRE),
+	"intensity2D": myRE.compile(names.intensity2DFNRE),
+	"positions": myRE.compile(names.particlePositionsFNRE),
+	"sorted": myRE.compile("^" + myRE.group(myRE.floatRE) + "$"), # = names.intensitySortedDNRE, but with the time stored
+}
+
+# Entries of a directory that was modified less than this many seconds ago are not cached,
+#  because a coarse file system clock may not register a next modification within the same tick.
+_racyTime = 2.0
+
+_cache = {} # (abspath, convention) --> (mtime_ns, DirIndex)
+
+class DirIndex():
+	# entries := list of (name, time, index), in any order
+	def __init__(self, DN, convention, entries):
+		entries = sorted(entries, key=lambda entry: entry[1])
+		self.DN = DN
+		self.convention = convention
+		self.names = [ entry[0] for entry in entries ]
+		self.times = np.array([ entry[1] for entry in entries ], dtype=float)
+		self.indices = np.array([ entry[2] if entry[2] != "" else np.nan for entry in entries ], dtype=float)
+
+	def __len__(self):
+		return len(self.names)
+
+	# Filenames including the directory
+	def paths(self):
+		return [ names.joinPaths(self.DN, name) for name in self.names ]
+
+	# Returns the position of the entry at the given time (compared with names.myRound, as the filenames are),
+	# or None if there is no such entry.
+	def findTime(self, time):
+		if len(self) == 0:
+			return None
+		i_closest = int(np.argmin(np.abs(self.times - float(time))))
+		if names.myRound(self.times[i_closest]) != names.myRound(time):
+			return None
+		return i_closest
+
+def conventions():
+	return sorted(_patterns.keys())
+
+# Returns the DirIndex of the entries of directory DN that satisfy the given convention (see conventions()).
+def scan(DN, convention="intensity"):
+	if convention not in _patterns:
+		raise Exception("Unknown name convention \"" + str(convention) + "\". Valid options are: " + str(conventions()) + ".")
+	key = (os.path.abspath(DN), convention)
+	mtime = os.stat(DN).st_mtime_ns
+	cached = _cache.get(key)
+	if cached is not None and cached[0] == mtime:
+		return cached[1]
+	RO = _patterns[convention]
+	entries = []
+	with os.scandir(DN) as iterator:
+		for entry in iterator:
+			match = RO.match(entry.name)
+			if match:
+				(index, time) = names.extractTimeAndIndexFromMatch(match.groups())
+				entries.append( (entry.name, time, index) )
+	index = DirIndex(DN, convention, entries)
+	if _time.time() - mtime*1e-9 > _racyTime:
+		_cache[key] = (mtime, index)
+	return index
+
+# Forgets all cached indices, e.g. after modifying a directory within the same clock tick.
+def clearCache():
+	_cache.clear()
+
+# EOF
@@ -9,6 +9,7 @@
 #	11 10 2018: Original
 #	29 11 2018: Implemented myRound for nicely rounded filenames
 #	05 12 2018: Fixed myRound to also accept "str"-type input.
+#	18 10 2026: Added the intensity stack filename.
 # 
 
 import re
@@ -56,8 +57,14 @@ intensityFNRE = "Intensity" + \
 	timeRE + \
 	myRE.optional(".out")
 
+# Intensity stack (all frames of a result directory in one file)
+intensityStackFNRE = "IntensityStack" + \
+	myRE.optional(".bin")
+
 # Intensity sorted dirname
 intensitySortedDNRE = "^" + myRE.floatRE + "$"
+# Sorted index (the sorting by major timestep as a file, instead of as directories)
+intensitySortedIndexFNRE = "sortedIndex" + myRE.optional(".csv")
 intensityBlurredDNRE = "^blurred$"
 
 # Pixel Coordinates filenames
@@ -123,6 +130,7 @@ def isIntensity1D(FN):
 	return myRE.doesItemMatch(FN,re.compile(intensity1DFNRE))
 def isIntensity2D(FN):
 	return myRE.doesItemMatch(FN,re.compile(intensity2DFNRE))
+intensityStackFN = "IntensityStack.bin"
 	
 
 # Sorted Intensity Directories
@@ -130,12 +138,15 @@ def intensitySortedDN(time):
 	return str(myRound(time))
 def intensityBlurredDN():
 	return "blurred"
+intensitySortedIndexFN = "sortedIndex.csv"
 
 # Pixel Coordinates
 pixelCoordsFN = pixelCoordsFNRE 
 pixelCoords2DFN = pixelCoords2DFNRE
 pixelCoords2DxFN = pixelCoords2DxFNRE
 pixelCoords2DyFN = pixelCoords2DyFNRE
+# Camera geometry cache (hidden, such that it does not match any of the regexes above)
+cameraGeometryFN = ".PixelCoords2D.npz"
 
 # Log directory & filenames
 logDN = logDNRE
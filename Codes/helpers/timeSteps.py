@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+#
+# timeSteps.py
+#
+# Analysis of the times of the optics results: detects the microsteps (dt_us) and the major steps (dt)
+# in a sorted array of times (e.g. helpers.dirIndex.scan(DN).times).
+# Used by sortOpticsResults.py and by the intensity stack (helpers.IO).
+#
+# A new major step starts wherever the jump in time is larger than dt_us_tol*dt_us,
+# where dt_us is the jump between the first two times.
+# All major steps must have the same dt, compared with 9 significant digits (cf. names.myRound).
+#
+# Usage example:
+#	(dt_us, dt, starts, lengths) = detectMajorSteps(times)
+#	for (i0, n) in zip(starts, lengths):
+#		times[i0:i0+n] # the microsteps of one major step
+#
+# Kevin van As
+#	18 10 2026: Original (from the loops in sortOpticsResults.py)
+#
+
+# Numerics
+import numpy as np
+
+# Import from optoFluids:
+import helpers.nameConventions as names
+
+
+
+DEFAULT_dt_us_tol=1.5
+
+# Relative round-off of the 9 significant digits of names.myRound (which the filenames are written with)
+_rtol = 5e-9
+
+# Detects the major steps in an array of sorted times.
+# Raises an Exception if there are less than two times, or if the major steps are not uniform.
+# @return: (dt_us, dt, starts, lengths)
+#	dt_us := the microstep
+#	dt := the major step (None if there is only a single major step)
+#	starts := numpy int array with the index of the first time of each major step
+#	lengths := numpy int array with the number of times in each major step
+def detectMajorSteps(times, dt_us_tol=DEFAULT_dt_us_tol):
+	times = np.asarray(times, dtype=float)
+	if len(times) < 2:
+		raise Exception("Cannot detect the timesteps from less than two times (found " + str(len(times)) + ").")
+	deltas = np.diff(times)
+	if np.any(deltas < 0):
+		raise Exception("The times are not sorted.")
+	dt_us = deltas[0]
+	starts = np.concatenate( ([0], np.flatnonzero(deltas > dt_us_tol*dt_us) + 1) )
+	lengths = np.diff( np.append(starts, len(times)) )
+	dt = None
+	if len(starts) > 1:
+		dts = np.diff(times[starts])
+		dt = dts[0]
+		# The times themselves carry the round-off, so the tolerance scales with them as well:
+		mismatch = np.flatnonzero( np.abs(dts - dt) > _rtol*(np.abs(dt) + np.abs(times[starts[1:]])) )
+		if len(mismatch) > 0:
+			raise Exception("Found different major timesteps: dt1=" + str(names.myRound(dt)) + \
+				", dt2=" + str(names.myRound(dts[mismatch[0]])) + " (at t=" + str(names.myRound(times[starts[mismatch[0]+1]])) + ").")
+		dt = names.myRound(dt)
+	return (names.myRound(dt_us), dt, starts, lengths)
+
+# EOF